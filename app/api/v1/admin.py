@@ -0,0 +1,117 @@
+import logging
+from fastapi import APIRouter, Depends, HTTPException, status
+from ...utils.auth import authorized
+from ...config import Config
+from ...services import storage
+from ...services.templates import TemplateRegistry, current_registry, reload_templates
+from ...models.responses import TemplateInfo, TemplateListResponse, BlobStatsResponse, ErrorResponse
+
+logger = logging.getLogger(__name__)
+router = APIRouter(prefix="/admin", tags=["admin"])
+config = Config()
+
+def _template_list(registry: TemplateRegistry, message: str) -> TemplateListResponse:
+    return TemplateListResponse(
+        message=message,
+        templates=[
+            TemplateInfo(name=t.name, size=len(t.raw), sha256=t.sha256)
+            for t in registry.all()
+        ]
+    )
+
+@router.get(
+    "/templates",
+    response_model=TemplateListResponse,
+    responses={
+        500: {"model": ErrorResponse}
+    },
+    summary="List registered templates",
+    description="List the templates held in memory with their sizes and SHA-256 hashes"
+)
+async def list_templates(
+    _: None = Depends(authorized(config.SECRET_TOKEN))
+):
+    """List registered templates."""
+    registry = await current_registry()
+    return _template_list(registry, f"Found {len(registry.templates)} templates")
+
+@router.post(
+    "/templates/reload",
+    response_model=TemplateListResponse,
+    responses={
+        500: {"model": ErrorResponse}
+    },
+    summary="Reload templates",
+    description="Re-read TEMPLATE_FOLDER and atomically replace the template registry. The "
+                "worker serving this request reloads at once; every other worker reloads before "
+                "it next places or lists templates."
+)
+async def reload_template_registry(
+    _: None = Depends(authorized(config.SECRET_TOKEN))
+):
+    """Reload the template registry."""
+    try:
+        registry = await reload_templates(broadcast=True)
+    except Exception as e:
+        logger.error(f"Error reloading templates: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to reload templates: {str(e)}"
+        )
+    return _template_list(registry, f"Reloaded {len(registry.templates)} templates")
+
+
+@router.get(
+    "/blobs",
+    response_model=BlobStatsResponse,
+    responses={
+        500: {"model": ErrorResponse}
+    },
+    summary="Image blob store usage",
+    description="Count the content-addressed image blobs, the store images linking to them and "
+                "the bytes saved by sharing. Walks the whole blob store."
+)
+async def get_blob_stats(
+    _: None = Depends(authorized(config.SECRET_TOKEN))
+):
+    """Report blob store usage."""
+    try:
+        stats = await storage.blob_stats()
+    except Exception as e:
+        logger.error(f"Error reading blob stats: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Internal server error"
+        )
+    return BlobStatsResponse(message=f"Found {stats['blobs']} blobs", **stats)
+
+@router.post(
+    "/blobs/collect",
+    response_model=BlobStatsResponse,
+    responses={
+        500: {"model": ErrorResponse}
+    },
+    summary="Remove unreferenced blobs",
+    description="Delete blobs that no store image links to any more, such as those left by "
+                "overwritten derivatives"
+)
+async def collect_unreferenced_blobs(
+    _: None = Depends(authorized(config.SECRET_TOKEN))
+):
+    """Remove unreferenced blobs."""
+    try:
+        collected = await storage.collect_blobs()
+        stats = await storage.blob_stats()
+    except Exception as e:
+        logger.error(f"Error collecting blobs: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Internal server error"
+        )
+    logger.info(f"Removed {collected['removed']} unreferenced blobs ({collected['bytes_freed']} bytes)")
+    return BlobStatsResponse(
+        message=f"Removed {collected['removed']} unreferenced blobs",
+        removed=collected["removed"],
+        bytes_freed=collected["bytes_freed"],
+        **stats
+    )
@@ -1,19 +1,150 @@
 import os
+import asyncio
 import logging
-from fastapi import APIRouter, UploadFile, File, Form, Depends, HTTPException, status
-from typing import List
+from typing import Optional
+from fastapi import APIRouter, Request, Response, Depends, HTTPException, Query, status
+from fastapi.responses import FileResponse
 from ...utils.auth import authorized
-from ...utils.file import allowed_file, save_image, secure_filename
+from ...utils.file import allowed_file, fingerprint_name, is_fingerprinted, is_fingerprint_of
+from ...utils.upload import SpooledUpload, check_content_length, receive_uploads
 from ...utils.path import safe_path
-from ...utils.validation import sanitize_filename
+from ...utils.http import is_not_modified, validator_headers
 from ...config import Config
-from ...models.requests import ImageDeleteRequest
-from ...models.responses import ImageUploadResponse, ImageListResponse, BaseResponse, ErrorResponse
+from ...services import storage, optimizer, image_index
+from ...services.metrics import observe_upload, record_disk_read
+from ...services.derivatives import generate_derivatives, derivative_names
+from ...models.requests import ImageFileRequest, ImageDeleteRequest
+from ...models.responses import (
+    ImageDerivative, ImageInfo, ImageUploadResponse, ImageBatchItem, ImageBatchUploadResponse, ImageListResponse, ImageOptimizationResponse,
+    BaseResponse, ErrorResponse
+)
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/stores", tags=["images"])
 config = Config()
 
+IMAGE_MEDIA_TYPES = {"png": "image/png", "webp": "image/webp"}
+
+# Images need the API token like every store route, so shared caches must not keep them
+IMAGE_CACHE_CONTROL = f"private, max-age={config.IMAGE_CACHE_MAX_AGE}"
+
+# Fingerprinted names never change content, so they can be cached for a year
+IMMUTABLE_CACHE_CONTROL = "private, max-age=31536000, immutable"
+
+# The upload route parses its multipart body itself, so describe it for the docs
+UPLOAD_REQUEST_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "required": ["file"],
+                    "properties": {
+                        "file": {
+                            "type": "string",
+                            "format": "binary",
+                            "description": "Image file to upload"
+                        }
+                    }
+                }
+            }
+        }
+    }
+}
+
+BATCH_UPLOAD_REQUEST_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "required": ["files"],
+                    "properties": {
+                        "files": {
+                            "type": "array",
+                            "items": {"type": "string", "format": "binary"},
+                            "description": "Image files to upload"
+                        }
+                    }
+                }
+            }
+        }
+    }
+}
+
+async def finish_upload(
+    store_id: str,
+    store_path: str,
+    image_dir: str,
+    upload: SpooledUpload,
+    fingerprint: bool
+) -> ImageUploadResponse:
+    """Commit a streamed upload and run the configured post-processing on it."""
+    filename = upload.filename
+    full_path = os.path.join(image_dir, filename)
+    digest = upload.sha256
+    
+    success, error = await storage.commit_image(upload.temp_path, full_path, upload.sha256)
+    if not success:
+        logger.error(f"Error saving image for store {store_id}: {error}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error saving image: {error}"
+        )
+    
+    file_size = upload.size
+    original_size = None
+    observe_upload(upload.size)
+    if config.IMAGE_OPTIMIZE:
+        # Keep the upload as received if recompression fails
+        try:
+            result = await optimizer.optimize_image(full_path, allow_transcode=True)
+            await optimizer.record_savings(store_path, [result])
+            filename = result["filename"]
+            full_path = os.path.join(image_dir, filename)
+            digest = result["sha256"] or digest
+            original_size = result["original_size"]
+            file_size = result["size"]
+        except Exception as e:
+            logger.error(f"Error optimizing image for store {store_id}: {str(e)}")
+    
+    logger.info(f"Image uploaded successfully for store {store_id}: {filename} ({file_size} bytes)")
+    
+    fingerprinted_path = None
+    if fingerprint:
+        # The logical name always holds the latest version; fingerprints are never overwritten
+        fingerprinted = fingerprint_name(filename, digest)
+        await storage.link_image(full_path, os.path.join(image_dir, fingerprinted), digest)
+        fingerprinted_path = f"{store_id}/image/{fingerprinted}"
+    
+    derivatives = None
+    placeholder = None
+    if config.IMAGE_DERIVATIVES:
+        # The original is already committed, so a failure here does not fail the upload
+        try:
+            rendered = await generate_derivatives(full_path)
+            derivatives = [
+                ImageDerivative(path=f"{store_id}/image/{d['filename']}", **d)
+                for d in rendered["derivatives"]
+            ]
+            placeholder = rendered["placeholder"]
+        except Exception as e:
+            logger.error(f"Error generating derivatives for {store_id}/{filename}: {str(e)}")
+    
+    return ImageUploadResponse(
+        message="Image uploaded successfully",
+        path=f"{store_id}/image/{filename}",
+        store_id=store_id,
+        filename=filename,
+        size=file_size,
+        original_size=original_size,
+        fingerprinted_path=fingerprinted_path,
+        derivatives=derivatives,
+        placeholder=placeholder
+    )
+
 @router.post(
     "/{store_id}/images",
     response_model=ImageUploadResponse,
@@ -24,11 +155,15 @@ config = Config()
         500: {"model": ErrorResponse}
     },
     summary="Upload an image to a store",
-    description="Upload an image file (WebP or PNG) to a store's image directory"
+    description="Upload an image file (WebP or PNG) to a store's image directory. When IMAGE_DERIVATIVES "
+                "is enabled, resized copies and a blurred placeholder are rendered next to it; names in "
+                "their form, such as logo.thumb.png, are reserved and rejected",
+    openapi_extra=UPLOAD_REQUEST_BODY
 )
 async def upload_image(
     store_id: str,
-    file: UploadFile = File(..., description="Image file to upload"),
+    request: Request,
+    fingerprint: bool = Query(False, description="Also store the image under a content-hash name that can be cached forever"),
     _: None = Depends(authorized(config.SECRET_TOKEN))
 ):
     """Upload an image to a store's image directory."""
@@ -40,69 +175,127 @@ async def upload_image(
             detail="Invalid store ID format"
         )
     
-    if not file.filename:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="No file selected"
-        )
+    # Reject oversized uploads before the multipart body is parsed
+    check_content_length(request, config.MAX_CONTENT_LENGTH)
     
-    # Check file size
-    content = await file.read()
-    if len(content) > config.MAX_CONTENT_LENGTH:
+    try:
+        store_path = safe_path(config.UPLOAD_FOLDER, store_id)
+        
+        if not await storage.exists(store_path):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Store '{store_id}' does not exist"
+            )
+        
+        # Create image directory if it doesn't exist
+        image_dir = os.path.join(store_path, 'image')
+        await storage.make_dirs(image_dir)
+        
+        # Stream the file part to a temporary file, enforcing the size limit per chunk
+        upload = (await receive_uploads(request, image_dir, config.MAX_CONTENT_LENGTH))[0]
+        return await finish_upload(store_id, store_path, image_dir, upload, fingerprint)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Unexpected error uploading image for store {store_id}: {str(e)}")
         raise HTTPException(
-            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-            detail="File too large"
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Internal server error"
         )
+
+@router.post(
+    "/{store_id}/images/batch",
+    response_model=ImageBatchUploadResponse,
+    responses={
+        400: {"model": ErrorResponse},
+        404: {"model": ErrorResponse},
+        413: {"model": ErrorResponse},
+        500: {"model": ErrorResponse}
+    },
+    summary="Upload many images to a store",
+    description="Upload up to MAX_BATCH_FILES images in one multipart request, all in the 'files' "
+                "field. Every file is handled independently: invalid, oversized or corrupt files "
+                "are reported in the results without failing the others.",
+    openapi_extra=BATCH_UPLOAD_REQUEST_BODY
+)
+async def upload_images_batch(
+    store_id: str,
+    request: Request,
+    fingerprint: bool = Query(False, description="Also store each image under a content-hash name"),
+    _: None = Depends(authorized(config.SECRET_TOKEN))
+):
+    """Upload several images to a store's image directory in one request."""
     
-    # Reset file position
-    await file.seek(0)
-    
-    # Validate filename
-    filename = sanitize_filename(file.filename)
-    if not filename or not allowed_file(filename):
+    # Validate store_id format
+    if not store_id or not store_id.replace('_', '').replace('-', '').isalnum():
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid filename or file type. Only WebP and PNG files are allowed."
+            detail="Invalid store ID format"
         )
     
+    check_content_length(request, config.MAX_BATCH_CONTENT_LENGTH)
+    
     try:
         store_path = safe_path(config.UPLOAD_FOLDER, store_id)
         
-        if not os.path.exists(store_path):
+        if not await storage.exists(store_path):
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Store '{store_id}' does not exist"
             )
         
-        # Create image directory if it doesn't exist
         image_dir = os.path.join(store_path, 'image')
-        os.makedirs(image_dir, exist_ok=True)
+        await storage.make_dirs(image_dir)
         
-        full_path = os.path.join(image_dir, filename)
+        # Files are streamed to disk one after another as the body arrives
+        uploads = await receive_uploads(
+            request, image_dir, config.MAX_CONTENT_LENGTH,
+            max_files=config.MAX_BATCH_FILES, field_names=("files",), strict=False,
+            max_total=config.MAX_BATCH_CONTENT_LENGTH
+        )
         
-        success, error = await save_image(file, full_path)
-        if not success:
-            logger.error(f"Error saving image for store {store_id}: {error}")
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"Error saving image: {error}"
-            )
+        # A name may appear once per batch, otherwise the result would depend on timing
+        seen = set()
+        for upload in uploads:
+            if upload.error is None and upload.filename in seen:
+                upload.error = "Duplicate filename in batch"
+                await storage.remove_file(upload.temp_path)
+            seen.add(upload.filename)
+        
+        limit = asyncio.Semaphore(max(1, config.BATCH_UPLOAD_CONCURRENCY))
         
-        file_size = os.path.getsize(full_path)
-        logger.info(f"Image uploaded successfully for store {store_id}: {filename} ({file_size} bytes)")
+        async def process(upload: SpooledUpload) -> ImageBatchItem:
+            if upload.error is not None:
+                return ImageBatchItem(filename=upload.filename, success=False, error=upload.error)
+            async with limit:
+                try:
+                    result = await finish_upload(store_id, store_path, image_dir, upload, fingerprint)
+                except HTTPException as e:
+                    return ImageBatchItem(filename=upload.filename, success=False, error=str(e.detail))
+                except Exception as e:
+                    logger.error(f"Error uploading {upload.filename} for store {store_id}: {str(e)}")
+                    if await storage.exists(upload.temp_path):
+                        await storage.remove_file(upload.temp_path)
+                    return ImageBatchItem(filename=upload.filename, success=False, error="Internal server error")
+            return ImageBatchItem(filename=result.filename, success=True, upload=result)
         
-        return ImageUploadResponse(
-            message="Image uploaded successfully",
-            path=f"{store_id}/image/{filename}",
-            store_id=store_id,
-            filename=filename,
-            size=file_size
+        results = await asyncio.gather(*(process(upload) for upload in uploads))
+        uploaded = sum(1 for item in results if item.success)
+        logger.info(f"Batch upload for store {store_id}: {uploaded} of {len(results)} images stored")
+        
+        return ImageBatchUploadResponse(
+            success=uploaded == len(results),
+            message=f"Uploaded {uploaded} of {len(results)} images",
+            uploaded=uploaded,
+            failed=len(results) - uploaded,
+            results=results
         )
         
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Unexpected error uploading image for store {store_id}: {str(e)}")
+        logger.error(f"Unexpected error in batch upload for store {store_id}: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Internal server error"
@@ -116,11 +309,18 @@ async def upload_image(
         404: {"model": ErrorResponse},
         500: {"model": ErrorResponse}
     },
-    summary="List all images in a store",
-    description="Get a list of all image files in a store's image directory"
+    summary="List images in a store",
+    description="List a store's images with size, mtime, dimensions, format and SHA-256 from the "
+                "store's image index. Results are paginated: pass next_cursor back as cursor, "
+                "with the same sort and prefix, to get the next page."
 )
 async def list_images(
     store_id: str,
+    sort: str = Query("name", pattern="^(name|size|mtime)$", description="Sort key"),
+    order: str = Query("asc", pattern="^(asc|desc)$", description="Sort direction"),
+    prefix: Optional[str] = Query(None, max_length=100, description="Only names starting with this prefix"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    limit: int = Query(100, ge=1, le=1000, description="Maximum number of images to return"),
     _: None = Depends(authorized(config.SECRET_TOKEN))
 ):
     """List all images in a store's image directory."""
@@ -135,7 +335,7 @@ async def list_images(
     try:
         store_path = safe_path(config.UPLOAD_FOLDER, store_id)
         
-        if not os.path.exists(store_path):
+        if not await storage.exists(store_path):
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Store '{store_id}' does not exist"
@@ -143,19 +343,29 @@ async def list_images(
         
         image_path = os.path.join(store_path, "image")
         
-        if not os.path.exists(image_path):
+        if not await storage.exists(image_path):
             # Return empty list if image directory doesn't exist yet
             return ImageListResponse(
                 message="No images found",
                 images=[]
             )
         
-        image_files = [f for f in os.listdir(image_path) if allowed_file(f)]
-        logger.info(f"Listed {len(image_files)} images for store {store_id}")
+        try:
+            items, next_cursor = await image_index.query(
+                image_path, sort, order == "desc", prefix, cursor, limit
+            )
+        except image_index.InvalidCursor as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e)
+            )
+        logger.info(f"Listed {len(items)} images for store {store_id}")
         
         return ImageListResponse(
-            message=f"Found {len(image_files)} images",
-            images=image_files
+            message=f"Found {len(items)} images",
+            images=[item["name"] for item in items],
+            items=[ImageInfo(**item) for item in items],
+            next_cursor=next_cursor
         )
         
     except HTTPException:
@@ -167,6 +377,226 @@ async def list_images(
             detail="Internal server error"
         )
 
+@router.post(
+    "/{store_id}/images/reindex",
+    response_model=BaseResponse,
+    responses={
+        400: {"model": ErrorResponse},
+        404: {"model": ErrorResponse},
+        500: {"model": ErrorResponse}
+    },
+    summary="Rebuild a store's image index",
+    description="Rescan the store's image directory and replace its image index, e.g. after "
+                "files were changed outside the API"
+)
+async def reindex_images(
+    store_id: str,
+    _: None = Depends(authorized(config.SECRET_TOKEN))
+):
+    """Rebuild a store's image index from its image directory."""
+    
+    # Validate store_id format
+    if not store_id or not store_id.replace('_', '').replace('-', '').isalnum():
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid store ID format"
+        )
+    
+    try:
+        store_path = safe_path(config.UPLOAD_FOLDER, store_id)
+        
+        if not await storage.exists(store_path):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Store '{store_id}' does not exist"
+            )
+        
+        await image_index.rebuild(os.path.join(store_path, "image"))
+        logger.info(f"Rebuilt image index for store {store_id}")
+        
+        return BaseResponse(message="Image index rebuilt")
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error rebuilding image index for store {store_id}: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Internal server error"
+        )
+
+@router.post(
+    "/{store_id}/images/optimize",
+    response_model=ImageOptimizationResponse,
+    status_code=status.HTTP_202_ACCEPTED,
+    responses={
+        400: {"model": ErrorResponse},
+        404: {"model": ErrorResponse},
+        500: {"model": ErrorResponse}
+    },
+    summary="Recompress a store's existing images",
+    description="Start a background run that recompresses every PNG in the store's image directory "
+                "in place. PNGs keep their names, so existing references stay valid. Returns the "
+                "running job if one is already in progress in this worker."
+)
+async def optimize_images(
+    store_id: str,
+    _: None = Depends(authorized(config.SECRET_TOKEN))
+):
+    """Start background recompression of a store's images."""
+    
+    # Validate store_id format
+    if not store_id or not store_id.replace('_', '').replace('-', '').isalnum():
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid store ID format"
+        )
+    
+    try:
+        store_path = safe_path(config.UPLOAD_FOLDER, store_id)
+        image_dir = os.path.join(store_path, "image")
+        
+        if not await storage.exists(image_dir):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Store '{store_id}' has no image directory"
+            )
+        
+        names = await storage.list_files(image_dir, allowed_file)
+        job = optimizer.start_batch(store_id, store_path, image_dir, names)
+        
+        return ImageOptimizationResponse(
+            message=f"Optimizing {job.total} images",
+            savings=await optimizer.read_savings(store_path),
+            job=job.to_dict()
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error starting image optimization for store {store_id}: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Internal server error"
+        )
+
+@router.get(
+    "/{store_id}/images/optimize",
+    response_model=ImageOptimizationResponse,
+    responses={
+        400: {"model": ErrorResponse},
+        404: {"model": ErrorResponse},
+        500: {"model": ErrorResponse}
+    },
+    summary="Image optimization savings",
+    description="Bytes saved by recompression in a store, and the progress of the latest "
+                "background run started in this worker"
+)
+async def get_image_optimization(
+    store_id: str,
+    _: None = Depends(authorized(config.SECRET_TOKEN))
+):
+    """Report bytes saved by image recompression for a store."""
+    
+    # Validate store_id format
+    if not store_id or not store_id.replace('_', '').replace('-', '').isalnum():
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid store ID format"
+        )
+    
+    try:
+        store_path = safe_path(config.UPLOAD_FOLDER, store_id)
+        
+        if not await storage.exists(store_path):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Store '{store_id}' does not exist"
+            )
+        
+        savings = await optimizer.read_savings(store_path)
+        job = optimizer.get_job(store_id)
+        
+        return ImageOptimizationResponse(
+            message=f"Saved {savings.get('bytes_saved', 0)} bytes",
+            savings=savings,
+            job=job.to_dict() if job is not None else None
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error reading image optimization for store {store_id}: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Internal server error"
+        )
+
+@router.head("/{store_id}/images/{filename}", include_in_schema=False)
+@router.get(
+    "/{store_id}/images/{filename}",
+    response_class=FileResponse,
+    responses={
+        200: {"content": {media_type: {} for media_type in IMAGE_MEDIA_TYPES.values()}},
+        206: {"description": "Requested byte range"},
+        304: {"description": "Not modified"},
+        404: {"model": ErrorResponse},
+        416: {"description": "Range not satisfiable"}
+    },
+    summary="Get an image",
+    description="Serve an image file from a store. Supports Range requests and conditional "
+                "requests with If-None-Match or If-Modified-Since. Fingerprinted names are "
+                "served as immutable."
+)
+async def get_image(
+    store_id: str,
+    filename: str,
+    http_request: Request,
+    _: None = Depends(authorized(config.SECRET_TOKEN))
+):
+    """Serve an image file straight from disk."""
+    
+    # Validate using Pydantic model
+    request = ImageFileRequest(store_id=store_id, filename=filename)
+    
+    try:
+        store_path = safe_path(config.UPLOAD_FOLDER, request.store_id)
+        file_path = os.path.join(store_path, "image", request.filename)
+        
+        st = await storage.stat_file(file_path)
+        if st is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Image not found"
+            )
+        
+        headers = validator_headers(st)
+        headers["Cache-Control"] = (
+            IMMUTABLE_CACHE_CONTROL if is_fingerprinted(request.filename) else IMAGE_CACHE_CONTROL
+        )
+        if is_not_modified(http_request, st):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        
+        if http_request.method == "GET" and "range" not in http_request.headers:
+            record_disk_read("image", st.st_size)
+        
+        # FileResponse handles Range and uses the server's pathsend extension when available
+        return FileResponse(
+            file_path,
+            media_type=IMAGE_MEDIA_TYPES[request.filename.rsplit(".", 1)[1].lower()],
+            headers=headers,
+            stat_result=st
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error serving image {store_id}/{filename}: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Internal server error"
+        )
+
 @router.delete(
     "/{store_id}/images/{filename}",
     response_model=BaseResponse,
@@ -192,21 +622,31 @@ async def delete_image(
         store_path = safe_path(config.UPLOAD_FOLDER, request.store_id)
         file_path = os.path.join(store_path, "image", request.filename)
         
-        if not os.path.exists(file_path):
+        if not await storage.exists(file_path):
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Image not found"
             )
         
-        if not os.path.isfile(file_path):
+        if not await storage.is_file(file_path):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Path is not a file"
             )
         
-        os.remove(file_path)
+        # Shared content is only freed when this was its last reference
+        await storage.remove_image(file_path)
         logger.info(f"Deleted image: {file_path}")
         
+        # Remove any derivatives rendered for this image and its fingerprinted versions
+        image_dir = os.path.dirname(file_path)
+        for name in derivative_names(request.filename):
+            derivative_path = os.path.join(image_dir, name)
+            if await storage.is_file(derivative_path):
+                await storage.remove_image(derivative_path)
+        for name in await storage.list_files(image_dir, lambda f: is_fingerprint_of(f, request.filename)):
+            await storage.remove_image(os.path.join(image_dir, name))
+        
         return BaseResponse(message="Image deleted successfully")
         
     except HTTPException:
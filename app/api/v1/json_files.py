@@ -1,14 +1,22 @@
 import os
 import json
 import logging
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import Any, Dict
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+from typing import Any, Dict, List, Optional
 from ...utils.auth import authorized
 from ...utils.path import safe_path
+from ...utils.http import etag_not_modified, if_match_fails, is_not_modified, validator_headers
+from ...utils.jsonpatch import (
+    JsonPatchConflict, JsonPatchError, JsonPointerError,
+    apply_json_patch, apply_merge_patch, parse_pointer, resolve_pointer
+)
 from ...config import Config
+from ...services import bundles, storage
+from ...services.json_cache import ENVELOPE_PREFIX, ENVELOPE_SUFFIX, CachedDocument
 from ...models.requests import JsonFileRequest, JsonUpdateRequest, DynamicJsonRequest
 from ...models.responses import (
-    JsonListResponse, JsonContentResponse, BaseResponse, 
+    JsonListResponse, JsonContentResponse, JsonBundleResponse, BaseResponse, 
     DynamicJsonResponse, DynamicJsonDeleteResponse, ErrorResponse
 )
 
@@ -16,6 +24,49 @@ logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/stores", tags=["json-files"])
 config = Config()
 
+# Documents are private to the API token and must be revalidated on every use
+JSON_CACHE_CONTROL = "private, no-cache"
+
+# Request media types accepted by the PATCH endpoint
+JSON_PATCH_MEDIA_TYPE = "application/json-patch+json"
+MERGE_PATCH_MEDIA_TYPE = "application/merge-patch+json"
+
+PATCH_REQUEST_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            JSON_PATCH_MEDIA_TYPE: {
+                "schema": {"type": "array", "items": {"type": "object"}},
+                "example": [{"op": "replace", "path": "/children/metaData/title", "value": "New title"}]
+            },
+            MERGE_PATCH_MEDIA_TYPE: {
+                "schema": {"type": "object"},
+                "example": {"children": {"metaData": {"title": "New title"}}}
+            }
+        }
+    }
+}
+
+# Accept header values that select the passthrough read modes
+RAW_MEDIA_TYPE = "application/vnd.store.raw+json"
+ENVELOPE_MEDIA_TYPE = "application/vnd.store.envelope+json"
+
+def _fragments_body(document: CachedDocument, pointers: List[str]) -> bytes:
+    """Serialize {pointer: sub-tree} from the document's fragment index."""
+    members = [json.dumps(p).encode("utf-8") + b":" + document.fragment(p) for p in pointers]
+    return b"{" + b",".join(members) + b"}"
+
+def _read_mode(http_request: Request, mode: str) -> str:
+    """Resolve the read mode from the query parameter, falling back to the Accept header."""
+    if mode != "model":
+        return mode
+    accept = http_request.headers.get("accept", "")
+    if RAW_MEDIA_TYPE in accept:
+        return "raw"
+    if ENVELOPE_MEDIA_TYPE in accept:
+        return "envelope"
+    return mode
+
 @router.get(
     "/{store_id}/json",
     response_model=JsonListResponse,
@@ -44,13 +95,13 @@ async def list_json_files(
         store_path = safe_path(config.UPLOAD_FOLDER, store_id)
         json_path = os.path.join(store_path, "json")
         
-        if not os.path.exists(json_path):
+        if not await storage.exists(json_path):
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Store '{store_id}' does not exist"
             )
         
-        json_files = [f for f in os.listdir(json_path) if f.endswith('.json')]
+        json_files = await storage.list_files(json_path, lambda f: f.endswith('.json'))
         
         return JsonListResponse(
             message=f"Found {len(json_files)} JSON files",
@@ -66,20 +117,98 @@ async def list_json_files(
             detail="Internal server error"
         )
 
+@router.get(
+    "/{store_id}/bundle",
+    response_model=JsonBundleResponse,
+    responses={
+        304: {"description": "No document changed since the ETag sent by the client"},
+        400: {"model": ErrorResponse},
+        404: {"model": ErrorResponse},
+        500: {"model": ErrorResponse}
+    },
+    summary="Get all JSON files of a store",
+    description="Return every JSON document of a store in one response, optionally only the "
+                "lg or sm variants. Files that cannot be read are listed under errors."
+)
+async def get_json_bundle(
+    store_id: str,
+    http_request: Request,
+    variant: Optional[str] = Query(None, pattern="^(lg|sm)$", description="Only include files ending in lg.json or sm.json"),
+    _: None = Depends(authorized(config.SECRET_TOKEN))
+):
+    """Get all JSON files of a store in one response."""
+    
+    # Validate store_id format
+    if not store_id or not store_id.replace('_', '').replace('-', '').isalnum():
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid store ID format"
+        )
+    
+    try:
+        store_path = safe_path(config.UPLOAD_FOLDER, store_id)
+        json_path = os.path.join(store_path, "json")
+        
+        try:
+            members = await bundles.scan_members(json_path, variant)
+        except (FileNotFoundError, NotADirectoryError):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Store '{store_id}' does not exist"
+            )
+        
+        headers = {
+            "ETag": bundles.etag_of(bundles.signature_of(members)),
+            "Cache-Control": JSON_CACHE_CONTROL
+        }
+        if etag_not_modified(http_request, headers["ETag"]):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        
+        return StreamingResponse(
+            bundles.stream_bundle(store_id, json_path, variant, members),
+            media_type="application/json",
+            headers=headers
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error bundling JSON files for store {store_id}: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Internal server error"
+        )
+
 @router.get(
     "/{store_id}/json/{filename}",
     response_model=JsonContentResponse,
     responses={
+        304: {"description": "Document unchanged since the validator sent by the client"},
         400: {"model": ErrorResponse},
         404: {"model": ErrorResponse},
         500: {"model": ErrorResponse}
     },
     summary="Get JSON file content",
-    description="Retrieve the content of a specific JSON file from a store"
+    description="Retrieve the content of a specific JSON file from a store. "
+                "Supports conditional requests with If-None-Match and If-Modified-Since. "
+                "mode=envelope returns the stored bytes inside the standard envelope and "
+                "mode=raw returns them with no envelope, both without re-serialization. "
+                "Pass one or more JSON Pointers to receive only those sub-trees, keyed by pointer."
 )
 async def get_json_file(
     store_id: str,
     filename: str,
+    http_request: Request,
+    response: Response,
+    mode: str = Query(
+        "model",
+        pattern="^(model|envelope|raw)$",
+        description="Response mode; can also be selected with the Accept header"
+    ),
+    pointer: Optional[List[str]] = Query(
+        None,
+        description="JSON Pointer (RFC 6901) of a sub-tree to return, e.g. /children/metaData; may be repeated"
+    ),
     _: None = Depends(authorized(config.SECRET_TOKEN))
 ):
     """Get JSON file content."""
@@ -87,35 +216,98 @@ async def get_json_file(
     # Validate using Pydantic model
     request = JsonFileRequest(store_id=store_id, filename=filename)
     
+    pointers = list(dict.fromkeys(pointer or []))
+    try:
+        for p in pointers:
+            parse_pointer(p)
+    except JsonPointerError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    
     try:
         store_path = safe_path(config.UPLOAD_FOLDER, request.store_id)
         full_path = os.path.join(store_path, "json", request.filename)
         
-        if not os.path.isfile(full_path):
+        st = await storage.stat_file(full_path)
+        if st is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="JSON file not found"
             )
         
-        with open(full_path, "r", encoding="utf-8") as f:
-            content = f.read().strip()
-            if not content:
+        # The Accept header can pick the body, so each mode has its own ETag
+        read_mode = _read_mode(http_request, mode)
+        etag_variant = None if read_mode == "model" else read_mode
+        
+        # Answer conditional requests from the stat result alone
+        if is_not_modified(http_request, st, etag_variant):
+            return Response(
+                status_code=status.HTTP_304_NOT_MODIFIED,
+                headers={
+                    **validator_headers(st, etag_variant), "Cache-Control": JSON_CACHE_CONTROL, "Vary": "Accept"
+                }
+            )
+        
+        try:
+            document = await storage.read_document(request.store_id, request.filename, full_path, st)
+        except FileNotFoundError:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="JSON file not found"
+            )
+        except storage.EmptyFileError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="File is empty"
+            )
+        except json.JSONDecodeError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Invalid JSON format: {str(e)}"
+            )
+        
+        headers = {
+            **validator_headers(document.stat, etag_variant), "Cache-Control": JSON_CACHE_CONTROL, "Vary": "Accept"
+        }
+        
+        if pointers:
+            try:
+                if read_mode == "model":
+                    fragments = {p: resolve_pointer(document.data, p) for p in pointers}
+                else:
+                    body = _fragments_body(document, pointers)
+            except JsonPointerError as e:
                 raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="File is empty"
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail=f"JSON pointer not found: {str(e)}"
                 )
             
-            try:
-                data = json.loads(content)
-            except json.JSONDecodeError as e:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail=f"Invalid JSON format: {str(e)}"
+            if read_mode == "raw":
+                return Response(content=body, media_type="application/json", headers=headers)
+            if read_mode == "envelope":
+                return Response(
+                    content=ENVELOPE_PREFIX + body + ENVELOPE_SUFFIX,
+                    media_type="application/json",
+                    headers=headers
                 )
+            response.headers.update(headers)
+            return JsonContentResponse(
+                message="JSON file retrieved successfully",
+                data=fragments
+            )
         
+        # Passthrough modes send the stored bytes, which were parsed when cached
+        if read_mode == "raw":
+            return Response(content=document.raw, media_type="application/json", headers=headers)
+        if read_mode == "envelope":
+            return Response(content=document.envelope, media_type="application/json", headers=headers)
+        
+        response.headers.update(headers)
         return JsonContentResponse(
             message="JSON file retrieved successfully",
-            data=data
+            data=document.data
         )
         
     except HTTPException:
@@ -153,7 +345,7 @@ async def update_json_file(
         store_path = safe_path(config.UPLOAD_FOLDER, request.store_id)
         full_path = os.path.join(store_path, "json", request.filename)
         
-        if not os.path.isfile(full_path):
+        if not await storage.is_file(full_path):
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="JSON file not found"
@@ -169,22 +361,9 @@ async def update_json_file(
             )
         
         # Write to temporary file first, then replace
-        os.makedirs(os.path.dirname(full_path), exist_ok=True)
-        temp_path = f"{full_path}.tmp"
+        await storage.write_document(request.store_id, request.filename, full_path, request.data)
         
-        try:
-            with open(temp_path, "w", encoding="utf-8") as f:
-                json.dump(request.data, f, indent=2, ensure_ascii=False)
-            
-            os.replace(temp_path, full_path)
-            
-            return BaseResponse(message="JSON file updated successfully")
-            
-        except Exception as e:
-            # Clean up temp file if it exists
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
-            raise e
+        return BaseResponse(message="JSON file updated successfully")
             
     except HTTPException:
         raise
@@ -195,6 +374,118 @@ async def update_json_file(
             detail="Internal server error"
         )
 
+@router.patch(
+    "/{store_id}/json/{filename}",
+    response_model=BaseResponse,
+    responses={
+        400: {"model": ErrorResponse},
+        404: {"model": ErrorResponse},
+        409: {"model": ErrorResponse},
+        412: {"model": ErrorResponse},
+        415: {"model": ErrorResponse},
+        500: {"model": ErrorResponse}
+    },
+    summary="Partially update JSON file content",
+    description="Apply a JSON Patch (application/json-patch+json) or a JSON Merge Patch "
+                "(application/merge-patch+json) to a JSON file. Send If-Match with the "
+                "document ETag to reject the patch if the file changed in the meantime.",
+    openapi_extra=PATCH_REQUEST_BODY
+)
+async def patch_json_file(
+    store_id: str,
+    filename: str,
+    http_request: Request,
+    response: Response,
+    _: None = Depends(authorized(config.SECRET_TOKEN))
+):
+    """Patch JSON file content."""
+    
+    # Validate using Pydantic model
+    request = JsonFileRequest(store_id=store_id, filename=filename)
+    
+    content_type = http_request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type == JSON_PATCH_MEDIA_TYPE:
+        apply_patch = apply_json_patch
+    elif content_type in (MERGE_PATCH_MEDIA_TYPE, "application/json"):
+        apply_patch = apply_merge_patch
+    else:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail=f"Content-Type must be {JSON_PATCH_MEDIA_TYPE} or {MERGE_PATCH_MEDIA_TYPE}"
+        )
+    
+    try:
+        patch = json.loads(await http_request.body())
+    except (json.JSONDecodeError, UnicodeDecodeError) as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid JSON format: {str(e)}"
+        )
+    
+    try:
+        store_path = safe_path(config.UPLOAD_FOLDER, request.store_id)
+        full_path = os.path.join(store_path, "json", request.filename)
+        
+        st = await storage.stat_file(full_path)
+        if st is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="JSON file not found"
+            )
+        
+        if if_match_fails(http_request, st):
+            raise HTTPException(
+                status_code=status.HTTP_412_PRECONDITION_FAILED,
+                detail="JSON file has been modified"
+            )
+        
+        try:
+            document = await storage.read_document(request.store_id, request.filename, full_path, st)
+        except storage.EmptyFileError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="File is empty"
+            )
+        except json.JSONDecodeError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Invalid JSON format: {str(e)}"
+            )
+        
+        # Patches copy only the containers they touch; the cached document is left intact
+        try:
+            data = apply_patch(document.data, patch)
+        except JsonPatchError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Invalid patch: {str(e)}"
+            )
+        except JsonPatchConflict as e:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"Patch could not be applied: {str(e)}"
+            )
+        
+        if not isinstance(data, dict):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Patched document must be a JSON object"
+            )
+        
+        updated = await storage.write_document(request.store_id, request.filename, full_path, data)
+        response.headers.update(validator_headers(updated.stat))
+        
+        return BaseResponse(message="JSON file patched successfully")
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error patching JSON file {request.filename} for store {request.store_id}: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Internal server error"
+        )
+
 @router.post(
     "/{store_id}/json/templates",
     response_model=DynamicJsonResponse,
@@ -222,7 +513,7 @@ async def create_dynamic_json(
         sm_path = os.path.join(store_path, "json", f"{request.template_name}sm.json")
         
         # Check if files already exist
-        if os.path.isfile(lg_path) or os.path.isfile(sm_path):
+        if await storage.is_file(lg_path) or await storage.is_file(sm_path):
             raise HTTPException(
                 status_code=status.HTTP_409_CONFLICT,
                 detail="Template files already exist"
@@ -245,24 +536,16 @@ async def create_dynamic_json(
         
         # Create both files
         for path, suffix in [(lg_path, "lg"), (sm_path, "sm")]:
+            filename = f"{request.template_name}{suffix}.json"
             try:
-                os.makedirs(os.path.dirname(path), exist_ok=True)
-                temp_path = f"{path}.tmp"
-                
-                with open(temp_path, "w", encoding="utf-8") as f:
-                    json.dump(default_content, f, indent=2, ensure_ascii=False)
-                
-                os.replace(temp_path, path)
-                created_files.append(f"{request.template_name}{suffix}.json")
+                await storage.write_document(request.store_id, filename, path, default_content)
+                created_files.append(filename)
                 
             except Exception as e:
                 # Clean up any created files on error
                 for created_path in [lg_path, sm_path]:
-                    if os.path.exists(created_path):
-                        os.remove(created_path)
-                    temp_created_path = f"{created_path}.tmp"
-                    if os.path.exists(temp_created_path):
-                        os.remove(temp_created_path)
+                    if await storage.exists(created_path):
+                        await storage.delete_document(request.store_id, os.path.basename(created_path), created_path)
                 raise e
         
         logger.info(f"Created dynamic JSON templates for store {request.store_id}: {created_files}")
@@ -312,9 +595,9 @@ async def delete_dynamic_json(
         
         for path in [lg_path, sm_path]:
             filename = os.path.basename(path)
-            if os.path.isfile(path):
+            if await storage.is_file(path):
                 try:
-                    os.remove(path)
+                    await storage.delete_document(request.store_id, filename, path)
                     deleted_files.append(filename)
                     logger.info(f"Deleted: {path}")
                 except Exception as e:
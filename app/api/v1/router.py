@@ -1,5 +1,5 @@
 from fastapi import APIRouter
-from . import stores, images, json_files
+from . import stores, images, uploads, json_files, admin
 
 # Create the main v1 router
 router = APIRouter(prefix="/api/v1")
@@ -7,4 +7,6 @@ router = APIRouter(prefix="/api/v1")
 # Include all route modules
 router.include_router(stores.router)
 router.include_router(images.router)
-router.include_router(json_files.router)
\ No newline at end of file
+router.include_router(uploads.router)
+router.include_router(json_files.router)
+router.include_router(admin.router)
\ No newline at end of file
@@ -1,12 +1,15 @@
 import os
-import shutil
 import logging
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Request, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
 from ...utils.auth import authorized
 from ...utils.path import safe_path
 from ...config import Config
+from ...services import storage, archive
+from ...services.json_cache import json_cache
+from ...services.templates import current_registry
 from ...models.requests import StoreRequest
-from ...models.responses import StoreInitResponse, ErrorResponse
+from ...models.responses import StoreInitResponse, StoreImportResponse, ErrorResponse
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/stores", tags=["stores"])
@@ -20,7 +23,8 @@ config = Config()
         500: {"model": ErrorResponse}
     },
     summary="Initialize a new store",
-    description="Creates a new store directory and copies template JSON files"
+    description="Creates a new store directory and places the template JSON files in it "
+                "(copied, reflinked or hardlinked depending on STORE_INIT_MODE)"
 )
 async def initialize_store(
     store_id: str,
@@ -35,26 +39,22 @@ async def initialize_store(
         store_path = safe_path(config.UPLOAD_FOLDER, request.store_id)
         store_json_path = os.path.join(store_path, "json")
         
-        if os.path.exists(store_json_path):
+        if await storage.exists(store_json_path):
             return StoreInitResponse(
                 message="Store already exists",
                 url=f"{config.VPS_URL}/{request.store_id}"
             )
 
         # Create directories
-        os.makedirs(store_json_path, exist_ok=True)
-        os.makedirs(os.path.join(store_path, "image"), exist_ok=True)
+        await storage.make_dirs(store_json_path)
+        await storage.make_dirs(os.path.join(store_path, "image"))
 
-        # Copy template files
-        template_folder = config.TEMPLATE_FOLDER
-        copied_files = []
-        
-        for filename in os.listdir(template_folder):
-            if filename.endswith(".json"):
-                src = os.path.join(template_folder, filename)
-                dst = os.path.join(store_json_path, filename)
-                shutil.copyfile(src, dst)
-                copied_files.append(filename)
+        # Copy template files from the registry; reflinks and hardlinks share
+        # blocks with the template until a page is first written
+        registry = await current_registry()
+        copied_files = await storage.copy_templates(
+            registry.all(), store_json_path, config.STORE_INIT_MODE
+        )
 
         logger.info(f"Store {request.store_id} initialized with {len(copied_files)} template files")
         
@@ -68,4 +68,110 @@ async def initialize_store(
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to initialize store: {str(e)}"
-        )
\ No newline at end of file
+        )
+# The import route reads its body itself, so describe it for the docs
+IMPORT_REQUEST_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            media_type: {"schema": {"type": "string", "format": "binary"}}
+            for media_type, _ in archive.COMPRESSIONS.values()
+        }
+    }
+}
+
+@router.get(
+    "/{store_id}/export",
+    response_class=StreamingResponse,
+    responses={
+        200: {"content": {media_type: {} for media_type, _ in archive.COMPRESSIONS.values()}},
+        400: {"model": ErrorResponse},
+        404: {"model": ErrorResponse}
+    },
+    summary="Export a store",
+    description="Stream a tar archive of the store's json/ and image/ directories, generated as "
+                "the files are read. Import it into any store with the import endpoint."
+)
+async def export_store(
+    store_id: str,
+    compression: str = Query("gzip", pattern="^(none|gzip|zstd)$", description="Archive compression"),
+    _: None = Depends(authorized(config.SECRET_TOKEN))
+):
+    """Export a store as a tar archive."""
+    
+    # Validate store_id
+    request = StoreRequest(store_id=store_id)
+    
+    if not archive.compression_available(compression):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"{compression} compression is not available on this server"
+        )
+    
+    store_path = safe_path(config.UPLOAD_FOLDER, request.store_id)
+    if not await storage.exists(store_path):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Store '{request.store_id}' does not exist"
+        )
+    
+    media_type, extension = archive.COMPRESSIONS[compression]
+    logger.info(f"Exporting store {request.store_id} ({compression})")
+    return StreamingResponse(
+        archive.export_store(store_path, compression),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{request.store_id}{extension}"'}
+    )
+
+@router.post(
+    "/{store_id}/import",
+    response_model=StoreImportResponse,
+    responses={
+        400: {"model": ErrorResponse},
+        500: {"model": ErrorResponse}
+    },
+    summary="Import a store",
+    description="Replace a store, or create it, from a tar archive in the request body (plain, "
+                "gzip or zstd, as produced by the export endpoint). The archive is unpacked and "
+                "verified in a staging directory, then swapped in; a rejected archive leaves the "
+                "store unchanged.",
+    openapi_extra=IMPORT_REQUEST_BODY
+)
+async def import_store(
+    store_id: str,
+    http_request: Request,
+    _: None = Depends(authorized(config.SECRET_TOKEN))
+):
+    """Import a store from a tar archive."""
+    
+    # Validate store_id
+    request = StoreRequest(store_id=store_id)
+    
+    try:
+        store_path = safe_path(config.UPLOAD_FOLDER, request.store_id)
+        result = await archive.import_store(store_path, http_request.stream())
+        json_cache.invalidate_store(request.store_id)
+        
+        logger.info(
+            f"Imported store {request.store_id}: {result['json_files']} JSON files, "
+            f"{result['images']} images, {result['bytes']} bytes"
+        )
+        return StoreImportResponse(
+            message=f"Store imported with {result['json_files']} JSON files and {result['images']} images",
+            store_id=request.store_id,
+            **result
+        )
+        
+    except archive.ArchiveError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Failed to import store {request.store_id}: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Internal server error"
+        )
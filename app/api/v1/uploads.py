@@ -0,0 +1,331 @@
+import os
+import re
+import uuid
+import logging
+from typing import AsyncIterator
+from fastapi import APIRouter, Request, Response, Depends, HTTPException, Query, status
+from ...utils.auth import authorized
+from ...utils.file import file_sha256, check_image_header
+from ...utils.imageinfo import HEADER_SIZE
+from ...utils.upload import SpooledUpload
+from ...utils.path import safe_path
+from ...config import Config
+from ...services import storage, upload_sessions
+from ...services.executor import run_io
+from ...services.upload_sessions import SessionNotFound, ChunkOutOfRange, UploadSession
+from ...models.requests import UploadSessionRequest
+from ...models.responses import UploadSessionResponse, ImageUploadResponse, BaseResponse, ErrorResponse
+from .images import finish_upload
+
+logger = logging.getLogger(__name__)
+router = APIRouter(prefix="/stores", tags=["uploads"])
+config = Config()
+
+UPLOAD_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+CHUNK_REQUEST_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "application/octet-stream": {
+                "schema": {"type": "string", "format": "binary"}
+            }
+        }
+    }
+}
+
+def _validate_store_id(store_id: str) -> None:
+    if not store_id or not store_id.replace('_', '').replace('-', '').isalnum():
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid store ID format"
+        )
+
+async def _load_session(store_id: str, upload_id: str) -> UploadSession:
+    """The store's open session, or 404; sessions are not visible from other stores."""
+    _validate_store_id(store_id)
+    if not UPLOAD_ID_PATTERN.match(upload_id):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid upload ID format"
+        )
+    try:
+        session = await upload_sessions.get_session(upload_id)
+    except SessionNotFound:
+        session = None
+    if session is None or session.store_id != store_id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Upload session not found or expired"
+        )
+    return session
+
+async def _checked(chunks: AsyncIterator[bytes], filename: str) -> AsyncIterator[bytes]:
+    """Hold back the first bytes of the file until its image header has been checked."""
+    head = b""
+    async for chunk in chunks:
+        if head is not None:
+            head += chunk
+            if len(head) < HEADER_SIZE:
+                continue
+            error = check_image_header(head, filename)
+            if error is not None:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=error
+                )
+            chunk, head = head, None
+        yield chunk
+    if head:
+        # Too short to check here; completion verifies the assembled file
+        yield head
+
+def _session_response(session: UploadSession, message: str, response: Response) -> UploadSessionResponse:
+    response.headers["Upload-Offset"] = str(session.offset)
+    return UploadSessionResponse(
+        message=message,
+        upload_id=session.upload_id,
+        store_id=session.store_id,
+        filename=session.filename,
+        size=session.size,
+        offset=session.offset,
+        received=session.received,
+        expires_at=session.expires_at
+    )
+
+@router.post(
+    "/{store_id}/uploads",
+    response_model=UploadSessionResponse,
+    status_code=status.HTTP_201_CREATED,
+    responses={
+        400: {"model": ErrorResponse},
+        404: {"model": ErrorResponse},
+        500: {"model": ErrorResponse}
+    },
+    summary="Start a resumable image upload",
+    description="Create an upload session for an image of a known size. Send the bytes with PUT "
+                "requests at any offsets, then complete the session to store the image."
+)
+async def create_upload(
+    store_id: str,
+    request: UploadSessionRequest,
+    response: Response,
+    _: None = Depends(authorized(config.SECRET_TOKEN))
+):
+    """Create a resumable upload session for a store image."""
+
+    _validate_store_id(store_id)
+
+    if request.size > config.MAX_CONTENT_LENGTH:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail="File too large"
+        )
+
+    try:
+        store_path = safe_path(config.UPLOAD_FOLDER, store_id)
+
+        if not await storage.exists(store_path):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Store '{store_id}' does not exist"
+            )
+
+        session = await upload_sessions.create_session(
+            store_id, request.filename, request.size, request.fingerprint
+        )
+        logger.info(f"Started upload {session.upload_id} for store {store_id}: {request.filename} ({request.size} bytes)")
+        return _session_response(session, "Upload session created", response)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error creating upload session for store {store_id}: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Internal server error"
+        )
+
+@router.put(
+    "/{store_id}/uploads/{upload_id}",
+    response_model=UploadSessionResponse,
+    responses={
+        400: {"model": ErrorResponse},
+        404: {"model": ErrorResponse},
+        500: {"model": ErrorResponse}
+    },
+    summary="Upload a chunk",
+    description="Write the raw request body at the given byte offset. Chunks may be sent in any "
+                "order and in parallel; resending a range overwrites it.",
+    openapi_extra=CHUNK_REQUEST_BODY
+)
+async def upload_chunk(
+    store_id: str,
+    upload_id: str,
+    request: Request,
+    response: Response,
+    offset: int = Query(..., ge=0, description="Byte offset of the first byte in the body"),
+    _: None = Depends(authorized(config.SECRET_TOKEN))
+):
+    """Write one chunk of a resumable upload."""
+
+    session = await _load_session(store_id, upload_id)
+
+    content_length = request.headers.get("content-length")
+    if content_length is not None and content_length.isdigit() and offset + int(content_length) > session.size:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Chunk extends past the declared upload size"
+        )
+
+    try:
+        body = request.stream()
+        if offset == 0:
+            # Reject a file that is not an image before any of it is written
+            body = _checked(body, session.filename)
+        session = await upload_sessions.write_chunk(session, offset, body)
+        return _session_response(session, "Chunk received", response)
+
+    except ChunkOutOfRange as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except SessionNotFound:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Upload session not found or expired"
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error writing chunk for upload {upload_id}: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Internal server error"
+        )
+
+@router.get(
+    "/{store_id}/uploads/{upload_id}",
+    response_model=UploadSessionResponse,
+    responses={
+        400: {"model": ErrorResponse},
+        404: {"model": ErrorResponse}
+    },
+    summary="Get upload progress",
+    description="Return the received byte ranges and the offset to resume from, also sent as "
+                "the Upload-Offset header."
+)
+async def get_upload(
+    store_id: str,
+    upload_id: str,
+    response: Response,
+    _: None = Depends(authorized(config.SECRET_TOKEN))
+):
+    """Return the progress of a resumable upload."""
+
+    session = await _load_session(store_id, upload_id)
+    return _session_response(session, "Upload in progress", response)
+
+@router.delete(
+    "/{store_id}/uploads/{upload_id}",
+    response_model=BaseResponse,
+    responses={
+        400: {"model": ErrorResponse},
+        404: {"model": ErrorResponse},
+        500: {"model": ErrorResponse}
+    },
+    summary="Abort an upload",
+    description="Discard a resumable upload and the bytes received so far"
+)
+async def abort_upload(
+    store_id: str,
+    upload_id: str,
+    _: None = Depends(authorized(config.SECRET_TOKEN))
+):
+    """Abort a resumable upload."""
+
+    await _load_session(store_id, upload_id)
+
+    try:
+        await upload_sessions.abort_session(upload_id)
+        logger.info(f"Aborted upload {upload_id} for store {store_id}")
+        return BaseResponse(message="Upload aborted")
+
+    except Exception as e:
+        logger.error(f"Error aborting upload {upload_id}: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Internal server error"
+        )
+
+@router.post(
+    "/{store_id}/uploads/{upload_id}/complete",
+    response_model=ImageUploadResponse,
+    responses={
+        400: {"model": ErrorResponse},
+        404: {"model": ErrorResponse},
+        409: {"model": ErrorResponse},
+        500: {"model": ErrorResponse}
+    },
+    summary="Complete an upload",
+    description="Verify the received file and store it in the store's image directory, with the "
+                "same checks and post-processing as a direct upload. Fails with 409 while bytes "
+                "are missing."
+)
+async def complete_upload(
+    store_id: str,
+    upload_id: str,
+    _: None = Depends(authorized(config.SECRET_TOKEN))
+):
+    """Finish a resumable upload into the store's image directory."""
+
+    await _load_session(store_id, upload_id)
+    temp_path = None
+
+    try:
+        store_path = safe_path(config.UPLOAD_FOLDER, store_id)
+
+        if not await storage.exists(store_path):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Store '{store_id}' does not exist"
+            )
+
+        image_dir = os.path.join(store_path, 'image')
+        await storage.make_dirs(image_dir)
+
+        # Move the data next to its destination, where a direct upload would have spooled it
+        temp_path = os.path.join(image_dir, f".upload-{uuid.uuid4().hex}.tmp")
+        try:
+            claimed = await upload_sessions.claim_upload(upload_id, temp_path)
+        except SessionNotFound:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Upload session not found or expired"
+            )
+        if not claimed.complete:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"Upload is incomplete: {claimed.offset} of {claimed.size} bytes received"
+            )
+
+        upload = SpooledUpload(
+            field_name="file",
+            filename=claimed.filename,
+            temp_path=temp_path,
+            size=claimed.size,
+            sha256=await run_io(file_sha256, temp_path)
+        )
+        return await finish_upload(store_id, store_path, image_dir, upload, claimed.fingerprint)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Unexpected error completing upload {upload_id} for store {store_id}: {str(e)}")
+        if temp_path is not None and await storage.exists(temp_path):
+            await storage.remove_file(temp_path)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Internal server error"
+        )
@@ -9,4 +9,68 @@ class Config:
     TEMPLATE_FOLDER = os.getenv("TEMPLATE_FOLDER")
     SECRET_TOKEN = os.getenv("SECRET_TOKEN")
     VPS_URL = os.getenv("VPS_URL")
-    CORS_ORIGINS = os.getenv("CORS_ORIGINS", "*").split(",") if os.getenv("CORS_ORIGINS") != "*" else ["*"]
\ No newline at end of file
+    CORS_ORIGINS = os.getenv("CORS_ORIGINS", "*").split(",") if os.getenv("CORS_ORIGINS") != "*" else ["*"]
+    
+    # Rate limiting shared by all workers on a host: requests per period, keyed by ip, token or store
+    RATE_LIMIT_CALLS = int(os.getenv("RATE_LIMIT_CALLS", "100"))
+    RATE_LIMIT_PERIOD = int(os.getenv("RATE_LIMIT_PERIOD", "60"))
+    RATE_LIMIT_KEY = os.getenv("RATE_LIMIT_KEY", "ip").lower()
+    RATE_LIMIT_SLOTS = int(os.getenv("RATE_LIMIT_SLOTS", "65536"))
+    RATE_LIMIT_FILE = os.getenv("RATE_LIMIT_FILE")
+    
+    # Structured access log: share of 2xx/3xx responses logged, queue bound, and batching of writes
+    ACCESS_LOG = os.getenv("ACCESS_LOG", "true").lower() == "true"
+    ACCESS_LOG_SAMPLE_RATE = float(os.getenv("ACCESS_LOG_SAMPLE_RATE", "1.0"))
+    ACCESS_LOG_QUEUE_SIZE = int(os.getenv("ACCESS_LOG_QUEUE_SIZE", "10000"))
+    ACCESS_LOG_BATCH_SIZE = int(os.getenv("ACCESS_LOG_BATCH_SIZE", "256"))
+    ACCESS_LOG_FLUSH_INTERVAL = float(os.getenv("ACCESS_LOG_FLUSH_INTERVAL", "0.2"))
+    
+    # Seconds between adding each worker's request counts to the shared Prometheus metrics
+    METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", "1.0"))
+    
+    # Event loop monitoring: lag sampled every interval, and stacks logged for callbacks blocking past the threshold
+    LOOP_MONITOR = os.getenv("LOOP_MONITOR", "true").lower() == "true"
+    LOOP_MONITOR_INTERVAL = float(os.getenv("LOOP_MONITOR_INTERVAL", "0.1"))
+    LOOP_BLOCK_THRESHOLD = float(os.getenv("LOOP_BLOCK_THRESHOLD", "0.25"))
+    
+    # Worker pools for blocking filesystem work and CPU-heavy image processing
+    IO_WORKERS = int(os.getenv("IO_WORKERS", "16"))
+    CPU_WORKERS = int(os.getenv("CPU_WORKERS", "2"))
+    
+    # Byte budget for the in-process parsed JSON document cache
+    JSON_CACHE_MAX_BYTES = int(os.getenv("JSON_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+    
+    # Byte budget for prebuilt store bundles; 0 disables the bundle artifact cache
+    JSON_BUNDLE_CACHE_MAX_BYTES = int(os.getenv("JSON_BUNDLE_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+    
+    # How template files are placed into new stores: copy, reflink or hardlink
+    STORE_INIT_MODE = os.getenv("STORE_INIT_MODE", "reflink").lower()
+    
+    # Batch image uploads: files and total bytes per request, and files processed at once
+    MAX_BATCH_FILES = int(os.getenv("MAX_BATCH_FILES", "200"))
+    MAX_BATCH_CONTENT_LENGTH = int(os.getenv("MAX_BATCH_CONTENT_LENGTH", str(512 * 1024 * 1024)))
+    BATCH_UPLOAD_CONCURRENCY = int(os.getenv("BATCH_UPLOAD_CONCURRENCY", "4"))
+    
+    # Largest store import, counted in extracted bytes
+    MAX_IMPORT_SIZE = int(os.getenv("MAX_IMPORT_SIZE", str(4 * 1024 * 1024 * 1024)))
+    
+    # Resumable uploads: idle seconds before a session expires, and how often expired ones are removed
+    UPLOAD_SESSION_TTL = int(os.getenv("UPLOAD_SESSION_TTL", str(24 * 3600)))
+    UPLOAD_SWEEP_INTERVAL = int(os.getenv("UPLOAD_SWEEP_INTERVAL", "600"))
+    
+    # Largest accepted image in pixels, checked from the header before anything is decoded
+    MAX_IMAGE_PIXELS = int(os.getenv("MAX_IMAGE_PIXELS", str(50 * 1000 * 1000)))
+    
+    # Responsive derivatives rendered at upload time, as label:width pairs
+    IMAGE_DERIVATIVES = os.getenv("IMAGE_DERIVATIVES", "false").lower() == "true"
+    IMAGE_DERIVATIVE_WIDTHS = os.getenv("IMAGE_DERIVATIVE_WIDTHS", "thumb:160,sm:640,lg:1280")
+    IMAGE_PLACEHOLDER_WIDTH = int(os.getenv("IMAGE_PLACEHOLDER_WIDTH", "16"))
+    
+    # Browser/CDN lifetime for images served by the API
+    IMAGE_CACHE_MAX_AGE = int(os.getenv("IMAGE_CACHE_MAX_AGE", str(7 * 24 * 3600)))
+    
+    # Recompression of uploaded PNGs; with IMAGE_PNG_TO_WEBP a smaller WebP replaces the PNG
+    IMAGE_OPTIMIZE = os.getenv("IMAGE_OPTIMIZE", "false").lower() == "true"
+    IMAGE_PNG_TO_WEBP = os.getenv("IMAGE_PNG_TO_WEBP", "true").lower() == "true"
+    IMAGE_WEBP_LOSSLESS = os.getenv("IMAGE_WEBP_LOSSLESS", "true").lower() == "true"
+    IMAGE_WEBP_QUALITY = int(os.getenv("IMAGE_WEBP_QUALITY", "85"))
\ No newline at end of file
@@ -1,14 +1,26 @@
+import asyncio
 import logging
+from datetime import datetime, timezone
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
+from fastapi.encoders import jsonable_encoder
 from fastapi.exceptions import RequestValidationError
 from starlette.exceptions import HTTPException as StarletteHTTPException
 
 from .config import Config
 from .api.v1.router import router as api_v1_router
+from .services.executor import executor_stats, run_io, shutdown_executors
+from .services.json_cache import json_cache
+from .services.bundles import bundle_cache
+from .services.templates import install_reload_signal, reload_templates
+from .services.upload_sessions import run_sweeper
+from .services.access_log import access_log
+from .services.loop_monitor import loop_monitor
+from .services.metrics import METRICS_CONTENT_TYPE, flush_request_metrics_off_loop, render_metrics, run_flusher
+from .middleware.metrics import MetricsMiddleware
 # Middleware imports - uncomment for production
 # from .middleware.security import SecurityHeadersMiddleware, RequestLoggingMiddleware, RateLimitMiddleware
 
@@ -22,9 +34,20 @@ logger = logging.getLogger(__name__)
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan events."""
+    access_log.start()
+    loop_monitor.start()
     logger.info("🚀 Starting Store API...")
+    await reload_templates()
+    install_reload_signal()
+    sweeper = asyncio.create_task(run_sweeper())
+    flusher = asyncio.create_task(run_flusher())
     yield
     logger.info("🛑 Shutting down Store API...")
+    sweeper.cancel()
+    flusher.cancel()
+    loop_monitor.stop()
+    shutdown_executors()
+    access_log.stop()
 
 def create_production_app() -> FastAPI:
     """Create a production-ready FastAPI application."""
@@ -76,8 +99,8 @@ def create_production_app() -> FastAPI:
     # Request logging - Logs all incoming requests and response times
     # app.add_middleware(RequestLoggingMiddleware)
     
-    # Rate limiting - Limits requests to 100 per minute per IP
-    # app.add_middleware(RateLimitMiddleware, calls=100, period=60)
+    # Rate limiting - RATE_LIMIT_CALLS per RATE_LIMIT_PERIOD per key, shared by all workers
+    # app.add_middleware(RateLimitMiddleware)
     
     # Trusted hosts - Only allows requests from specified domains
     # app.add_middleware(
@@ -90,11 +113,14 @@ def create_production_app() -> FastAPI:
     #     CORSMiddleware,
     #     allow_origins=config.CORS_ORIGINS,
     #     allow_credentials=True,
-    #     allow_methods=["GET", "POST", "PUT", "DELETE"],
+    #     allow_methods=["GET", "POST", "PUT", "PATCH", "DELETE"],
     #     allow_headers=["*"],
     #     expose_headers=["*"]
     # )
     
+    # Metrics - Request latency, status and bytes per route for /metrics
+    app.add_middleware(MetricsMiddleware)
+    
     # Include API routes
     app.include_router(api_v1_router)
     
@@ -107,7 +133,7 @@ def create_production_app() -> FastAPI:
             content={
                 "success": False,
                 "error": "Validation Error",
-                "details": exc.errors(),
+                "details": jsonable_encoder(exc.errors()),
                 "message": "Please check your request data and try again."
             }
         )
@@ -144,9 +170,21 @@ def create_production_app() -> FastAPI:
         return {
             "status": "healthy",
             "version": "1.0.0",
-            "timestamp": "2024-01-01T00:00:00Z"
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "executors": executor_stats(),
+            "json_cache": json_cache.stats(),
+            "bundle_cache": bundle_cache.stats(),
+            "access_log": access_log.stats(),
+            "event_loop": loop_monitor.stats()
         }
     
+    # Prometheus metrics, merged over all workers
+    @app.get("/metrics", tags=["health"], response_class=Response)
+    async def metrics():
+        """Prometheus metrics for every worker of this server."""
+        await flush_request_metrics_off_loop()
+        return Response(await run_io(render_metrics), media_type=METRICS_CONTENT_TYPE)
+    
     # Root endpoint
     @app.get("/", tags=["root"])
     async def root():
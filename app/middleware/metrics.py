@@ -0,0 +1,58 @@
+"""
+Request metrics for /metrics, as a plain ASGI middleware.
+"""
+import time
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from ..services import metrics
+from ..services.metrics import route_template
+
+class MetricsMiddleware:
+    """
+    Record latency, status, in-flight requests and body bytes per route.
+    Routes are labelled by their path template, e.g.
+    /api/v1/stores/{store_id}/images, never by the raw path.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start_time = time.perf_counter()
+        status_code = None
+        bytes_in = 0
+        bytes_out = 0
+
+        async def receive_counting() -> Message:
+            nonlocal bytes_in
+            message = await receive()
+            if message["type"] == "http.request":
+                bytes_in += len(message.get("body", b""))
+            return message
+
+        async def send_recording(message: Message) -> None:
+            nonlocal status_code, bytes_out
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            elif message["type"] == "http.response.body":
+                bytes_out += len(message.get("body", b""))
+            await send(message)
+
+        metrics.tally.in_flight += 1
+        try:
+            await self.app(scope, receive_counting, send_recording)
+        finally:
+            metrics.tally.in_flight -= 1
+            # The router stores the matched route in the scope it was given
+            metrics.observe_request(
+                scope["method"],
+                route_template(scope),
+                status_code or 500,
+                time.perf_counter() - start_time,
+                bytes_in,
+                bytes_out
+            )
@@ -1,95 +1,205 @@
+"""
+Production middleware, written as plain ASGI callables.
+
+Each middleware wraps `send` (or answers directly) instead of subclassing
+BaseHTTPMiddleware, so no extra task or memory stream is created per request
+and streaming responses pass through untouched.
+"""
+import re
+import hmac
 import time
+import hashlib
 import logging
-from fastapi import Request, Response
-from starlette.middleware.base import BaseHTTPMiddleware
+from typing import Optional
 from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from ..config import Config
+from ..services.access_log import access_log
+from ..services.ratelimit import SharedRateLimiter
 
 logger = logging.getLogger(__name__)
 
-class SecurityHeadersMiddleware(BaseHTTPMiddleware):
+STORE_PATH = re.compile(r"^/api/v1/stores/([^/]+)")
+
+_COMMON_SECURITY_HEADERS = (
+    (b"x-content-type-options", b"nosniff"),
+    (b"x-frame-options", b"DENY"),
+    (b"x-xss-protection", b"1; mode=block"),
+    (b"referrer-policy", b"strict-origin-when-cross-origin"),
+)
+
+# Strict CSP for API endpoints
+API_SECURITY_HEADERS = _COMMON_SECURITY_HEADERS + (
+    (b"content-security-policy", b"default-src 'self'"),
+)
+
+# More permissive CSP for documentation endpoints, which load external resources
+DOCS_SECURITY_HEADERS = _COMMON_SECURITY_HEADERS + (
+    (b"content-security-policy", (
+        b"default-src 'self'; "
+        b"style-src 'self' 'unsafe-inline' https://cdn.jsdelivr.net https://fonts.googleapis.com; "
+        b"script-src 'self' 'unsafe-inline' https://cdn.jsdelivr.net; "
+        b"img-src 'self' data: https://fastapi.tiangolo.com https://cdn.jsdelivr.net; "
+        b"font-src 'self' https://fonts.gstatic.com; "
+        b"connect-src 'self'"
+    )),
+)
+
+_SECURITY_HEADER_NAMES = frozenset(name for name, _ in API_SECURITY_HEADERS)
+
+DOCS_PATHS = ("/docs", "/redoc")
+
+class SecurityHeadersMiddleware:
     """Add security headers to all responses."""
-    
-    async def dispatch(self, request: Request, call_next):
-        response = await call_next(request)
-        
-        # Add security headers
-        response.headers["X-Content-Type-Options"] = "nosniff"
-        response.headers["X-Frame-Options"] = "DENY"
-        response.headers["X-XSS-Protection"] = "1; mode=block"
-        response.headers["Referrer-Policy"] = "strict-origin-when-cross-origin"
-        
-        # More permissive CSP for documentation endpoints
-        if request.url.path in ["/docs", "/redoc"] or request.url.path.startswith("/docs") or request.url.path.startswith("/redoc"):
-            # Allow external resources for API documentation
-            response.headers["Content-Security-Policy"] = (
-                "default-src 'self'; "
-                "style-src 'self' 'unsafe-inline' https://cdn.jsdelivr.net https://fonts.googleapis.com; "
-                "script-src 'self' 'unsafe-inline' https://cdn.jsdelivr.net; "
-                "img-src 'self' data: https://fastapi.tiangolo.com https://cdn.jsdelivr.net; "
-                "font-src 'self' https://fonts.gstatic.com; "
-                "connect-src 'self'"
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        security_headers = DOCS_SECURITY_HEADERS if scope["path"].startswith(DOCS_PATHS) else API_SECURITY_HEADERS
+
+        async def send_with_headers(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                # Replace any value the app set, as assigning the header would
+                headers = [
+                    header for header in message.get("headers", ())
+                    if header[0] not in _SECURITY_HEADER_NAMES
+                ]
+                headers.extend(security_headers)
+                message["headers"] = headers
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
+
+class RequestLoggingMiddleware:
+    """
+    Log every request as one structured access record: method, path, status,
+    client, store_id, bytes in and out, and the time to the first response
+    byte and to the end of the body. Records are handed to the access log
+    queue, so nothing is written on the event loop.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start_time = time.perf_counter()
+        first_byte_time = None
+        status_code = None
+        bytes_in = 0
+        bytes_out = 0
+
+        async def receive_counting() -> Message:
+            nonlocal bytes_in
+            message = await receive()
+            if message["type"] == "http.request":
+                bytes_in += len(message.get("body", b""))
+            return message
+
+        async def send_recording(message: Message) -> None:
+            nonlocal first_byte_time, status_code, bytes_out
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                first_byte_time = time.perf_counter()
+            elif message["type"] == "http.response.body":
+                bytes_out += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive_counting, send_recording)
+        finally:
+            # Logged once the body has been sent, or when the app raised before responding
+            end_time = time.perf_counter()
+            client = scope.get("client")
+            match = STORE_PATH.match(scope["path"])
+            status_code = status_code or 500
+            access_log.record(status_code, {
+                "method": scope["method"],
+                "path": scope["path"],
+                "status": status_code,
+                "client": client[0] if client else None,
+                "store_id": match.group(1) if match else None,
+                "bytes_in": bytes_in,
+                "bytes_out": bytes_out,
+                "ttfb_ms": round((first_byte_time - start_time) * 1000, 3) if first_byte_time else None,
+                "duration_ms": round((end_time - start_time) * 1000, 3)
+            })
+
+class RateLimitMiddleware:
+    """
+    Sliding-window rate limiting, shared by every worker on the host.
+
+    key_by selects what is limited: "ip", "token" (the bearer token) or
+    "store" (the store_id in the path). Only the configured SECRET_TOKEN
+    gets a bucket of its own, so made-up tokens cannot buy fresh allowances
+    or push real clients out of the shared slots. Requests without a valid
+    token or a store are limited by IP.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        calls: Optional[int] = None,
+        period: Optional[int] = None,
+        key_by: Optional[str] = None
+    ):
+        self.app = app
+        config = Config()
+        self.calls = calls or config.RATE_LIMIT_CALLS
+        self.period = period or config.RATE_LIMIT_PERIOD
+        self.key_by = key_by or config.RATE_LIMIT_KEY
+        if self.key_by not in ("ip", "token", "store"):
+            raise ValueError(f"Unknown rate limit key: {self.key_by}")
+        self.secret_token = (config.SECRET_TOKEN or "").encode("utf-8")
+        # The shared slots file is readable by every worker, so it never holds the token itself
+        self.token_key = "token:" + hashlib.sha256(self.secret_token).hexdigest()[:16]
+        self.limiter = SharedRateLimiter(
+            self.calls, self.period, config.RATE_LIMIT_SLOTS, config.RATE_LIMIT_FILE
+        )
+
+    def _key(self, scope: Scope) -> str:
+        if self.key_by == "token":
+            for name, value in scope["headers"]:
+                if name == b"authorization":
+                    scheme, _, token = value.partition(b" ")
+                    if (
+                        scheme.lower() == b"bearer" and self.secret_token
+                        and hmac.compare_digest(token, self.secret_token)
+                    ):
+                        return self.token_key
+                    break
+        elif self.key_by == "store":
+            match = STORE_PATH.match(scope["path"])
+            if match:
+                return f"store:{match.group(1)}"
+        client = scope.get("client")
+        return f"ip:{client[0] if client else 'unknown'}"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        allowed, _, retry_after = self.limiter.hit(self._key(scope))
+        if not allowed:
+            response = JSONResponse(
+                status_code=429,
+                content={
+                    "error": "Rate limit exceeded",
+                    "detail": f"Maximum {self.calls} requests per {self.period} seconds"
+                },
+                headers={"Retry-After": str(retry_after)}
             )
-        else:
-            # Strict CSP for API endpoints
-            response.headers["Content-Security-Policy"] = "default-src 'self'"
-        
-        return response
-
-class RequestLoggingMiddleware(BaseHTTPMiddleware):
-    """Log all requests for monitoring."""
-    
-    async def dispatch(self, request: Request, call_next):
-        start_time = time.time()
-        
-        # Log request
-        logger.info(f"Request: {request.method} {request.url.path} from {request.client.host}")
-        
-        response = await call_next(request)
-        
-        # Log response
-        process_time = time.time() - start_time
-        logger.info(f"Response: {response.status_code} in {process_time:.3f}s")
-        
-        return response
-
-class RateLimitMiddleware(BaseHTTPMiddleware):
-    """Simple rate limiting middleware."""
-    
-    def __init__(self, app, calls: int = 100, period: int = 60):
-        super().__init__(app)
-        self.calls = calls
-        self.period = period
-        self.clients = {}
-    
-    async def dispatch(self, request: Request, call_next):
-        client_ip = request.client.host
-        current_time = time.time()
-        
-        # Clean old entries
-        self.clients = {
-            ip: times for ip, times in self.clients.items()
-            if any(t > current_time - self.period for t in times)
-        }
-        
-        # Check rate limit
-        if client_ip in self.clients:
-            # Filter recent requests
-            recent_requests = [
-                t for t in self.clients[client_ip]
-                if t > current_time - self.period
-            ]
-            
-            if len(recent_requests) >= self.calls:
-                return JSONResponse(
-                    status_code=429,
-                    content={
-                        "error": "Rate limit exceeded",
-                        "detail": f"Maximum {self.calls} requests per {self.period} seconds"
-                    }
-                )
-            
-            self.clients[client_ip] = recent_requests + [current_time]
-        else:
-            self.clients[client_ip] = [current_time]
-        
-        return await call_next(request)
\ No newline at end of file
+            await response(scope, receive, send)
+            return
+
+        await self.app(scope, receive, send)
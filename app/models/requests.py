@@ -2,6 +2,8 @@ from pydantic import BaseModel, Field, validator
 from typing import Any, Dict, List, Optional
 import re
 
+from ..utils.file import reserved_name_error
+
 class StoreRequest(BaseModel):
     store_id: str = Field(..., min_length=1, max_length=50, description="Store identifier")
     
@@ -33,7 +35,7 @@ class JsonFileRequest(BaseModel):
 class JsonUpdateRequest(JsonFileRequest):
     data: Dict[str, Any] = Field(..., description="JSON data to update")
 
-class ImageDeleteRequest(BaseModel):
+class ImageFileRequest(BaseModel):
     store_id: str = Field(..., min_length=1, max_length=50)
     filename: str = Field(..., min_length=1, max_length=100)
     
@@ -53,6 +55,27 @@ class ImageDeleteRequest(BaseModel):
             raise ValueError('Filename contains invalid characters')
         return v
 
+class ImageDeleteRequest(ImageFileRequest):
+    pass
+
+class UploadSessionRequest(BaseModel):
+    filename: str = Field(..., min_length=1, max_length=100)
+    size: int = Field(..., gt=0, description="Total file size in bytes")
+    fingerprint: bool = Field(False, description="Also store the image under a content-hash name")
+    
+    @validator('filename')
+    def validate_filename(cls, v):
+        allowed_extensions = {'.webp', '.png'}
+        if not any(v.lower().endswith(ext) for ext in allowed_extensions):
+            raise ValueError('File must be .webp or .png')
+        clean_name = re.sub(r'[^a-zA-Z0-9._-]', '', v)
+        if clean_name != v:
+            raise ValueError('Filename contains invalid characters')
+        reserved = reserved_name_error(v)
+        if reserved is not None:
+            raise ValueError(reserved)
+        return v
+
 class DynamicJsonRequest(BaseModel):
     store_id: str = Field(..., min_length=1, max_length=50)
     template_name: str = Field(..., min_length=1, max_length=50, description="Template name (without lg/sm suffix)")
@@ -13,14 +13,77 @@ class ErrorResponse(BaseModel):
 class StoreInitResponse(BaseResponse):
     url: str = Field(..., description="Store URL")
 
+class StoreImportResponse(BaseResponse):
+    store_id: str
+    json_files: int = Field(..., description="JSON documents imported")
+    images: int = Field(..., description="Images imported")
+    bytes: int = Field(..., description="Bytes extracted from the archive")
+
+class ImageDerivative(BaseModel):
+    label: str = Field(..., description="Configured size label, e.g. thumb, sm or lg")
+    path: str = Field(..., description="Relative path to the derivative")
+    filename: str
+    width: int
+    height: int
+    size: int = Field(..., description="File size in bytes")
+
 class ImageUploadResponse(BaseResponse):
     path: str = Field(..., description="Relative path to uploaded image")
     store_id: str
     filename: str
     size: int = Field(..., description="File size in bytes")
+    original_size: Optional[int] = Field(None, description="Size as uploaded, before recompression")
+    fingerprinted_path: Optional[str] = Field(None, description="Immutable content-hash path of this version")
+    derivatives: Optional[List[ImageDerivative]] = Field(None, description="Resized copies written next to the image")
+    placeholder: Optional[str] = Field(None, description="Blurred low-quality placeholder as a data URI")
+
+class ImageBatchItem(BaseModel):
+    filename: str
+    success: bool
+    error: Optional[str] = None
+    upload: Optional[ImageUploadResponse] = None
+
+class ImageBatchUploadResponse(BaseResponse):
+    uploaded: int = Field(..., description="Files stored successfully")
+    failed: int = Field(..., description="Files rejected or failed")
+    results: List[ImageBatchItem] = Field(..., description="One result per file part, in request order")
+
+class ImageInfo(BaseModel):
+    name: str
+    size: int = Field(..., description="File size in bytes")
+    mtime_ns: int = Field(..., description="Modification time in nanoseconds since the epoch")
+    width: Optional[int] = None
+    height: Optional[int] = None
+    format: Optional[str] = Field(None, description="png or webp, read from the file header")
+    sha256: Optional[str] = None
 
 class ImageListResponse(BaseResponse):
     images: List[str] = Field(..., description="List of image filenames")
+    items: List[ImageInfo] = Field(default=[], description="Metadata for each listed image")
+    next_cursor: Optional[str] = Field(None, description="Cursor for the next page, absent on the last page")
+
+class UploadSessionResponse(BaseResponse):
+    upload_id: str
+    store_id: str
+    filename: str
+    size: int = Field(..., description="Declared file size in bytes")
+    offset: int = Field(..., description="Bytes received contiguously from the start")
+    received: List[List[int]] = Field(..., description="Received byte ranges as [start, end) pairs")
+    expires_at: float = Field(..., description="Unix time the session expires without further activity")
+
+class ImageOptimizeJob(BaseModel):
+    store_id: str
+    total: int = Field(..., description="PNG images queued for reprocessing")
+    processed: int
+    failed: int
+    bytes_saved: int
+    started_at: float
+    finished_at: Optional[float] = None
+    running: bool
+
+class ImageOptimizationResponse(BaseResponse):
+    savings: Dict[str, int] = Field(..., description="Bytes saved by recompression in this store")
+    job: Optional[ImageOptimizeJob] = Field(None, description="Latest background reprocessing run in this worker")
 
 class JsonListResponse(BaseResponse):
     json_files: List[str] = Field(..., description="List of JSON filenames")
@@ -28,6 +91,26 @@ class JsonListResponse(BaseResponse):
 class JsonContentResponse(BaseResponse):
     data: Dict[str, Any] = Field(..., description="JSON file content")
 
+class JsonBundleResponse(BaseResponse):
+    files: Dict[str, Any] = Field(..., description="JSON file contents keyed by filename")
+    errors: Dict[str, str] = Field(default={}, description="Files that could not be read, with the reason")
+
+class TemplateInfo(BaseModel):
+    name: str
+    size: int = Field(..., description="Template size in bytes")
+    sha256: str = Field(..., description="SHA-256 of the template bytes")
+
+class TemplateListResponse(BaseResponse):
+    templates: List[TemplateInfo] = Field(..., description="Templates in the registry")
+
+class BlobStatsResponse(BaseResponse):
+    blobs: int = Field(..., description="Distinct stored images")
+    references: int = Field(..., description="Store images linked to a blob")
+    bytes: int = Field(..., description="Bytes held by blobs")
+    bytes_saved: int = Field(..., description="Bytes that would be used again without sharing")
+    removed: Optional[int] = Field(None, description="Blobs removed by a collection run")
+    bytes_freed: Optional[int] = Field(None, description="Bytes freed by a collection run")
+
 class DynamicJsonResponse(BaseResponse):
     created_files: List[str] = Field(..., description="List of created files")
 
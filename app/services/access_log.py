@@ -0,0 +1,224 @@
+"""
+Structured access log and non-blocking log delivery.
+
+Request handlers never write to stdout themselves. The access log is one JSON
+line per request, handed to a bounded queue and serialized and written by a
+background thread in batches, one write and flush per batch. Application log
+records go through a second queue to the handlers configured at startup, so a
+slow consumer of the container's stdout can no longer stall the event loop.
+
+When a queue is full the record is dropped and counted rather than waiting.
+Successful responses can be sampled with ACCESS_LOG_SAMPLE_RATE; client and
+server errors are always logged.
+"""
+import sys
+import json
+import time
+import queue
+import random
+import logging
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, List, Optional, TextIO
+
+from ..config import Config
+
+logger = logging.getLogger(__name__)
+config = Config()
+
+ACCESS_LOGGER_NAME = "store_api.access"
+
+# Queued by stop() to tell the writer thread to finish
+_STOP = object()
+
+class DroppingQueueHandler(QueueHandler):
+    """A QueueHandler that never blocks: records that do not fit are counted and dropped."""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+class AccessLogHandler(DroppingQueueHandler):
+    """Queues access records as they are; formatting happens on the writer thread."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+class BatchWriter:
+    """
+    Drains a queue of access records on a daemon thread and writes them as
+    JSON lines. A batch is written once batch_size records are waiting or
+    flush_interval seconds after its first record, whichever comes first.
+    """
+
+    def __init__(self, log_queue: queue.Queue, stream: TextIO, batch_size: int, flush_interval: float):
+        self.queue = log_queue
+        self.stream = stream
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.written = 0
+        self.batches = 0
+        self.errors = 0
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="access-log", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Write what is queued and stop the thread."""
+        if self._thread is not None:
+            try:
+                self.queue.put(_STOP, timeout=timeout)
+            except queue.Full:
+                pass
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _collect(self, first: Any) -> List[Any]:
+        batch = [first]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            try:
+                record = self.queue.get_nowait()
+            except queue.Empty:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    record = self.queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            batch.append(record)
+            if record is _STOP:
+                break
+        return batch
+
+    def _write(self, records: List[logging.LogRecord]) -> None:
+        lines = [format_record(record) for record in records]
+        try:
+            self.stream.write("".join(lines))
+            self.stream.flush()
+            self.written += len(lines)
+            self.batches += 1
+        except Exception:
+            # Nowhere left to report it; count it and keep draining
+            self.errors += 1
+
+    def _run(self) -> None:
+        while True:
+            batch = self._collect(self.queue.get())
+            stopping = batch[-1] is _STOP
+            records = batch[:-1] if stopping else batch
+            if records:
+                self._write(records)
+            if stopping:
+                return
+
+def format_record(record: logging.LogRecord) -> str:
+    """One JSON line for an access record."""
+    entry = {
+        "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds")
+    }
+    entry.update(getattr(record, "access", None) or {"message": record.getMessage()})
+    return json.dumps(entry, separators=(",", ":"), default=str) + "\n"
+
+class _AppLogListener(QueueListener):
+    """QueueListener whose stop() waits for room instead of failing on a full queue."""
+
+    def enqueue_sentinel(self) -> None:
+        self.queue.put(self._sentinel)
+
+class AccessLog:
+    """Samples and queues access records, and owns the threads that write them."""
+
+    def __init__(
+        self,
+        enabled: bool,
+        sample_rate: float,
+        queue_size: int,
+        batch_size: int,
+        flush_interval: float
+    ):
+        self.enabled = enabled
+        self.sample_rate = min(1.0, max(0.0, sample_rate))
+        self.sampled_out = 0
+        self.queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.handler = AccessLogHandler(self.queue)
+        self.writer = BatchWriter(self.queue, sys.stdout, batch_size, flush_interval)
+        self.logger = logging.getLogger(ACCESS_LOGGER_NAME)
+        self.logger.addHandler(self.handler)
+        self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False
+
+        self._app_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._app_handler = DroppingQueueHandler(self._app_queue)
+        self._app_listener: Optional[_AppLogListener] = None
+        self._app_handlers: List[logging.Handler] = []
+
+    def record(self, status_code: int, fields: Dict[str, Any]) -> None:
+        """Log one finished request; successful responses are sampled."""
+        if not self.enabled:
+            return
+        if status_code < 400 and self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            self.sampled_out += 1
+            return
+        self.logger.info("access", extra={"access": fields})
+
+    def start(self) -> None:
+        """
+        Start the access log writer and move the root logger's handlers behind
+        a queue listener. Called from the lifespan, after gunicorn has forked.
+        """
+        self.writer.start()
+        root = logging.getLogger()
+        if self._app_listener is None and root.handlers:
+            self._app_handlers = root.handlers[:]
+            self._app_listener = _AppLogListener(self._app_queue, *self._app_handlers, respect_handler_level=True)
+            for handler in self._app_handlers:
+                root.removeHandler(handler)
+            root.addHandler(self._app_handler)
+            self._app_listener.start()
+
+    def stop(self) -> None:
+        """Flush both queues and give the root logger its handlers back."""
+        if self._app_listener is not None:
+            root = logging.getLogger()
+            root.removeHandler(self._app_handler)
+            self._app_listener.stop()
+            for handler in self._app_handlers:
+                root.addHandler(handler)
+            self._app_listener = None
+            self._app_handlers = []
+        self.writer.stop()
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth and counters for monitoring."""
+        return {
+            "enabled": self.enabled,
+            "sample_rate": self.sample_rate,
+            "queued": self.queue.qsize(),
+            "written": self.writer.written,
+            "batches": self.writer.batches,
+            "dropped": self.handler.dropped,
+            "sampled_out": self.sampled_out,
+            "write_errors": self.writer.errors,
+            "app_log_queued": self._app_queue.qsize(),
+            "app_log_dropped": self._app_handler.dropped
+        }
+
+access_log = AccessLog(
+    config.ACCESS_LOG,
+    config.ACCESS_LOG_SAMPLE_RATE,
+    config.ACCESS_LOG_QUEUE_SIZE,
+    config.ACCESS_LOG_BATCH_SIZE,
+    config.ACCESS_LOG_FLUSH_INTERVAL
+)
@@ -0,0 +1,356 @@
+"""
+Store export and import as tar archives.
+
+Exports are generated while the store's ``json/`` and ``image/`` trees are
+walked: each file is read and compressed in fixed-size blocks, so memory use
+is constant and nothing is staged on disk. Files that share an inode
+(fingerprinted names, deduplicated images) are written once and then as tar
+hardlinks.
+
+Imports are unpacked from the request body into a staging directory on the
+same volume, validated, and swapped in place of the store with a single
+rename, so readers see either the old store or the new one.
+"""
+import io
+import os
+import json
+import uuid
+import errno
+import ctypes
+import shutil
+import asyncio
+import hashlib
+import tarfile
+import zlib
+import logging
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from .executor import run_io
+from .metrics import record_disk_read, record_disk_write
+from . import storage, image_index
+from .upload_sessions import SESSIONS_DIRNAME
+from ..utils.file import allowed_file, check_image_header, verify_image
+from ..utils.imageinfo import HEADER_SIZE
+from ..utils.validation import sanitize_filename
+from ..config import Config
+
+logger = logging.getLogger(__name__)
+config = Config()
+
+STORE_TREES = ("json", "image")
+
+# Read size per file block; also the most a compressor holds before emitting
+BLOCK_SIZE = 1024 * 1024
+
+COMPRESSIONS = {
+    "none": ("application/x-tar", ".tar"),
+    "gzip": ("application/gzip", ".tar.gz"),
+    "zstd": ("application/zstd", ".tar.zst"),
+}
+
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+# renameat2 flag that swaps two paths in one step (Linux 3.15+)
+RENAME_EXCHANGE = 2
+AT_FDCWD = -100
+
+class ArchiveError(ValueError):
+    """Raised for archives that cannot be imported as a store."""
+
+class _Identity:
+    """Stands in for a compressor when the archive is not compressed."""
+
+    def compress(self, data: bytes) -> bytes:
+        return data
+
+    def flush(self) -> bytes:
+        return b""
+
+def compression_available(compression: str) -> bool:
+    return compression in COMPRESSIONS and (compression != "zstd" or zstandard is not None)
+
+def _compressor(compression: str):
+    if compression == "gzip":
+        return zlib.compressobj(6, zlib.DEFLATED, 31)
+    if compression == "zstd":
+        return zstandard.ZstdCompressor(level=3).compressobj()
+    return _Identity()
+
+def _list_entries(store_path: str) -> List[Tuple[str, str]]:
+    entries = []
+    for tree in STORE_TREES:
+        directory = os.path.join(store_path, tree)
+        if not os.path.isdir(directory):
+            continue
+        # Dotfiles are in-flight temporary files, never store content
+        names = sorted(
+            entry.name for entry in os.scandir(directory)
+            if not entry.name.startswith(".") and entry.is_file(follow_symlinks=False)
+        )
+        entries += [(f"{tree}/{name}", os.path.join(directory, name)) for name in names]
+    return entries
+
+def _open_member(path: str) -> Optional[Tuple[int, os.stat_result]]:
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except FileNotFoundError:
+        return None
+    return fd, os.fstat(fd)
+
+def _pack_block(fd: int, size: int, compressor) -> bytes:
+    """Read up to size bytes and compress them; a file that shrank is padded with zeros."""
+    data = os.read(fd, size)
+    record_disk_read("archive", len(data))
+    if len(data) < size:
+        data += b"\0" * (size - len(data))
+    return compressor.compress(data)
+
+def _tar_header(arcname: str, st: os.stat_result, linkname: Optional[str] = None) -> bytes:
+    info = tarfile.TarInfo(arcname)
+    info.mode = 0o644
+    info.mtime = int(st.st_mtime)
+    if linkname is None:
+        info.size = st.st_size
+    else:
+        info.type = tarfile.LNKTYPE
+        info.linkname = linkname
+    return info.tobuf(tarfile.PAX_FORMAT, "utf-8", "surrogateescape")
+
+async def export_store(store_path: str, compression: str = "gzip") -> AsyncIterator[bytes]:
+    """
+    Yield a tar archive of a store's JSON documents and images. The size of
+    each file is taken when it is opened; content is read through the same
+    descriptor, so a file replaced mid-export is exported as it was.
+    """
+    compressor = _compressor(compression)
+    links: Dict[Tuple[int, int], str] = {}
+
+    for arcname, path in await run_io(_list_entries, store_path):
+        opened = await run_io(_open_member, path)
+        if opened is None:
+            continue
+        fd, st = opened
+        try:
+            inode = (st.st_dev, st.st_ino)
+            if inode in links:
+                out = compressor.compress(_tar_header(arcname, st, links[inode]))
+                if out:
+                    yield out
+                continue
+            links[inode] = arcname
+
+            out = compressor.compress(_tar_header(arcname, st))
+            if out:
+                yield out
+            remaining = st.st_size
+            while remaining:
+                size = min(BLOCK_SIZE, remaining)
+                out = await run_io(_pack_block, fd, size, compressor)
+                remaining -= size
+                if out:
+                    yield out
+            padding = -st.st_size % tarfile.BLOCKSIZE
+            if padding:
+                out = compressor.compress(b"\0" * padding)
+                if out:
+                    yield out
+        finally:
+            await run_io(os.close, fd)
+
+    # End-of-archive marker: two empty blocks
+    yield compressor.compress(b"\0" * (2 * tarfile.BLOCKSIZE)) + compressor.flush()
+
+class _BodyReader(io.RawIOBase):
+    """Blocking file object over an async request body, read from a worker thread."""
+
+    def __init__(self, chunks: AsyncIterator[bytes], loop: asyncio.AbstractEventLoop):
+        self._chunks = chunks.__aiter__()
+        self._loop = loop
+        self._buffer = memoryview(b"")
+        self._eof = False
+
+    async def _next(self) -> bytes:
+        return await self._chunks.__anext__()
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        while not self._buffer and not self._eof:
+            try:
+                self._buffer = memoryview(
+                    asyncio.run_coroutine_threadsafe(self._next(), self._loop).result()
+                )
+            except StopAsyncIteration:
+                self._eof = True
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        return n
+
+def _open_archive(body: io.BufferedReader) -> tarfile.TarFile:
+    magic = body.peek(len(ZSTD_MAGIC))[:len(ZSTD_MAGIC)]
+    if magic.startswith(GZIP_MAGIC):
+        return tarfile.open(fileobj=body, mode="r|gz")
+    if magic == ZSTD_MAGIC:
+        if zstandard is None:
+            raise ArchiveError("zstd archives require the zstandard package")
+        return tarfile.open(fileobj=zstandard.ZstdDecompressor().stream_reader(body), mode="r|")
+    return tarfile.open(fileobj=body, mode="r|")
+
+def _member_target(name: str) -> Tuple[str, str]:
+    """Split a member name into (tree, filename), rejecting anything outside the store layout."""
+    tree, _, filename = name.partition("/")
+    if (tree not in STORE_TREES or not filename or filename.startswith(".")
+            or sanitize_filename(filename) != filename):
+        raise ArchiveError(f"Unexpected archive entry: {name}")
+    if tree == "json" and not filename.endswith(".json"):
+        raise ArchiveError(f"Not a JSON document: {name}")
+    if tree == "image" and not allowed_file(filename):
+        raise ArchiveError(f"Not a WebP or PNG image: {name}")
+    return tree, filename
+
+def _extract_member(source, target: str, name: str, limit: int, is_image: bool) -> Tuple[int, Optional[str]]:
+    """Copy one file out of the archive; images are checked and hashed on the way."""
+    hasher = hashlib.sha256() if is_image else None
+    size = 0
+    with open(target, "xb") as f:
+        while True:
+            chunk = source.read(BLOCK_SIZE)
+            if not chunk:
+                break
+            if size == 0 and is_image:
+                error = check_image_header(chunk[:HEADER_SIZE], os.path.basename(target))
+                if error is not None:
+                    raise ArchiveError(f"{name}: {error}")
+            size += len(chunk)
+            if size > limit:
+                raise ArchiveError(f"{name}: exceeds the import size limit")
+            if hasher is not None:
+                hasher.update(chunk)
+            f.write(chunk)
+            record_disk_write("archive", len(chunk))
+    return size, hasher.hexdigest() if hasher is not None else None
+
+def _extract(body: io.BufferedReader, staging: str) -> Dict[str, object]:
+    for tree in STORE_TREES:
+        os.makedirs(os.path.join(staging, tree))
+    seen: Dict[str, Optional[str]] = {}
+    images: List[Tuple[str, str]] = []
+    json_files = 0
+    total = 0
+
+    with _open_archive(body) as archive:
+        for member in archive:
+            name = member.name.rstrip("/")
+            if member.isdir() and name in STORE_TREES:
+                continue
+            tree, filename = _member_target(name)
+            if name in seen:
+                raise ArchiveError(f"Duplicate archive entry: {name}")
+            target = os.path.join(staging, tree, filename)
+
+            if member.islnk():
+                # Only links to files already extracted from this archive
+                if member.linkname not in seen or member.linkname.partition("/")[0] != tree:
+                    raise ArchiveError(f"Invalid link in archive: {name}")
+                os.link(os.path.join(staging, member.linkname), target)
+                digest = seen[member.linkname]
+            elif member.isfile():
+                limit = config.MAX_IMPORT_SIZE - total
+                if tree == "image":
+                    limit = min(limit, config.MAX_CONTENT_LENGTH)
+                size, digest = _extract_member(archive.extractfile(member), target, name, limit, tree == "image")
+                total += size
+                if tree == "image":
+                    try:
+                        verify_image(target)
+                    except Exception as e:
+                        raise ArchiveError(f"{name}: {str(e)}")
+                else:
+                    with open(target, "rb") as f:
+                        try:
+                            json.load(f)
+                        except ValueError:
+                            raise ArchiveError(f"Invalid JSON document: {name}")
+            else:
+                raise ArchiveError(f"Unsupported archive entry: {name}")
+
+            seen[name] = digest
+            if tree == "image":
+                images.append((target, digest))
+            else:
+                json_files += 1
+
+    return {"json_files": json_files, "images": images, "bytes": total}
+
+def _exchange(a: str, b: str) -> bool:
+    """Atomically swap two paths; returns False where the kernel cannot."""
+    renameat2 = getattr(ctypes.CDLL(None, use_errno=True), "renameat2", None)
+    if renameat2 is None:
+        return False
+    if renameat2(AT_FDCWD, os.fsencode(a), AT_FDCWD, os.fsencode(b), RENAME_EXCHANGE) == 0:
+        return True
+    err = ctypes.get_errno()
+    if err in (errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP):
+        return False
+    raise OSError(err, os.strerror(err), b)
+
+def _swap_in(staging: str, store_path: str) -> bool:
+    """
+    Put staging in place of store_path. Returns True if a previous store was
+    replaced; it is then left at the staging path for removal.
+    """
+    try:
+        os.rename(staging, store_path)
+        return False
+    except OSError as e:
+        if e.errno not in (errno.EEXIST, errno.ENOTEMPTY):
+            raise
+    if _exchange(staging, store_path):
+        return True
+    # No atomic exchange here; the store is briefly missing between the renames
+    previous = f"{staging}.old"
+    os.rename(store_path, previous)
+    os.rename(staging, store_path)
+    os.rename(previous, staging)
+    return True
+
+async def import_store(store_path: str, chunks: AsyncIterator[bytes]) -> Dict[str, int]:
+    """
+    Replace a store with the contents of a tar archive streamed from chunks,
+    creating it if needed. Plain, gzip and zstd archives are detected from
+    their first bytes. Only flat json/ and image/ trees are accepted; JSON
+    must parse and images must verify. Raises ArchiveError for archives
+    that are rejected, leaving the store untouched.
+    """
+    # In-progress data lives with upload sessions, whose sweeper removes leftovers of crashed imports
+    staging = os.path.join(config.UPLOAD_FOLDER, SESSIONS_DIRNAME, f"import-{uuid.uuid4().hex}")
+    await storage.make_dirs(os.path.dirname(staging))
+    body = io.BufferedReader(_BodyReader(chunks, asyncio.get_running_loop()), BLOCK_SIZE)
+    try:
+        try:
+            result = await run_io(_extract, body, staging)
+        except tarfile.TarError as e:
+            raise ArchiveError(f"Invalid archive: {str(e)}")
+        except zlib.error as e:
+            raise ArchiveError(f"Invalid gzip data: {str(e)}")
+
+        # An empty index first, so recording the images does not rescan them
+        image_dir = os.path.join(staging, "image")
+        await image_index.rebuild(image_dir)
+        await storage.adopt_images(result["images"])
+
+        if await run_io(_swap_in, staging, store_path):
+            await storage.remove_tree(staging)
+    except BaseException:
+        await run_io(shutil.rmtree, staging, True)
+        raise
+
+    return {"json_files": result["json_files"], "images": len(result["images"]), "bytes": result["bytes"]}
@@ -0,0 +1,147 @@
+"""
+Store bundles: every JSON document of a store in a single response.
+
+Members are read concurrently through the document cache and streamed out as
+they complete. A fully built bundle is kept as an artifact keyed by the stat
+signature of its members, so it is rebuilt only after one of them changes.
+"""
+import os
+import json
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from .executor import run_io
+from .json_cache import stat_key
+from . import storage
+from ..config import Config
+
+config = Config()
+
+Signature = Tuple[Tuple[str, Tuple[int, int, int]], ...]
+
+def _scan_members(json_dir: str, suffix: str) -> List[Tuple[str, os.stat_result]]:
+    members = []
+    with os.scandir(json_dir) as entries:
+        for entry in entries:
+            if entry.name.endswith(suffix) and entry.is_file():
+                members.append((entry.name, entry.stat()))
+    members.sort()
+    return members
+
+async def scan_members(json_dir: str, variant: Optional[str] = None) -> List[Tuple[str, os.stat_result]]:
+    """List and stat a store's JSON documents in one pool call, optionally for one variant."""
+    suffix = f"{variant}.json" if variant else ".json"
+    return await run_io(_scan_members, json_dir, suffix)
+
+def signature_of(members: List[Tuple[str, os.stat_result]]) -> Signature:
+    return tuple((name, stat_key(st)) for name, st in members)
+
+def etag_of(signature: Signature) -> str:
+    """Strong ETag for a bundle, derived from its members' stat signatures."""
+    digest = hashlib.sha256(repr(signature).encode("utf-8")).hexdigest()
+    return f'"bundle-{digest[:32]}"'
+
+class BundleCache:
+    """LRU of built bundle bytes keyed by (store_id, variant), bounded in bytes."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[Signature, bytes]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Tuple[str, str], signature: Signature) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != signature:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: Tuple[str, str], signature: Signature, body: bytes) -> None:
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= len(old[1])
+            if len(body) > self.max_bytes:
+                return
+            self._entries[key] = (signature, body)
+            self.current_bytes += len(body)
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.current_bytes -= len(evicted)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses
+            }
+
+bundle_cache = BundleCache(config.JSON_BUNDLE_CACHE_MAX_BYTES)
+
+async def stream_bundle(
+    store_id: str,
+    json_dir: str,
+    variant: Optional[str],
+    members: List[Tuple[str, os.stat_result]]
+) -> AsyncIterator[bytes]:
+    """
+    Yield the bundle document. Members that cannot be read or parsed are
+    reported under "errors" instead of failing the whole bundle.
+    """
+    signature = signature_of(members)
+    cache_key = (store_id, variant or "")
+    cached = bundle_cache.get(cache_key, signature)
+    if cached is not None:
+        yield cached
+        return
+
+    async def load(name: str, st: os.stat_result):
+        path = os.path.join(json_dir, name)
+        try:
+            return name, await storage.read_document(store_id, name, path, st), None
+        except FileNotFoundError:
+            return name, None, "File not found"
+        except storage.EmptyFileError:
+            return name, None, "File is empty"
+        except json.JSONDecodeError as e:
+            return name, None, f"Invalid JSON format: {str(e)}"
+        except (OSError, ValueError) as e:
+            # The first piece is already sent, so nothing may escape; includes UnicodeDecodeError
+            return name, None, f"File cannot be read: {str(e)}"
+
+    pieces = [
+        b'{"success":true,"message":' + json.dumps(f"Found {len(members)} JSON files").encode("utf-8") +
+        b',"files":{'
+    ]
+    yield pieces[0]
+
+    errors: Dict[str, str] = {}
+    first = True
+    for next_done in asyncio.as_completed([load(name, st) for name, st in members]):
+        name, document, error = await next_done
+        if document is None:
+            errors[name] = error
+            continue
+        piece = (b"" if first else b",") + json.dumps(name).encode("utf-8") + b":" + document.raw.strip()
+        first = False
+        pieces.append(piece)
+        yield piece
+
+    tail = b'},"errors":' + json.dumps(errors, ensure_ascii=False).encode("utf-8") + b"}"
+    pieces.append(tail)
+    yield tail
+
+    if not errors:
+        bundle_cache.put(cache_key, signature, b"".join(pieces))
@@ -0,0 +1,119 @@
+"""
+Responsive image derivatives generated at upload time.
+
+Each configured width is rendered next to the original as
+``<stem>.<label>.<ext>`` together with a tiny blurred placeholder (LQIP).
+Uploads may not use such names, and the store's image listing leaves them
+out. Resizing runs on the CPU process pool, never on the event loop.
+"""
+import os
+import io
+import base64
+import hashlib
+import logging
+from typing import Any, Dict, List, Tuple
+
+from PIL import Image, ImageFilter
+
+from .executor import run_cpu
+from . import storage
+from ..config import Config
+from ..utils.file import PLACEHOLDER_LABEL, derivative_name
+
+logger = logging.getLogger(__name__)
+config = Config()
+
+# Pillow format names for the extensions accepted by allowed_file
+_FORMATS = {"png": "PNG", "webp": "WEBP"}
+
+def parse_widths(spec: str) -> List[Tuple[str, int]]:
+    """Parse "thumb:160,sm:640" into [("thumb", 160), ("sm", 640)], widest first."""
+    widths = []
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        label, _, width = item.partition(":")
+        widths.append((label.strip(), int(width)))
+    widths.sort(key=lambda pair: pair[1], reverse=True)
+    return widths
+
+DERIVATIVE_WIDTHS = parse_widths(config.IMAGE_DERIVATIVE_WIDTHS)
+
+def derivative_names(filename: str) -> List[str]:
+    """Every file name the pipeline may have written for an original."""
+    labels = [label for label, _ in DERIVATIVE_WIDTHS] + [PLACEHOLDER_LABEL]
+    return [derivative_name(filename, label) for label in labels]
+
+def _save_atomic(img: Image.Image, path: str, fmt: str, **params) -> Tuple[int, str]:
+    """Write the encoded image via a renamed temporary file; returns size and SHA-256."""
+    buffer = io.BytesIO()
+    img.save(buffer, format=fmt, **params)
+    data = buffer.getvalue()
+    temp_path = f"{path}.tmp"
+    try:
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return len(data), hashlib.sha256(data).hexdigest()
+
+def _render(source_path: str, widths: List[Tuple[str, int]], placeholder_width: int) -> Dict[str, Any]:
+    """
+    Process pool entry point. Widths are rendered widest first and each one is
+    resized from the previous result, so the full-size image is decoded and
+    scaled only once. Widths at or above the original width are skipped.
+    """
+    directory, filename = os.path.split(source_path)
+    fmt = _FORMATS[filename.rsplit(".", 1)[1].lower()]
+    params = {"quality": 80, "method": 4} if fmt == "WEBP" else {"optimize": True}
+
+    derivatives = []
+    with Image.open(source_path) as original:
+        img = original.convert("RGBA" if original.mode in ("P", "LA", "RGBA", "PA") else "RGB")
+    source_width = img.width
+
+    for label, width in widths:
+        if width >= source_width:
+            continue
+        height = max(1, round(img.height * width / img.width))
+        img = img.resize((width, height), Image.Resampling.LANCZOS, reducing_gap=3.0)
+        name = derivative_name(filename, label)
+        size, digest = _save_atomic(img, os.path.join(directory, name), fmt, **params)
+        derivatives.append({
+            "label": label, "filename": name, "width": width, "height": height, "size": size, "sha256": digest
+        })
+
+    height = max(1, round(img.height * placeholder_width / img.width))
+    tiny = img.resize((placeholder_width, height), Image.Resampling.BILINEAR)
+    tiny = tiny.filter(ImageFilter.GaussianBlur(1))
+    buffer = io.BytesIO()
+    tiny.save(buffer, format="WEBP", quality=30)
+    placeholder = buffer.getvalue()
+    name = derivative_name(filename, PLACEHOLDER_LABEL)
+    _, digest = _save_atomic(tiny, os.path.join(directory, name), fmt, **params)
+
+    return {
+        "derivatives": derivatives,
+        "placeholder_file": {"filename": name, "sha256": digest},
+        "placeholder": "data:image/webp;base64," + base64.b64encode(placeholder).decode("ascii")
+    }
+
+async def generate_derivatives(full_path: str) -> Dict[str, Any]:
+    """
+    Render the configured derivatives of a committed image on the process pool
+    and link them into the blob store, so identical uploads share them too.
+    """
+    # Drop what an earlier version rendered, e.g. widths this one is too narrow for
+    directory = os.path.dirname(full_path)
+    for name in derivative_names(os.path.basename(full_path)):
+        path = os.path.join(directory, name)
+        if await storage.is_file(path):
+            await storage.remove_image(path)
+    rendered = await run_cpu(_render, full_path, DERIVATIVE_WIDTHS, config.IMAGE_PLACEHOLDER_WIDTH)
+    for written in rendered["derivatives"] + [rendered["placeholder_file"]]:
+        await storage.adopt_image(os.path.join(directory, written["filename"]), written.pop("sha256"))
+    return rendered
@@ -0,0 +1,122 @@
+"""
+Bounded executors for work that must not run on the event loop.
+
+Blocking filesystem calls go to a dedicated thread pool and CPU-heavy work to a
+process pool. Both are created lazily, so gunicorn's --preload never forks a
+running pool, and both track queue depth for monitoring.
+"""
+import asyncio
+import functools
+import logging
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional
+
+from .metrics import timed_disk_operation
+from ..config import Config
+
+logger = logging.getLogger(__name__)
+config = Config()
+
+class BoundedExecutor:
+    """A lazily created worker pool that records how much work is queued on it."""
+    
+    def __init__(self, name: str, max_workers: int, kind: str = "thread"):
+        self.name = name
+        self.max_workers = max(1, max_workers)
+        self.kind = kind
+        self._pool: Optional[Executor] = None
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+    
+    def _get_pool(self) -> Executor:
+        if self._pool is None:
+            if self.kind == "process":
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            else:
+                self._pool = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix=self.name
+                )
+            logger.info(f"Started {self.kind} pool '{self.name}' with {self.max_workers} workers")
+        return self._pool
+    
+    async def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run fn(*args, **kwargs) on the pool and await its result."""
+        loop = asyncio.get_running_loop()
+        if kwargs:
+            fn = functools.partial(fn, **kwargs)
+        
+        self.submitted += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        pool = self._get_pool()
+        try:
+            result = await loop.run_in_executor(pool, fn, *args)
+        except BrokenProcessPool:
+            # A child died (e.g. OOM-killed); start a fresh pool for the next call
+            self.failed += 1
+            logger.error(f"{self.kind.capitalize()} pool '{self.name}' is broken, restarting it")
+            self._discard_pool(pool)
+            raise
+        except BaseException:
+            self.failed += 1
+            raise
+        finally:
+            self.in_flight -= 1
+            self.completed += 1
+        return result
+    
+    def stats(self) -> Dict[str, Any]:
+        """Return a snapshot of pool size and queue depth."""
+        return {
+            "kind": self.kind,
+            "max_workers": self.max_workers,
+            "in_flight": self.in_flight,
+            "queued": max(0, self.in_flight - self.max_workers),
+            "max_in_flight": self.max_in_flight,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed
+        }
+    
+    def _discard_pool(self, pool: Executor) -> None:
+        # Several calls fail together when a pool breaks; only drop it once
+        if self._pool is pool:
+            self._pool = None
+            pool.shutdown(wait=False, cancel_futures=True)
+    
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+
+io_executor = BoundedExecutor("store-io", config.IO_WORKERS, kind="thread")
+cpu_executor = BoundedExecutor("store-cpu", config.CPU_WORKERS, kind="process")
+
+async def run_io(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """Run a blocking filesystem call on the I/O thread pool, timing it for /metrics."""
+    return await io_executor.run(timed_disk_operation(fn), *args, **kwargs)
+
+async def run_cpu(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """Run a CPU-heavy, picklable call on the process pool."""
+    return await cpu_executor.run(fn, *args, **kwargs)
+
+def executor_stats() -> Dict[str, Dict[str, Any]]:
+    """Queue-depth metrics for every executor."""
+    return {
+        io_executor.name: io_executor.stats(),
+        cpu_executor.name: cpu_executor.stats()
+    }
+
+def shutdown_executors() -> None:
+    """Stop all worker pools; called from the application lifespan."""
+    io_executor.shutdown()
+    cpu_executor.shutdown()
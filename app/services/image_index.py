@@ -0,0 +1,209 @@
+"""
+Per-store image index.
+
+Each store keeps a small SQLite database next to its image directory with one
+row per image: size, mtime, pixel dimensions, format and SHA-256. Uploads and
+deletes update it incrementally, so listings never rescan the directory. A
+store without an index (created before it existed, or after a reindex) is
+scanned once on first use. Rendered derivatives are not store images and are
+left out.
+"""
+import os
+import base64
+import json
+import sqlite3
+from contextlib import closing
+from typing import Any, Dict, List, Optional, Tuple
+
+from .executor import run_io
+from ..utils.file import allowed_file, file_sha256, is_derivative
+from ..utils.imageinfo import read_image_info
+
+INDEX_FILENAME = ".image-index.sqlite3"
+
+# Stored in meta once a scan finished; raise it to rescan indexes built by older code
+INDEX_VERSION = "2"
+
+SORT_COLUMNS = {"name": "name", "size": "size", "mtime": "mtime_ns"}
+
+_SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS images (
+        name TEXT PRIMARY KEY,
+        size INTEGER NOT NULL,
+        mtime_ns INTEGER NOT NULL,
+        width INTEGER,
+        height INTEGER,
+        format TEXT,
+        sha256 TEXT
+    )""",
+    "CREATE INDEX IF NOT EXISTS images_size ON images (size, name)",
+    "CREATE INDEX IF NOT EXISTS images_mtime ON images (mtime_ns, name)",
+    "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)"
+)
+
+class InvalidCursor(ValueError):
+    """Raised for cursors that were not produced by this index."""
+
+def _index_path(image_dir: str) -> str:
+    return os.path.join(os.path.dirname(image_dir), INDEX_FILENAME)
+
+def _row(path: str, digest: Optional[str]) -> Tuple:
+    st = os.stat(path)
+    info = read_image_info(path) or (None, None, None)
+    return (
+        os.path.basename(path), st.st_size, st.st_mtime_ns,
+        info[1], info[2], info[0], digest or file_sha256(path)
+    )
+
+def _is_listed(filename: str) -> bool:
+    return allowed_file(filename) and not is_derivative(filename)
+
+def _upsert(conn: sqlite3.Connection, row: Tuple) -> None:
+    conn.execute("INSERT OR REPLACE INTO images VALUES (?, ?, ?, ?, ?, ?, ?)", row)
+
+def _scan(conn: sqlite3.Connection, image_dir: str) -> None:
+    conn.execute("DELETE FROM images")
+    if os.path.isdir(image_dir):
+        for entry in os.scandir(image_dir):
+            if _is_listed(entry.name) and entry.is_file():
+                try:
+                    _upsert(conn, _row(entry.path, None))
+                except FileNotFoundError:
+                    continue
+    conn.execute("INSERT OR REPLACE INTO meta VALUES ('built', ?)", (INDEX_VERSION,))
+
+def _is_built(conn: sqlite3.Connection) -> bool:
+    try:
+        row = conn.execute("SELECT value FROM meta WHERE key = 'built'").fetchone()
+        return row is not None and row[0] == INDEX_VERSION
+    except sqlite3.OperationalError:
+        return False
+
+def _connect(image_dir: str, rebuild: bool = False) -> sqlite3.Connection:
+    """Open a store's index, building it from the directory if it is new."""
+    conn = sqlite3.connect(_index_path(image_dir), timeout=10, isolation_level=None)
+    try:
+        if not rebuild and _is_built(conn):
+            return conn
+        conn.execute("PRAGMA journal_mode=WAL")
+        # Concurrent workers wait on the write lock, so only one of them scans
+        conn.execute("BEGIN IMMEDIATE")
+        for statement in _SCHEMA:
+            conn.execute(statement)
+        if rebuild or not _is_built(conn):
+            _scan(conn, image_dir)
+        conn.execute("COMMIT")
+    except Exception:
+        conn.close()
+        raise
+    return conn
+
+def _record(paths: List[Tuple[str, Optional[str]]]) -> None:
+    image_dir = os.path.dirname(paths[0][0])
+    paths = [(path, digest) for path, digest in paths if _is_listed(os.path.basename(path))]
+    if not paths:
+        return
+    rows, missing = [], []
+    for path, digest in paths:
+        try:
+            rows.append(_row(path, digest))
+        except FileNotFoundError:
+            missing.append((os.path.basename(path),))
+    with closing(_connect(image_dir)) as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        for row in rows:
+            _upsert(conn, row)
+        conn.executemany("DELETE FROM images WHERE name = ?", missing)
+        conn.execute("COMMIT")
+
+def _forget(paths: List[str]) -> None:
+    image_dir = os.path.dirname(paths[0])
+    with closing(_connect(image_dir)) as conn:
+        conn.executemany(
+            "DELETE FROM images WHERE name = ?",
+            [(os.path.basename(path),) for path in paths]
+        )
+
+def _rebuild(image_dir: str) -> None:
+    _connect(image_dir, rebuild=True).close()
+
+def encode_cursor(key: Any, name: str) -> str:
+    return base64.urlsafe_b64encode(json.dumps([key, name]).encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor: str) -> Tuple[Any, str]:
+    try:
+        key, name = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (ValueError, TypeError):
+        raise InvalidCursor("Invalid cursor")
+    return key, name
+
+def _query(
+    image_dir: str,
+    sort: str,
+    descending: bool,
+    prefix: Optional[str],
+    cursor: Optional[str],
+    limit: int
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    column = SORT_COLUMNS[sort]
+    comparison = "<" if descending else ">"
+    direction = "DESC" if descending else "ASC"
+    clauses, params = [], []
+    if prefix:
+        clauses.append("substr(name, 1, ?) = ?")
+        params += [len(prefix), prefix]
+    if cursor:
+        # Keyset pagination: continue strictly after the last (key, name) returned
+        key, name = decode_cursor(cursor)
+        if column == "name":
+            clauses.append(f"name {comparison} ?")
+            params.append(name)
+        else:
+            clauses.append(f"({column} {comparison} ? OR ({column} = ? AND name {comparison} ?))")
+            params += [key, key, name]
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    order = f"{column} {direction}" if column == "name" else f"{column} {direction}, name {direction}"
+
+    with closing(_connect(image_dir)) as conn:
+        conn.row_factory = sqlite3.Row
+        rows = conn.execute(
+            f"SELECT * FROM images {where} ORDER BY {order} LIMIT ?",
+            params + [limit + 1]
+        ).fetchall()
+
+    items = [dict(row) for row in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        last = items[-1]
+        next_cursor = encode_cursor(last[column], last["name"])
+    return items, next_cursor
+
+async def record(path: str, digest: Optional[str] = None) -> None:
+    """Add or refresh a store image; the SHA-256 is computed if not given."""
+    await run_io(_record, [(path, digest)])
+
+async def record_many(paths: List[Tuple[str, Optional[str]]]) -> None:
+    """record() for many (path, digest) pairs in one image directory, in one transaction."""
+    await run_io(_record, paths)
+
+async def forget(path: str) -> None:
+    """Drop a store image from its index."""
+    await run_io(_forget, [path])
+
+async def rebuild(image_dir: str) -> None:
+    """Rescan a store's image directory and replace its index."""
+    await run_io(_rebuild, image_dir)
+
+async def query(
+    image_dir: str,
+    sort: str = "name",
+    descending: bool = False,
+    prefix: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = 100
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    One page of a store's images and the cursor for the next page, or None
+    on the last page. Raises InvalidCursor for a malformed cursor.
+    """
+    return await run_io(_query, image_dir, sort, descending, prefix, cursor, limit)
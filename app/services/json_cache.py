@@ -0,0 +1,156 @@
+"""
+In-process cache of parsed store JSON documents.
+
+Entries hold both the raw bytes and the parsed object and are validated
+against an ``os.stat`` signature (mtime_ns, size, inode), so a document that
+changed on disk is never served stale. The cache is an LRU bounded by a total
+byte budget.
+"""
+import os
+import json
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from functools import cached_property
+from typing import Any, Dict, Optional, Tuple
+
+from ..config import Config
+from ..utils.jsonpatch import resolve_pointer
+
+config = Config()
+
+# Parsed objects are several times larger than their JSON text; entries are
+# charged their raw size multiplied by this factor against the byte budget,
+# which also covers the envelope and the fragment index (each at most raw size).
+PARSED_SIZE_FACTOR = 4
+
+# Pre-built response envelope matching JsonContentResponse; the document bytes go in between
+ENVELOPE_PREFIX = b'{"success":true,"message":"JSON file retrieved successfully","data":'
+ENVELOPE_SUFFIX = b'}'
+
+StatKey = Tuple[int, int, int]
+CacheKey = Tuple[str, str]
+
+def stat_key(st: os.stat_result) -> StatKey:
+    """Cheap change signature for a file."""
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+@dataclass
+class CachedDocument:
+    """A JSON document as stored on disk plus its parsed form."""
+    raw: bytes
+    data: Any
+    stat: os.stat_result
+    _fragments: Dict[str, bytes] = field(default_factory=dict, repr=False)
+    _fragment_bytes: int = field(default=0, repr=False)
+
+    @property
+    def key(self) -> StatKey:
+        return stat_key(self.stat)
+
+    @property
+    def cost(self) -> int:
+        return len(self.raw) * PARSED_SIZE_FACTOR
+
+    @cached_property
+    def envelope(self) -> bytes:
+        """The stored bytes wrapped in the standard success envelope, built once."""
+        return ENVELOPE_PREFIX + self.raw.strip() + ENVELOPE_SUFFIX
+
+    def fragment(self, pointer: str) -> bytes:
+        """
+        Serialized sub-tree at a JSON Pointer. Fragments are indexed on first
+        use until the index holds as many bytes as the document itself.
+        Raises JsonPointerError if the pointer does not resolve.
+        """
+        encoded = self._fragments.get(pointer)
+        if encoded is None:
+            value = resolve_pointer(self.data, pointer)
+            encoded = json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            if self._fragment_bytes + len(encoded) <= len(self.raw):
+                self._fragments[pointer] = encoded
+                self._fragment_bytes += len(encoded)
+        return encoded
+
+class JsonDocumentCache:
+    """LRU cache of CachedDocument entries keyed by (store_id, filename)."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self._entries: "OrderedDict[CacheKey, CachedDocument]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, store_id: str, filename: str, key: StatKey) -> Optional[CachedDocument]:
+        """Return the cached document if it still matches the on-disk signature."""
+        cache_key = (store_id, filename)
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry.key != key:
+                self._remove(cache_key)
+                self.invalidations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(cache_key)
+            self.hits += 1
+            return entry
+
+    def put(self, store_id: str, filename: str, entry: CachedDocument) -> None:
+        """Insert or replace a document, evicting least recently used entries."""
+        cache_key = (store_id, filename)
+        with self._lock:
+            self._remove(cache_key)
+            if entry.cost > self.max_bytes:
+                return
+            self._entries[cache_key] = entry
+            self.current_bytes += entry.cost
+            while self.current_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.current_bytes -= evicted.cost
+                self.evictions += 1
+
+    def invalidate(self, store_id: str, filename: str) -> None:
+        with self._lock:
+            if self._remove((store_id, filename)):
+                self.invalidations += 1
+
+    def invalidate_store(self, store_id: str) -> None:
+        """Drop every cached document belonging to a store."""
+        with self._lock:
+            for cache_key in [k for k in self._entries if k[0] == store_id]:
+                self._remove(cache_key)
+                self.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def _remove(self, cache_key: CacheKey) -> bool:
+        entry = self._entries.pop(cache_key, None)
+        if entry is None:
+            return False
+        self.current_bytes -= entry.cost
+        return True
+
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss/eviction counters and current occupancy."""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations
+            }
+
+json_cache = JsonDocumentCache(config.JSON_CACHE_MAX_BYTES)
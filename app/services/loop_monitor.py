@@ -0,0 +1,171 @@
+"""
+Event loop lag monitor and blocking-call detector.
+
+A callback scheduled every LOOP_MONITOR_INTERVAL records how late the loop ran
+it in store_api_event_loop_lag_seconds. A watchdog thread watches the same
+heartbeat: once it is more than LOOP_BLOCK_THRESHOLD late, a single callback
+is holding the loop, so the watchdog takes the loop thread's current stack,
+finds the request being handled from the ASGI scope on that stack, and logs
+the route, the application function and the stack when the loop is free
+again. Requests pay nothing for this; the cost is a few callbacks a second
+and a mostly sleeping thread.
+"""
+import os
+import sys
+import time
+import asyncio
+import logging
+import threading
+import traceback
+from typing import Any, Dict, Optional
+
+from . import metrics
+from ..config import Config
+
+logger = logging.getLogger(__name__)
+config = Config()
+
+# Frames from files under this directory are the application's own code
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Innermost frames included in a report
+STACK_LIMIT = 25
+
+# A loop that has not recovered after this long is reported while still blocked
+STILL_BLOCKED_AFTER = 10.0
+
+def _find_scope(frame) -> Optional[Dict[str, Any]]:
+    """The ASGI scope of the innermost request handler on the stack."""
+    while frame is not None:
+        # Only frames of functions with a `scope` variable get their locals read
+        if "scope" in frame.f_code.co_varnames:
+            scope = frame.f_locals.get("scope")
+            if isinstance(scope, dict) and scope.get("type") == "http":
+                return scope
+        frame = frame.f_back
+    return None
+
+def _culprit(frame) -> str:
+    """The innermost application function on the stack, or the innermost frame."""
+    top = frame
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(APP_DIR + os.sep):
+            break
+        frame = frame.f_back
+    frame = frame or top
+    filename = os.path.relpath(frame.f_code.co_filename, os.path.dirname(APP_DIR))
+    return f"{frame.f_code.co_name} ({filename}:{frame.f_lineno})"
+
+class LoopMonitor:
+    """Measures scheduling lag of the running loop and reports callbacks that block it."""
+
+    def __init__(self, enabled: bool, interval: float, threshold: float):
+        self.enabled = enabled
+        self.interval = interval
+        self.threshold = threshold
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.blocks = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._handle: Optional[asyncio.TimerHandle] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        # When the next heartbeat is due; written on the loop, read by the watchdog
+        self._expected = 0.0
+
+    def start(self) -> None:
+        """Start monitoring the running loop; called from the application lifespan."""
+        if not self.enabled or self._loop is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._stopping.clear()
+        self._expected = time.monotonic() + self.interval
+        self._handle = self._loop.call_later(self.interval, self._beat)
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    def stop(self) -> None:
+        if self._loop is None:
+            return
+        self._handle.cancel()
+        self._stopping.set()
+        self._watchdog.join(1.0)
+        self._loop = None
+
+    def _beat(self) -> None:
+        now = time.monotonic()
+        lag = max(0.0, now - self._expected)
+        self.last_lag = lag
+        self.max_lag = max(self.max_lag, lag)
+        metrics.EVENT_LOOP_LAG.observe(lag)
+        self._expected = now + self.interval
+        self._handle = self._loop.call_later(self.interval, self._beat)
+
+    def _capture(self) -> Dict[str, Any]:
+        """What the loop thread is doing right now."""
+        frame = sys._current_frames().get(self._loop_thread_id)
+        if frame is None:
+            return {"scope": None, "culprit": "unknown", "stack": ""}
+        try:
+            return {
+                "scope": _find_scope(frame),
+                "culprit": _culprit(frame),
+                "stack": "".join(traceback.format_list(traceback.extract_stack(frame, limit=STACK_LIMIT)))
+            }
+        finally:
+            del frame
+
+    def _report(self, capture: Dict[str, Any], duration: float, still_blocked: bool) -> None:
+        scope = capture["scope"]
+        if scope is not None:
+            route = metrics.route_template(scope)
+            where = f"{scope['method']} {route} ({scope['path']})"
+        else:
+            route = "none"
+            where = "a task outside any request"
+        self.blocks += 1
+        metrics.EVENT_LOOP_BLOCKS.labels(route).inc()
+        verb = "has been blocked" if still_blocked else "was blocked"
+        logger.warning(
+            f"Event loop {verb} for {duration:.3f}s by {where} in {capture['culprit']}\n"
+            f"Stack (most recent call last):\n{capture['stack']}"
+        )
+
+    def _watch(self) -> None:
+        poll = max(0.01, min(self.interval, self.threshold) / 2)
+        reported = None
+        while not self._stopping.wait(poll):
+            expected = self._expected
+            if expected == reported or time.monotonic() - expected < self.threshold:
+                continue
+            capture = self._capture()
+            if self._expected != expected:
+                # The loop got through while the stack was taken, so it may show the next callback
+                capture["stack"] = ""
+                capture["culprit"] = "unknown"
+
+            # Wait for the loop to get through, so the report has the whole duration
+            deadline = time.monotonic() + STILL_BLOCKED_AFTER
+            while self._expected == expected and time.monotonic() < deadline:
+                if self._stopping.wait(poll):
+                    return
+            if self._expected == expected:
+                self._report(capture, time.monotonic() - expected, still_blocked=True)
+            else:
+                self._report(capture, self.last_lag, still_blocked=False)
+            reported = expected
+
+    def stats(self) -> Dict[str, Any]:
+        """Recent and worst lag, and how many blocking callbacks were reported."""
+        return {
+            "enabled": self.enabled,
+            "last_lag_ms": round(self.last_lag * 1000, 3),
+            "max_lag_ms": round(self.max_lag * 1000, 3),
+            "blocks": self.blocks,
+            "threshold_ms": round(self.threshold * 1000, 3)
+        }
+
+loop_monitor = LoopMonitor(config.LOOP_MONITOR, config.LOOP_MONITOR_INTERVAL, config.LOOP_BLOCK_THRESHOLD)
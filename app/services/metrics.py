@@ -0,0 +1,235 @@
+"""
+Prometheus metrics for the API.
+
+Under gunicorn every worker is a separate process, so values are kept in
+prometheus_client's multiprocess mode: each process writes its samples to
+mmap'd files in PROMETHEUS_MULTIPROC_DIR and a scrape merges the files of all
+workers. gunicorn.conf.py sets that directory before the app is imported and
+drops the files of exited workers. Without it, metrics stay in process memory,
+which is right for a single uvicorn process.
+
+Every update of a sample is a locked write into the mmap. To keep requests
+cheap, request counts, latencies, body bytes and the in-flight gauge are
+tallied in plain Python on the event loop and added to the shared metrics
+once a second (METRICS_FLUSH_INTERVAL) and before every scrape. Latencies are
+replayed through Histogram.observe on a worker thread, so only the public
+prometheus_client API is used and the loop just swaps the tallies. Label
+children are cached so flushes skip prometheus_client's lookup.
+"""
+import os
+import time
+import asyncio
+import logging
+from typing import Any, Callable, Dict, List, Tuple
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+)
+from prometheus_client import multiprocess
+from starlette.types import Scope
+
+from ..config import Config
+
+logger = logging.getLogger(__name__)
+config = Config()
+
+MULTIPROC_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+
+LATENCY_BUCKETS = (.005, .01, .025, .05, .075, .1, .25, .5, .75, 1.0, 2.5, 5.0, 10.0, 30.0)
+DISK_LATENCY_BUCKETS = (.0001, .00025, .0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1.0, 5.0)
+LOOP_LAG_BUCKETS = (.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1.0, 2.5, 5.0, 10.0)
+UPLOAD_SIZE_BUCKETS = tuple(2 ** n * 1024 for n in range(4, 15, 2))  # 16KB to 16MB
+
+REQUEST_LATENCY = Histogram(
+    "store_api_http_request_duration_seconds",
+    "Time from receiving a request to sending the end of its response",
+    ["method", "route"],
+    buckets=LATENCY_BUCKETS
+)
+REQUESTS = Counter(
+    "store_api_http_requests_total",
+    "Requests handled, by response status",
+    ["method", "route", "status"]
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "store_api_http_requests_in_flight",
+    "Requests currently being handled",
+    multiprocess_mode="livesum"
+)
+REQUEST_BYTES = Counter(
+    "store_api_http_request_bytes_total",
+    "Request body bytes received",
+    ["method", "route"]
+)
+RESPONSE_BYTES = Counter(
+    "store_api_http_response_bytes_total",
+    "Response body bytes sent",
+    ["method", "route"]
+)
+UPLOAD_SIZE = Histogram(
+    "store_api_upload_size_bytes",
+    "Size of committed image uploads",
+    buckets=UPLOAD_SIZE_BUCKETS
+)
+DISK_READ_BYTES = Counter(
+    "store_api_disk_read_bytes_total",
+    "Bytes read from the upload volume",
+    ["kind"]
+)
+DISK_WRITTEN_BYTES = Counter(
+    "store_api_disk_written_bytes_total",
+    "Bytes written to the upload volume",
+    ["kind"]
+)
+DISK_OPERATION_LATENCY = Histogram(
+    "store_api_disk_operation_duration_seconds",
+    "Time spent in blocking filesystem calls on the I/O pool, by function",
+    ["operation"],
+    buckets=DISK_LATENCY_BUCKETS
+)
+
+EVENT_LOOP_LAG = Histogram(
+    "store_api_event_loop_lag_seconds",
+    "How late the event loop ran a callback scheduled by the loop monitor",
+    buckets=LOOP_LAG_BUCKETS
+)
+EVENT_LOOP_BLOCKS = Counter(
+    "store_api_event_loop_blocks_total",
+    "Times a single callback held the event loop longer than LOOP_BLOCK_THRESHOLD, by route",
+    ["route"]
+)
+
+# Label children by label values; prometheus_client's own lookup takes a lock and builds a tuple
+_request_children: Dict[Tuple[str, str], Tuple[Histogram, Counter, Counter]] = {}
+_status_children: Dict[Tuple[str, str, int], Counter] = {}
+_disk_children: Dict[str, Histogram] = {}
+_read_children = {kind: DISK_READ_BYTES.labels(kind) for kind in ("json", "image", "archive")}
+_written_children = {kind: DISK_WRITTEN_BYTES.labels(kind) for kind in ("json", "image", "archive")}
+
+# Label for requests that matched no route, so unknown paths cannot create new series
+UNMATCHED_ROUTE = "unmatched"
+
+def route_template(scope: Scope) -> str:
+    """
+    The path template of the route that handled the request. Routes of an
+    included router only know their own part of the path, so the prefix is
+    taken from the request path in front of the filled-in template.
+    """
+    route = scope.get("route")
+    path_format = getattr(route, "path_format", None)
+    if path_format is None:
+        return UNMATCHED_ROUTE
+    try:
+        suffix = path_format.format(**scope.get("path_params", {}))
+    except (KeyError, IndexError, ValueError):
+        return path_format
+    path = scope["path"]
+    if suffix and path.endswith(suffix):
+        return path[:len(path) - len(suffix)] + path_format
+    return path_format
+
+class RequestTally:
+    """Requests of this worker not yet added to the shared metrics; used on the event loop only."""
+
+    def __init__(self):
+        self.in_flight = 0
+        # (method, route, status) -> requests
+        self.requests: Dict[Tuple[str, str, int], int] = {}
+        # (method, route) -> [bytes in, bytes out, latencies]
+        self.routes: Dict[Tuple[str, str], List[Any]] = {}
+
+tally = RequestTally()
+
+def observe_request(method: str, route: str, status_code: int, duration: float, bytes_in: int, bytes_out: int) -> None:
+    """Record one finished request."""
+    key = (method, route, status_code)
+    tally.requests[key] = tally.requests.get(key, 0) + 1
+    entry = tally.routes.get((method, route))
+    if entry is None:
+        entry = tally.routes[(method, route)] = [0, 0, []]
+    entry[0] += bytes_in
+    entry[1] += bytes_out
+    entry[2].append(duration)
+
+def _take_tally() -> Tuple[int, Dict, Dict]:
+    # On the event loop, so no request is counted into a tally being written
+    requests, tally.requests = tally.requests, {}
+    routes, tally.routes = tally.routes, {}
+    return tally.in_flight, requests, routes
+
+def _write_tally(in_flight: int, requests: Dict, routes: Dict) -> None:
+    REQUESTS_IN_FLIGHT.set(in_flight)
+    for (method, route, status_code), count in requests.items():
+        counter = _status_children.get((method, route, status_code))
+        if counter is None:
+            counter = _status_children[(method, route, status_code)] = REQUESTS.labels(method, route, str(status_code))
+        counter.inc(count)
+    for (method, route), (received_bytes, sent_bytes, durations) in routes.items():
+        children = _request_children.get((method, route))
+        if children is None:
+            children = _request_children[(method, route)] = (
+                REQUEST_LATENCY.labels(method, route),
+                REQUEST_BYTES.labels(method, route),
+                RESPONSE_BYTES.labels(method, route)
+            )
+        latency, received, sent = children
+        for duration in durations:
+            latency.observe(duration)
+        if received_bytes:
+            received.inc(received_bytes)
+        if sent_bytes:
+            sent.inc(sent_bytes)
+
+def flush_request_metrics() -> None:
+    """Add the tallied requests to the shared metrics, on the calling thread."""
+    _write_tally(*_take_tally())
+
+async def flush_request_metrics_off_loop() -> None:
+    """Add the tallied requests to the shared metrics from a worker thread."""
+    await asyncio.to_thread(_write_tally, *_take_tally())
+
+async def run_flusher() -> None:
+    """Flush request metrics periodically; run as a task from the application lifespan."""
+    try:
+        while True:
+            await asyncio.sleep(config.METRICS_FLUSH_INTERVAL)
+            await flush_request_metrics_off_loop()
+    finally:
+        # Cancelled at shutdown: keep what was counted since the last flush
+        flush_request_metrics()
+
+def observe_upload(size: int) -> None:
+    UPLOAD_SIZE.observe(size)
+
+def record_disk_read(kind: str, nbytes: int) -> None:
+    """Count bytes read from the upload volume; kind is json, image or archive."""
+    _read_children[kind].inc(nbytes)
+
+def record_disk_write(kind: str, nbytes: int) -> None:
+    """Count bytes written to the upload volume; kind is json, image or archive."""
+    _written_children[kind].inc(nbytes)
+
+def timed_disk_operation(fn: Callable) -> Callable:
+    """Wrap fn so its run time on the I/O pool is recorded under its function name."""
+    operation = getattr(fn, "__name__", "call").lstrip("_") or "call"
+    histogram = _disk_children.get(operation)
+    if histogram is None:
+        histogram = _disk_children[operation] = DISK_OPERATION_LATENCY.labels(operation)
+
+    def timed(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            histogram.observe(time.perf_counter() - start)
+    return timed
+
+def render_metrics() -> bytes:
+    """Exposition text for a scrape, merged over all workers in multiprocess mode."""
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
+
+METRICS_CONTENT_TYPE = CONTENT_TYPE_LATEST
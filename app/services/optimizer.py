@@ -0,0 +1,241 @@
+"""
+Recompression of uploaded images.
+
+PNG uploads are re-encoded as an optimized PNG and, when enabled, as WebP; the
+smallest encoding wins and the original is kept if nothing beats it. Metadata
+chunks (ICC profiles, EXIF, text) are dropped. Encoding runs on the CPU process
+pool. Savings are accumulated per store in ``<store>/.image-optimization.json``.
+"""
+import os
+import io
+import json
+import hashlib
+import time
+import asyncio
+import logging
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, List, Optional
+
+from PIL import Image
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from .executor import run_cpu, run_io
+from . import storage, image_index
+from ..config import Config
+from ..utils.file import is_derivative, is_fingerprinted
+
+logger = logging.getLogger(__name__)
+config = Config()
+
+STATS_FILENAME = ".image-optimization.json"
+
+# Info keys that affect how pixels render; everything else is metadata
+_KEPT_INFO = ("transparency",)
+
+def _encode(img: Image.Image, fmt: str, **params) -> bytes:
+    buffer = io.BytesIO()
+    img.save(buffer, format=fmt, **params)
+    return buffer.getvalue()
+
+def _file_signature(st: os.stat_result):
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+def _optimize(path: str, to_webp: bool, lossless: bool, quality: int) -> Dict[str, Any]:
+    """
+    Process pool entry point. Returns the resulting filename and sizes, plus
+    the old and new SHA-256 when the file was rewritten. The file is only
+    replaced if it did not change while it was being encoded.
+    """
+    directory, filename = os.path.split(path)
+    stem, ext = os.path.splitext(filename)
+    with open(path, "rb") as f:
+        before = os.fstat(f.fileno())
+        original = f.read() if ext.lower() == ".png" else b""
+    result = {
+        "filename": filename,
+        "original_size": before.st_size,
+        "size": before.st_size,
+        "transcoded": False,
+        "sha256": None,
+        "original_sha256": None
+    }
+    if ext.lower() != ".png":
+        return result
+
+    with Image.open(io.BytesIO(original)) as img:
+        img.load()
+        img.info = {key: img.info[key] for key in _KEPT_INFO if key in img.info}
+        candidates = [(filename, _encode(img, "PNG", optimize=True))]
+
+        # Never transcode over an existing WebP of the same name
+        webp_name = f"{stem}.webp"
+        if to_webp and not os.path.exists(os.path.join(directory, webp_name)):
+            has_alpha = img.mode in ("RGBA", "LA", "PA") or "transparency" in img.info
+            rgb = img.convert("RGBA" if has_alpha else "RGB")
+            if lossless:
+                encoded = _encode(rgb, "WEBP", lossless=True, quality=80, method=4)
+            else:
+                encoded = _encode(rgb, "WEBP", quality=quality, method=4)
+            candidates.append((webp_name, encoded))
+
+    best_name, best = min(candidates, key=lambda candidate: len(candidate[1]))
+    if len(best) >= before.st_size:
+        return result
+
+    target = os.path.join(directory, best_name)
+    temp_path = f"{target}.tmp"
+    try:
+        with open(temp_path, "wb") as f:
+            f.write(best)
+        if _file_signature(os.stat(path)) != _file_signature(before):
+            # Replaced by a newer upload while we were encoding
+            os.remove(temp_path)
+            return result
+        os.replace(temp_path, target)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    if best_name != filename:
+        os.remove(path)
+
+    result.update(
+        filename=best_name,
+        size=len(best),
+        transcoded=best_name != filename,
+        sha256=hashlib.sha256(best).hexdigest(),
+        original_sha256=hashlib.sha256(original).hexdigest()
+    )
+    return result
+
+async def optimize_image(full_path: str, allow_transcode: bool) -> Dict[str, Any]:
+    """
+    Recompress a committed image on the process pool. Returns filename,
+    original_size, size and transcoded; filename changes when a PNG was
+    replaced by a smaller WebP, which only happens if allow_transcode is set.
+    A rewritten image moves to the blob of its new content.
+    """
+    result = await run_cpu(
+        _optimize,
+        full_path,
+        allow_transcode and config.IMAGE_PNG_TO_WEBP,
+        config.IMAGE_WEBP_LOSSLESS,
+        config.IMAGE_WEBP_QUALITY
+    )
+    if result["sha256"] is not None:
+        new_path = os.path.join(os.path.dirname(full_path), result["filename"])
+        await storage.adopt_image(new_path, result["sha256"])
+        await storage.release_blob(result["original_sha256"])
+        if result["transcoded"]:
+            await image_index.forget(full_path)
+    return result
+
+def _update_stats(store_path: str, results: List[Dict[str, Any]]) -> None:
+    stats_path = os.path.join(store_path, STATS_FILENAME)
+    fd = os.open(stats_path, os.O_RDWR | os.O_CREAT, 0o644)
+    with os.fdopen(fd, "r+", encoding="utf-8") as f:
+        # Counters are shared by every worker process
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        raw = f.read()
+        stats = json.loads(raw) if raw.strip() else {}
+        for result in results:
+            stats["images_processed"] = stats.get("images_processed", 0) + 1
+            if result["size"] < result["original_size"]:
+                stats["images_optimized"] = stats.get("images_optimized", 0) + 1
+            if result["transcoded"]:
+                stats["images_transcoded"] = stats.get("images_transcoded", 0) + 1
+            stats["bytes_before"] = stats.get("bytes_before", 0) + result["original_size"]
+            stats["bytes_after"] = stats.get("bytes_after", 0) + result["size"]
+        stats["bytes_saved"] = stats.get("bytes_before", 0) - stats.get("bytes_after", 0)
+        f.seek(0)
+        f.truncate()
+        json.dump(stats, f)
+
+def _read_stats(store_path: str) -> Dict[str, int]:
+    try:
+        with open(os.path.join(store_path, STATS_FILENAME), "r", encoding="utf-8") as f:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_SH)
+            raw = f.read()
+    except FileNotFoundError:
+        return {}
+    return json.loads(raw) if raw.strip() else {}
+
+async def record_savings(store_path: str, results: List[Dict[str, Any]]) -> None:
+    """Add optimization results to the store's bytes-saved counters."""
+    if results:
+        await run_io(_update_stats, store_path, results)
+
+async def read_savings(store_path: str) -> Dict[str, int]:
+    return await run_io(_read_stats, store_path)
+
+@dataclass
+class OptimizeJob:
+    """Progress of a background reprocessing run over one store's images."""
+    store_id: str
+    total: int
+    processed: int = 0
+    failed: int = 0
+    bytes_saved: int = 0
+    started_at: float = 0.0
+    finished_at: Optional[float] = None
+
+    @property
+    def running(self) -> bool:
+        return self.finished_at is None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(asdict(self), running=self.running)
+
+# Jobs are tracked per worker process; the task references keep them alive
+_jobs: Dict[str, OptimizeJob] = {}
+_tasks: Dict[str, "asyncio.Task"] = {}
+
+def get_job(store_id: str) -> Optional[OptimizeJob]:
+    return _jobs.get(store_id)
+
+async def _run_batch(job: OptimizeJob, store_path: str, image_dir: str, names: List[str]) -> None:
+    try:
+        # One image at a time, so a batch never takes the whole pool from uploads
+        for name in names:
+            try:
+                result = await optimize_image(os.path.join(image_dir, name), allow_transcode=False)
+                await record_savings(store_path, [result])
+                job.bytes_saved += result["original_size"] - result["size"]
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                job.failed += 1
+                logger.error(f"Error optimizing {job.store_id}/{name}: {str(e)}")
+            job.processed += 1
+    finally:
+        job.finished_at = time.time()
+        _tasks.pop(job.store_id, None)
+        logger.info(
+            f"Optimized {job.processed} images for store {job.store_id}, saved {job.bytes_saved} bytes"
+        )
+
+def start_batch(store_id: str, store_path: str, image_dir: str, names: List[str]) -> OptimizeJob:
+    """
+    Reprocess a store's PNG images in the background. Returns the running job
+    if one is already in progress. Fingerprinted names and derivatives are
+    skipped: their content must not change under the same name.
+    """
+    job = _jobs.get(store_id)
+    if job is not None and job.running:
+        return job
+    names = [
+        name for name in names
+        if name.lower().endswith(".png") and not is_fingerprinted(name) and not is_derivative(name)
+    ]
+    job = OptimizeJob(store_id=store_id, total=len(names), started_at=time.time())
+    _jobs[store_id] = job
+    _tasks[store_id] = asyncio.get_running_loop().create_task(
+        _run_batch(job, store_path, image_dir, names)
+    )
+    return job
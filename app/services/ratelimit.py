@@ -0,0 +1,149 @@
+"""
+Sliding-window rate limiter shared by every worker process on a host.
+
+Counters live in a fixed-size table in a memory-mapped file (on /dev/shm where
+available), so all gunicorn workers enforce one limit together and memory use
+does not grow with the number of clients. The table is split into buckets of
+a few slots; a key hashes to one bucket, which is locked with an fcntl byte-range
+lock while its slots are read and updated. Every check therefore costs one
+hash, two lock calls and a scan of BUCKET_SLOTS slots, whatever the traffic.
+
+Each slot keeps the request counts of the current and the previous fixed
+window, and the rate is estimated as previous * (1 - elapsed fraction) +
+current. Slots whose windows are over are reused; when a bucket is full the
+slot seen least recently is evicted.
+"""
+import os
+import math
+import mmap
+import time
+import struct
+import hashlib
+import tempfile
+import logging
+from typing import Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# File header: magic, bucket count, slots per bucket, window length in seconds
+_HEADER = struct.Struct("<4sIII")
+_MAGIC = b"RLv1"
+
+# Slot: key hash (0 = empty), window number, count in that window, count in the one before
+_SLOT = struct.Struct("<QQII")
+
+BUCKET_SLOTS = 8
+
+def default_path() -> str:
+    """Shared memory where the OS provides it, so counters never hit the disk."""
+    directory = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(directory, "store-api-ratelimit")
+
+def _key_hash(key: str) -> int:
+    # Never 0, which marks an empty slot
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "little") or 1
+
+class SharedRateLimiter:
+    """Allows `limit` requests per `period` seconds for each key, across processes."""
+
+    def __init__(self, limit: int, period: int, slots: int = 65536, path: Optional[str] = None):
+        self.limit = limit
+        self.period = period
+        self.buckets = max(1, slots // BUCKET_SLOTS)
+        self.bucket_size = BUCKET_SLOTS * _SLOT.size
+        self.path = path or default_path()
+        self.evictions = 0
+        size = _HEADER.size + self.buckets * self.bucket_size
+
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        self._lock(0, 0)
+        try:
+            header = os.pread(self._fd, _HEADER.size, 0)
+            expected = _HEADER.pack(_MAGIC, self.buckets, BUCKET_SLOTS, period)
+            if header != expected or os.fstat(self._fd).st_size != size:
+                # New file, or one laid out for other settings: start from empty counters
+                os.ftruncate(self._fd, 0)
+                os.ftruncate(self._fd, size)
+                os.pwrite(self._fd, expected, 0)
+        finally:
+            self._unlock(0, 0)
+        self._map = mmap.mmap(self._fd, size)
+
+    def _lock(self, start: int, length: int) -> None:
+        if fcntl is not None:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, length, start)
+
+    def _unlock(self, start: int, length: int) -> None:
+        if fcntl is not None:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, length, start)
+
+    def _retry_after(self, previous: int, current: int, elapsed: float) -> int:
+        """Seconds until the estimated rate drops below the limit again."""
+        if current < self.limit:
+            wait = self.period * (1 - (self.limit - current) / previous) - elapsed
+        else:
+            # Only possible once the current window has become the previous one
+            wait = (self.period - elapsed) + self.period * (1 - self.limit / current)
+        # Requests are allowed only once the estimate is strictly below the limit
+        return max(1, math.floor(wait) + 1)
+
+    def hit(self, key: str, now: Optional[float] = None) -> Tuple[bool, int, int]:
+        """
+        Count a request for key. Returns (allowed, remaining, retry_after):
+        remaining is what is left in the current estimate, retry_after the
+        seconds to wait when the request was refused (0 if allowed).
+        Refused requests are not counted.
+        """
+        if now is None:
+            now = time.time()
+        window = int(now // self.period)
+        elapsed = now - window * self.period
+        key_hash = _key_hash(key)
+        start = _HEADER.size + (key_hash % self.buckets) * self.bucket_size
+
+        self._lock(start, self.bucket_size)
+        try:
+            slot_offset = None
+            oldest_offset, oldest_window = start, None
+            for i in range(BUCKET_SLOTS):
+                offset = start + i * _SLOT.size
+                slot_key, slot_window, _, _ = _SLOT.unpack_from(self._map, offset)
+                if slot_key == key_hash:
+                    slot_offset = offset
+                    break
+                if oldest_window is None or slot_window < oldest_window:
+                    oldest_offset, oldest_window = offset, slot_window
+
+            if slot_offset is not None:
+                _, slot_window, current, previous = _SLOT.unpack_from(self._map, slot_offset)
+                if slot_window != window:
+                    previous = current if slot_window == window - 1 else 0
+                    current = 0
+            else:
+                # Empty and expired slots have the oldest windows, so they are taken first
+                if oldest_window is not None and oldest_window >= window - 1:
+                    self.evictions += 1
+                slot_offset = oldest_offset
+                current = previous = 0
+
+            estimate = previous * (1 - elapsed / self.period) + current
+            allowed = estimate < self.limit
+            if allowed:
+                current += 1
+                estimate += 1
+            _SLOT.pack_into(self._map, slot_offset, key_hash, window, current, previous)
+        finally:
+            self._unlock(start, self.bucket_size)
+
+        if allowed:
+            return True, max(0, int(self.limit - estimate)), 0
+        return False, 0, self._retry_after(previous, current, elapsed)
+
+    def close(self) -> None:
+        self._map.close()
+        os.close(self._fd)
@@ -0,0 +1,415 @@
+"""
+Storage service used by the API routers.
+
+Every call that touches the upload volume runs on the I/O executor, so a slow
+disk operation only occupies a pool thread instead of stalling the event loop.
+"""
+import os
+import json
+import stat
+import uuid
+import errno
+import shutil
+import logging
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from .executor import run_io
+from .metrics import record_disk_read, record_disk_write
+from .json_cache import CachedDocument, json_cache, stat_key
+from .templates import Template
+from . import image_index
+from ..utils.file import file_sha256, verify_image
+from ..config import Config
+
+logger = logging.getLogger(__name__)
+config = Config()
+
+# ioctl that shares a file's extents with another file (btrfs, XFS, overlayfs on those)
+FICLONE = 0x40049409
+
+# Errors that mean the filesystem cannot link or clone here, as opposed to real I/O failures
+_UNSUPPORTED_ERRNOS = {errno.EXDEV, errno.EPERM, errno.EOPNOTSUPP, errno.ENOTTY, errno.EINVAL, errno.EMLINK}
+
+# Fallbacks already reported, so bulk provisioning logs each one only once
+_reported_fallbacks = set()
+
+# Content-addressed image blobs, on the same volume as the stores so they can be hardlinked
+BLOB_DIRNAME = ".blobs"
+
+class EmptyFileError(ValueError):
+    """Raised when a JSON document on disk has no content."""
+
+def _list_files(path: str, predicate: Optional[Callable[[str], bool]]) -> List[str]:
+    return [f for f in os.listdir(path) if predicate is None or predicate(f)]
+
+def _load_document(path: str) -> CachedDocument:
+    with open(path, "rb") as f:
+        st = os.fstat(f.fileno())
+        if not stat.S_ISREG(st.st_mode):
+            raise FileNotFoundError(path)
+        raw = f.read()
+    record_disk_read("json", len(raw))
+    if not raw.strip():
+        raise EmptyFileError("File is empty")
+    return CachedDocument(raw=raw, data=json.loads(raw), stat=st)
+
+# Documents are only ever replaced through a renamed temporary file, never
+# written in place. That keeps hardlinked or reflinked template pages safe:
+# the first write to a store's page gives it its own inode.
+def _write_bytes(path: str, raw: bytes, data: Any) -> CachedDocument:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.tmp"
+    try:
+        with open(temp_path, "wb") as f:
+            f.write(raw)
+            f.flush()
+            record_disk_write("json", len(raw))
+            # The inode and mtime survive the rename, so this matches the final file
+            st = os.fstat(f.fileno())
+        os.replace(temp_path, path)
+    except Exception:
+        # Clean up temp file if it exists
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return CachedDocument(raw=raw, data=data, stat=st)
+
+def _write_json(path: str, data: Any) -> CachedDocument:
+    raw = json.dumps(data, indent=2, ensure_ascii=False).encode("utf-8")
+    return _write_bytes(path, raw, data)
+
+def _reflink(src: str, dst: str) -> None:
+    if fcntl is None:
+        raise OSError(errno.EOPNOTSUPP, "reflink is not supported on this platform")
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        try:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        except OSError:
+            fdst.close()
+            os.remove(dst)
+            raise
+
+def _place_template(template: Template, dst: str, mode: str) -> str:
+    """
+    Place a template at dst using the cheapest supported method, falling back
+    from hardlink to reflink to writing the registry's bytes. Returns the
+    method that succeeded.
+    """
+    if mode == "hardlink":
+        try:
+            os.link(template.path, dst)
+            return "hardlink"
+        except OSError as e:
+            if e.errno not in _UNSUPPORTED_ERRNOS:
+                raise
+            mode = "reflink"
+    if mode == "reflink":
+        try:
+            _reflink(template.path, dst)
+            return "reflink"
+        except OSError as e:
+            if e.errno not in _UNSUPPORTED_ERRNOS:
+                raise
+    # Copies come from memory, so the template volume is not read at all
+    with open(dst, "wb") as f:
+        f.write(template.raw)
+    record_disk_write("json", len(template.raw))
+    return "copy"
+
+def _place_templates(templates: List[Template], dest_folder: str, mode: str) -> List[str]:
+    copied_files = []
+    for template in templates:
+        dst = os.path.join(dest_folder, template.name)
+        used = _place_template(template, dst, mode)
+        if used != mode:
+            # Don't retry an unsupported method for every remaining file
+            if (mode, used) not in _reported_fallbacks:
+                _reported_fallbacks.add((mode, used))
+                logger.warning(f"Store init mode '{mode}' is not supported here, falling back to '{used}'")
+            mode = used
+        copied_files.append(template.name)
+    return copied_files
+
+# Images are stored once under .blobs/ab/cd/<sha256>; a store's image file is
+# a hardlink to its blob, so the number of stores using a blob is st_nlink - 1.
+# Like documents, image files are only ever replaced by rename, never
+# rewritten in place, which keeps blobs immutable.
+def blob_path(digest: str) -> str:
+    return os.path.join(config.UPLOAD_FOLDER, BLOB_DIRNAME, digest[:2], digest[2:4], digest)
+
+def _link_into_place(src: str, dst: str) -> None:
+    """Atomically make dst another name for src's inode."""
+    temp_path = os.path.join(os.path.dirname(dst), f".link-{uuid.uuid4().hex}.tmp")
+    os.link(src, temp_path)
+    try:
+        os.replace(temp_path, dst)
+    except Exception:
+        os.remove(temp_path)
+        raise
+    # Renaming onto a link to the same inode is a no-op that leaves the source name behind
+    if os.path.lexists(temp_path):
+        os.remove(temp_path)
+
+def _blob_of(path: str) -> Optional[str]:
+    """Digest of the blob a store image is linked to, or None for a standalone file."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    if st.st_nlink < 2:
+        return None
+    digest = file_sha256(path)
+    try:
+        return digest if os.stat(blob_path(digest)).st_ino == st.st_ino else None
+    except FileNotFoundError:
+        return None
+
+def _release_blob(digest: str) -> int:
+    """Remove a blob nothing links to any more; returns the bytes freed."""
+    path = blob_path(digest)
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return 0
+    if st.st_nlink > 1:
+        return 0
+    os.remove(path)
+    return st.st_size
+
+def _link_blob(path: str, digest: str) -> bool:
+    """
+    Make path a reference to the blob for digest. If the blob does not exist
+    yet, path's inode becomes the blob. Returns True if existing content was
+    reused. Filesystems without hardlinks leave path as a standalone file.
+    """
+    blob = blob_path(digest)
+    try:
+        os.makedirs(os.path.dirname(blob), exist_ok=True)
+        try:
+            os.link(path, blob)
+            return False
+        except FileExistsError:
+            pass
+        try:
+            _link_into_place(blob, path)
+            return True
+        except FileNotFoundError:
+            # Collected between the two calls; path keeps its own copy
+            return False
+    except OSError as e:
+        if e.errno not in _UNSUPPORTED_ERRNOS:
+            raise
+        if ("blob", e.errno) not in _reported_fallbacks:
+            _reported_fallbacks.add(("blob", e.errno))
+            logger.warning(f"Image deduplication is not available here: {e}")
+        return False
+
+def _link_image(src: str, dst: str) -> None:
+    try:
+        _link_into_place(src, dst)
+    except OSError as e:
+        if e.errno not in _UNSUPPORTED_ERRNOS:
+            raise
+        temp_path = f"{dst}.tmp"
+        shutil.copyfile(src, temp_path)
+        os.replace(temp_path, dst)
+
+def _commit_image(temp_path: str, full_path: str, digest: Optional[str]) -> bool:
+    verify_image(temp_path, os.path.basename(full_path))
+    previous = _blob_of(full_path)
+    # Give the upload its final name first, so a failed link never loses it
+    os.replace(temp_path, full_path)
+    reused = _link_blob(full_path, digest) if digest else False
+    if previous is not None and previous != digest:
+        _release_blob(previous)
+    return reused
+
+def _remove_image(path: str) -> None:
+    digest = _blob_of(path)
+    os.remove(path)
+    if digest is not None:
+        _release_blob(digest)
+
+def _link_blobs(images: List[Tuple[str, str]]) -> int:
+    return sum(1 for path, digest in images if _link_blob(path, digest))
+
+def _remove_tree(path: str) -> None:
+    digests = set()
+    image_dir = os.path.join(path, "image")
+    if os.path.isdir(image_dir):
+        for entry in os.scandir(image_dir):
+            digest = _blob_of(entry.path)
+            if digest is not None:
+                digests.add(digest)
+    shutil.rmtree(path, ignore_errors=True)
+    # Blobs are released once their links in the tree are gone
+    for digest in digests:
+        _release_blob(digest)
+
+def _walk_blobs():
+    root = os.path.join(config.UPLOAD_FOLDER, BLOB_DIRNAME)
+    for directory, _, names in os.walk(root):
+        for name in names:
+            path = os.path.join(directory, name)
+            try:
+                yield path, os.stat(path)
+            except FileNotFoundError:
+                continue
+
+def _collect_blobs() -> Dict[str, int]:
+    removed = 0
+    freed = 0
+    for path, st in _walk_blobs():
+        if st.st_nlink <= 1:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            removed += 1
+            freed += st.st_size
+    return {"removed": removed, "bytes_freed": freed}
+
+def _blob_stats() -> Dict[str, int]:
+    stats = {"blobs": 0, "references": 0, "bytes": 0, "bytes_saved": 0}
+    for _, st in _walk_blobs():
+        references = st.st_nlink - 1
+        stats["blobs"] += 1
+        stats["references"] += references
+        stats["bytes"] += st.st_size
+        stats["bytes_saved"] += st.st_size * max(0, references - 1)
+    return stats
+
+async def exists(path: str) -> bool:
+    return await run_io(os.path.exists, path)
+
+async def is_file(path: str) -> bool:
+    return await run_io(os.path.isfile, path)
+
+async def make_dirs(path: str) -> None:
+    await run_io(os.makedirs, path, exist_ok=True)
+
+async def list_files(path: str, predicate: Optional[Callable[[str], bool]] = None) -> List[str]:
+    """List directory entries, optionally filtered by predicate."""
+    return await run_io(_list_files, path, predicate)
+
+async def stat_file(path: str) -> Optional[os.stat_result]:
+    """Stat a regular file, returning None if it does not exist."""
+    try:
+        st = await run_io(os.stat, path)
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+    return st if stat.S_ISREG(st.st_mode) else None
+
+async def read_document(
+    store_id: str,
+    filename: str,
+    path: str,
+    st: Optional[os.stat_result] = None
+) -> CachedDocument:
+    """
+    Return a store JSON document, served from the cache while its stat
+    signature is unchanged. A stat result the caller already holds can be
+    passed in to skip the extra stat call. Raises FileNotFoundError,
+    EmptyFileError or json.JSONDecodeError.
+    """
+    if st is None:
+        st = await stat_file(path)
+        if st is None:
+            raise FileNotFoundError(path)
+    entry = json_cache.get(store_id, filename, stat_key(st))
+    if entry is None:
+        entry = await run_io(_load_document, path)
+        json_cache.put(store_id, filename, entry)
+    return entry
+
+async def write_document(store_id: str, filename: str, path: str, data: Any) -> CachedDocument:
+    """Atomically write a store JSON document and refresh its cache entry."""
+    try:
+        entry = await run_io(_write_json, path, data)
+    except Exception:
+        json_cache.invalidate(store_id, filename)
+        raise
+    json_cache.put(store_id, filename, entry)
+    return entry
+
+async def delete_document(store_id: str, filename: str, path: str) -> None:
+    """Remove a store JSON document and drop it from the cache."""
+    try:
+        await run_io(os.remove, path)
+    finally:
+        json_cache.invalidate(store_id, filename)
+
+async def remove_file(path: str) -> None:
+    await run_io(os.remove, path)
+
+async def file_size(path: str) -> int:
+    return await run_io(os.path.getsize, path)
+
+async def copy_templates(templates: List[Template], dest_folder: str, mode: str = "copy") -> List[str]:
+    """
+    Place templates into dest_folder and return their names. mode is "copy",
+    "reflink" or "hardlink"; unsupported methods fall back to a copy.
+    """
+    return await run_io(_place_templates, templates, dest_folder, mode)
+
+async def commit_image(temp_path: str, full_path: str, digest: Optional[str] = None):
+    """
+    Verify a streamed upload and move it into place; returns (success, error).
+    With the upload's SHA-256, identical content already stored by any store
+    is reused and the new copy is dropped.
+    """
+    try:
+        reused = await run_io(_commit_image, temp_path, full_path, digest)
+    except Exception as e:
+        if await exists(temp_path):
+            await run_io(os.remove, temp_path)
+        return False, str(e)
+    if reused:
+        logger.info(f"Reused stored image {digest[:12]} for {full_path}")
+    await image_index.record(full_path, digest)
+    return True, None
+
+async def link_image(src: str, dst: str, digest: Optional[str] = None) -> None:
+    """Give a store image a second name sharing its content, copying where links are unsupported."""
+    await run_io(_link_image, src, dst)
+    await image_index.record(dst, digest)
+
+async def adopt_image(path: str, digest: str) -> bool:
+    """Link an image written outside commit_image into the blob store."""
+    reused = await run_io(_link_blob, path, digest)
+    await image_index.record(path, digest)
+    return reused
+
+async def adopt_images(images: List[Tuple[str, str]]) -> int:
+    """adopt_image for many (path, digest) pairs of one store; returns how many reused a blob."""
+    if not images:
+        return 0
+    reused = await run_io(_link_blobs, images)
+    await image_index.record_many(images)
+    return reused
+
+async def remove_tree(path: str) -> None:
+    """Delete a whole store directory, freeing blobs only its images referenced."""
+    await run_io(_remove_tree, path)
+
+async def release_blob(digest: str) -> int:
+    """Free a blob once no store image links to it."""
+    return await run_io(_release_blob, digest)
+
+async def remove_image(path: str) -> None:
+    """Delete a store image, freeing its blob when this was the last reference."""
+    await run_io(_remove_image, path)
+    await image_index.forget(path)
+
+async def collect_blobs() -> Dict[str, int]:
+    """Remove blobs no store links to, e.g. left behind by overwritten derivatives."""
+    return await run_io(_collect_blobs)
+
+async def blob_stats() -> Dict[str, int]:
+    """Blob count, total references and bytes saved by sharing."""
+    return await run_io(_blob_stats)
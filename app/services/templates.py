@@ -0,0 +1,143 @@
+"""
+In-memory registry of the page templates in TEMPLATE_FOLDER.
+
+The registry is loaded once at startup and replaced as a whole on reload, so
+readers always see one consistent snapshot. Each template keeps its raw bytes,
+its parsed form and a SHA-256 of the bytes.
+
+Every worker process has its own registry. A reload requested through the API
+writes a new generation to a file under UPLOAD_FOLDER, and each worker
+compares it with the generation it loaded before placing templates, so all
+workers pick the reload up no matter which one served the request.
+"""
+import os
+import json
+import uuid
+import signal
+import asyncio
+import hashlib
+import logging
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Any, List, Mapping, Optional
+
+from .executor import run_io
+from ..config import Config
+
+logger = logging.getLogger(__name__)
+config = Config()
+
+@dataclass(frozen=True)
+class Template:
+    """A template page. data is shared with readers and must not be mutated."""
+    name: str
+    path: str
+    raw: bytes
+    data: Any
+    sha256: str
+
+class TemplateRegistry:
+    """An immutable snapshot of the template folder."""
+
+    def __init__(self, folder: str, templates: Mapping[str, Template]):
+        self.folder = folder
+        self.templates = MappingProxyType(dict(templates))
+
+    def get(self, name: str) -> Optional[Template]:
+        return self.templates.get(name)
+
+    def all(self) -> List[Template]:
+        return list(self.templates.values())
+
+def load_registry(folder: str) -> TemplateRegistry:
+    """Read and parse every *.json file in folder."""
+    templates = {}
+    for name in sorted(os.listdir(folder)):
+        if not name.endswith(".json"):
+            continue
+        path = os.path.join(folder, name)
+        with open(path, "rb") as f:
+            raw = f.read()
+        templates[name] = Template(
+            name=name,
+            path=path,
+            raw=raw,
+            data=json.loads(raw),
+            sha256=hashlib.sha256(raw).hexdigest()
+        )
+    return TemplateRegistry(folder, templates)
+
+GENERATION_FILENAME = ".template-generation"
+
+_registry: Optional[TemplateRegistry] = None
+# Generation the registry of this process was loaded at
+_generation: Optional[str] = None
+
+def _generation_path() -> str:
+    return os.path.join(config.UPLOAD_FOLDER, GENERATION_FILENAME)
+
+def _read_generation() -> Optional[str]:
+    try:
+        with open(_generation_path(), "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+def _bump_generation() -> str:
+    generation = uuid.uuid4().hex
+    os.makedirs(config.UPLOAD_FOLDER, exist_ok=True)
+    temp_path = f"{_generation_path()}.{generation}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        f.write(generation)
+    os.replace(temp_path, _generation_path())
+    return generation
+
+def get_registry() -> TemplateRegistry:
+    """Return this process's registry, loading it on first use if startup did not."""
+    global _registry
+    if _registry is None:
+        _registry = load_registry(config.TEMPLATE_FOLDER)
+    return _registry
+
+async def current_registry() -> TemplateRegistry:
+    """Return the registry, reloading it first if any worker has reloaded since."""
+    if _registry is None or await run_io(_read_generation) != _generation:
+        return await reload_templates()
+    return _registry
+
+async def reload_templates(broadcast: bool = False) -> TemplateRegistry:
+    """
+    Load the template folder off the event loop and swap the registry in.
+    With broadcast, every other worker reloads before it next places templates.
+    """
+    global _registry, _generation
+    # Read before loading, so a reload elsewhere during the load is picked up next time
+    generation = None if broadcast else await run_io(_read_generation)
+    registry = await run_io(load_registry, config.TEMPLATE_FOLDER)
+    if broadcast:
+        generation = await run_io(_bump_generation)
+    _registry, _generation = registry, generation
+    logger.info(f"Loaded {len(registry.templates)} templates from {registry.folder}")
+    return registry
+
+def install_reload_signal() -> None:
+    """Reload the registry when this process receives SIGHUP (POSIX only)."""
+    sighup = getattr(signal, "SIGHUP", None)
+    if sighup is None:
+        return
+    loop = asyncio.get_running_loop()
+
+    def on_sighup():
+        logger.info("SIGHUP received, reloading templates")
+        task = loop.create_task(reload_templates())
+        task.add_done_callback(_log_reload_failure)
+
+    try:
+        loop.add_signal_handler(sighup, on_sighup)
+    except (NotImplementedError, RuntimeError, ValueError):
+        # Not the main thread, or the loop does not support signal handlers
+        logger.warning("Template reload on SIGHUP is not available in this process")
+
+def _log_reload_failure(task: "asyncio.Task") -> None:
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"Template reload failed: {task.exception()}")
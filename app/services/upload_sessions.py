@@ -0,0 +1,263 @@
+"""
+Resumable upload sessions.
+
+A session is a directory under ``UPLOAD_FOLDER/.uploads/<upload_id>`` holding
+a preallocated data file and a small JSON state file. Chunks are written with
+``pwrite`` at their offsets, so they can arrive in any order and from several
+connections or workers at once; the received byte ranges are merged into the
+state file under a file lock. Sessions expire after UPLOAD_SESSION_TTL seconds
+without activity and are removed by a background sweeper.
+"""
+import os
+import json
+import time
+import uuid
+import shutil
+import asyncio
+import logging
+from dataclasses import dataclass, asdict
+from typing import AsyncIterator, List
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from .executor import run_io
+from .metrics import record_disk_write
+from ..config import Config
+
+logger = logging.getLogger(__name__)
+config = Config()
+
+SESSIONS_DIRNAME = ".uploads"
+
+class SessionNotFound(LookupError):
+    """Raised for unknown or expired upload sessions."""
+
+class ChunkOutOfRange(ValueError):
+    """Raised when a chunk would extend past the declared upload size."""
+
+@dataclass
+class UploadSession:
+    upload_id: str
+    store_id: str
+    filename: str
+    size: int
+    fingerprint: bool
+    received: List[List[int]]
+    created_at: float
+    expires_at: float
+
+    @property
+    def offset(self) -> int:
+        """Bytes received contiguously from the start; where a sequential client resumes."""
+        if self.received and self.received[0][0] == 0:
+            return self.received[0][1]
+        return 0
+
+    @property
+    def complete(self) -> bool:
+        return self.offset == self.size
+
+def _sessions_root() -> str:
+    return os.path.join(config.UPLOAD_FOLDER, SESSIONS_DIRNAME)
+
+def _session_dir(upload_id: str) -> str:
+    return os.path.join(_sessions_root(), upload_id)
+
+def data_path(upload_id: str) -> str:
+    return os.path.join(_session_dir(upload_id), "data")
+
+def _merge(ranges: List[List[int]], start: int, end: int) -> List[List[int]]:
+    merged = []
+    for lo, hi in sorted(ranges + [[start, end]]):
+        if merged and lo <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], hi)
+        else:
+            merged.append([lo, hi])
+    return merged
+
+def _read_state(directory: str) -> UploadSession:
+    try:
+        with open(os.path.join(directory, "state.json"), "r", encoding="utf-8") as f:
+            return UploadSession(**json.load(f))
+    except FileNotFoundError:
+        raise SessionNotFound(os.path.basename(directory))
+
+def _write_state(directory: str, session: UploadSession) -> None:
+    temp_path = os.path.join(directory, "state.json.tmp")
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(asdict(session), f)
+    os.replace(temp_path, os.path.join(directory, "state.json"))
+
+class _Locked:
+    """
+    Lock on a session, shared by every worker process. Chunk writes hold it
+    shared, so they run in parallel; state changes and claims hold it
+    exclusively.
+    """
+
+    def __init__(self, directory: str, shared: bool = False):
+        self.directory = directory
+        self.shared = shared
+
+    def __enter__(self):
+        try:
+            self.fd = os.open(os.path.join(self.directory, "lock"), os.O_RDWR)
+        except FileNotFoundError:
+            raise SessionNotFound(os.path.basename(self.directory))
+        if fcntl is not None:
+            fcntl.flock(self.fd, fcntl.LOCK_SH if self.shared else fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        os.close(self.fd)
+
+def _create(store_id: str, filename: str, size: int, fingerprint: bool) -> UploadSession:
+    upload_id = uuid.uuid4().hex
+    directory = _session_dir(upload_id)
+    os.makedirs(directory)
+    now = time.time()
+    session = UploadSession(
+        upload_id=upload_id,
+        store_id=store_id,
+        filename=filename,
+        size=size,
+        fingerprint=fingerprint,
+        received=[],
+        created_at=now,
+        expires_at=now + config.UPLOAD_SESSION_TTL
+    )
+    # Sparse until written, so an abandoned session costs only what was sent
+    with open(os.path.join(directory, "data"), "wb") as f:
+        f.truncate(size)
+    open(os.path.join(directory, "lock"), "wb").close()
+    _write_state(directory, session)
+    return session
+
+def _load(upload_id: str) -> UploadSession:
+    session = _read_state(_session_dir(upload_id))
+    if session.expires_at < time.time():
+        raise SessionNotFound(upload_id)
+    return session
+
+def _record_range(upload_id: str, start: int, end: int) -> UploadSession:
+    directory = _session_dir(upload_id)
+    with _Locked(directory):
+        session = _read_state(directory)
+        if end > start:
+            session.received = _merge(session.received, start, end)
+        session.expires_at = time.time() + config.UPLOAD_SESSION_TTL
+        _write_state(directory, session)
+    return session
+
+def _open_data(upload_id: str) -> int:
+    try:
+        return os.open(data_path(upload_id), os.O_WRONLY)
+    except FileNotFoundError:
+        raise SessionNotFound(upload_id)
+
+def _pwrite_all(fd: int, data: bytes, offset: int) -> None:
+    view = memoryview(data)
+    while view:
+        written = os.pwrite(fd, view, offset)
+        view = view[written:]
+        offset += written
+    record_disk_write("image", len(data))
+
+def _write_at(upload_id: str, fd: int, data: bytes, offset: int) -> None:
+    directory = _session_dir(upload_id)
+    with _Locked(directory, shared=True):
+        # Once claimed, fd refers to the committed image; writing would change it under its hash
+        if not os.path.exists(os.path.join(directory, "state.json")):
+            raise SessionNotFound(upload_id)
+        _pwrite_all(fd, data, offset)
+
+def _claim(upload_id: str, dest_path: str) -> UploadSession:
+    """
+    Move a complete upload's data to dest_path and delete the session. The
+    exclusive lock waits for chunk writes in progress, and writes after it
+    find the session gone.
+    """
+    directory = _session_dir(upload_id)
+    with _Locked(directory):
+        session = _read_state(directory)
+        if not session.complete:
+            return session
+        os.replace(os.path.join(directory, "data"), dest_path)
+        # Drop the state first so a concurrent claim sees the session as gone
+        os.remove(os.path.join(directory, "state.json"))
+    shutil.rmtree(directory, ignore_errors=True)
+    return session
+
+def _sweep() -> int:
+    root = _sessions_root()
+    if not os.path.isdir(root):
+        return 0
+    now = time.time()
+    removed = 0
+    for entry in os.scandir(root):
+        try:
+            expired = _read_state(entry.path).expires_at < now
+        except SessionNotFound:
+            # Half-created or half-removed; judge by age instead
+            expired = entry.stat().st_mtime + config.UPLOAD_SESSION_TTL < now
+        except (OSError, ValueError, TypeError):
+            expired = True
+        if expired:
+            shutil.rmtree(entry.path, ignore_errors=True)
+            removed += 1
+    return removed
+
+async def create_session(store_id: str, filename: str, size: int, fingerprint: bool = False) -> UploadSession:
+    return await run_io(_create, store_id, filename, size, fingerprint)
+
+async def get_session(upload_id: str) -> UploadSession:
+    """Raises SessionNotFound for unknown or expired sessions."""
+    return await run_io(_load, upload_id)
+
+async def write_chunk(session: UploadSession, offset: int, chunks: AsyncIterator[bytes]) -> UploadSession:
+    """
+    Write a request body at offset. Bytes that arrived before a dropped
+    connection are still recorded, so the client can resume after them.
+    Raises ChunkOutOfRange if the body runs past the declared size, and
+    SessionNotFound if the upload is completed while the body arrives.
+    """
+    fd = await run_io(_open_data, session.upload_id)
+    position = offset
+    try:
+        async for chunk in chunks:
+            if position + len(chunk) > session.size:
+                raise ChunkOutOfRange("Chunk extends past the declared upload size")
+            await run_io(_write_at, session.upload_id, fd, chunk, position)
+            position += len(chunk)
+    finally:
+        await run_io(os.close, fd)
+        session = await run_io(_record_range, session.upload_id, offset, position)
+    return session
+
+async def claim_upload(upload_id: str, dest_path: str) -> UploadSession:
+    """
+    Move the data of a complete session to dest_path and end the session.
+    Returns the session unchanged (still open) if bytes are missing.
+    """
+    return await run_io(_claim, upload_id, dest_path)
+
+async def abort_session(upload_id: str) -> None:
+    await run_io(shutil.rmtree, _session_dir(upload_id), True)
+
+async def sweep_expired() -> int:
+    """Remove expired sessions and their data; returns how many were removed."""
+    return await run_io(_sweep)
+
+async def run_sweeper() -> None:
+    """Sweep expired sessions every UPLOAD_SWEEP_INTERVAL seconds until cancelled."""
+    while True:
+        try:
+            removed = await sweep_expired()
+            if removed:
+                logger.info(f"Removed {removed} expired upload sessions")
+        except Exception as e:
+            logger.error(f"Error sweeping upload sessions: {str(e)}")
+        await asyncio.sleep(config.UPLOAD_SWEEP_INTERVAL)
@@ -1,36 +1,97 @@
 import os
 import re
+import hashlib
+import warnings
+from typing import Optional
 from PIL import Image
-from fastapi import UploadFile
+
+from .imageinfo import HEADER_SIZE, parse_image_header
+from ..config import Config
+
+config = Config()
+
+# Pillow refuses to decode anything over the same limit, in every process that imports this.
+# On its own Pillow only warns up to twice the limit, so the warning is made an error too.
+Image.MAX_IMAGE_PIXELS = config.MAX_IMAGE_PIXELS
+warnings.simplefilter("error", Image.DecompressionBombWarning)
 
 ALLOWED_EXTENSIONS = {'webp', 'png'}
 
+# Fingerprinted names embed the start of the content's SHA-256: logo.3f2a9c01de.webp
+FINGERPRINT_LENGTH = 10
+FINGERPRINT_PATTERN = re.compile(r'^(.+)\.([0-9a-f]{%d})\.([A-Za-z]+)$' % FINGERPRINT_LENGTH)
+
+# Derivative names put a label between the stem and the extension: logo.thumb.webp
+PLACEHOLDER_LABEL = "lqip"
+DERIVATIVE_LABELS = frozenset(
+    [item.partition(':')[0].strip() for item in config.IMAGE_DERIVATIVE_WIDTHS.split(',') if item.strip()]
+    + [PLACEHOLDER_LABEL]
+)
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def fingerprint_name(filename: str, digest: str) -> str:
+    stem, ext = os.path.splitext(filename)
+    return f"{stem}.{digest[:FINGERPRINT_LENGTH]}{ext}"
+
+def is_fingerprinted(filename: str) -> bool:
+    return FINGERPRINT_PATTERN.match(filename) is not None
+
+def is_fingerprint_of(candidate: str, filename: str) -> bool:
+    """True if candidate is a fingerprinted version of filename."""
+    match = FINGERPRINT_PATTERN.match(candidate)
+    return match is not None and f"{match.group(1)}.{match.group(3)}" == filename
+
+def derivative_name(filename: str, label: str) -> str:
+    stem, ext = os.path.splitext(filename)
+    return f"{stem}.{label}{ext}"
+
+def is_derivative(filename: str) -> bool:
+    """True if filename has the form of a rendered derivative, whether or not one exists."""
+    parts = filename.rsplit('.', 2)
+    return len(parts) == 3 and parts[1] in DERIVATIVE_LABELS
+
+def reserved_name_error(filename: str) -> Optional[str]:
+    """Why an upload may not use this name, or None if it may."""
+    if is_fingerprinted(filename):
+        return "Filenames ending in a content fingerprint are reserved"
+    if is_derivative(filename):
+        return "Filenames ending in a derivative label such as .thumb are reserved"
+    return None
+
 def secure_filename(filename):
     """Secure a filename by removing unsafe characters."""
     filename = re.sub(r'[^a-zA-Z0-9._-]', '', filename)
     return filename
 
-async def save_image(file: UploadFile, full_path: str):
-    temp_path = f"{full_path}.tmp"
-    try:
-        # Read file content
-        content = await file.read()
-        
-        # Save to temporary file
-        with open(temp_path, 'wb') as f:
-            f.write(content)
-        
-        # Verify image
-        with Image.open(temp_path) as img:
-            img.verify()
-        
-        # Move to final location
-        os.rename(temp_path, full_path)
-        return True, None
-    except Exception as e:
-        if os.path.exists(temp_path):
-            os.remove(temp_path)
-        return False, str(e)
\ No newline at end of file
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def check_image_header(header: bytes, filename: str) -> Optional[str]:
+    """
+    Check the first bytes of an image against its extension and the pixel
+    limit. Returns an error message, or None if the file is worth verifying.
+    """
+    info = parse_image_header(header)
+    if info is None or not info[1] or not info[2]:
+        return "File content is not a valid PNG or WebP image"
+    fmt, width, height = info
+    if filename.rsplit('.', 1)[-1].lower() != fmt:
+        return f"File content is {fmt.upper()} but the filename has a different extension"
+    if width * height > config.MAX_IMAGE_PIXELS:
+        return f"Image is {width}x{height} pixels, more than the limit of {config.MAX_IMAGE_PIXELS}"
+    return None
+
+def verify_image(path: str, filename: Optional[str] = None) -> None:
+    """Raise if the file is not a readable image; filename defaults to the file's own name."""
+    with open(path, "rb") as f:
+        error = check_image_header(f.read(HEADER_SIZE), filename or os.path.basename(path))
+    if error is not None:
+        raise ValueError(error)
+    with Image.open(path) as img:
+        img.verify()
@@ -0,0 +1,71 @@
+import os
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Dict, Optional
+from fastapi import Request
+
+def etag_for_stat(st: os.stat_result, variant: Optional[str] = None) -> str:
+    """
+    Strong ETag derived from inode, size and nanosecond mtime. A variant names
+    one of several representations of the same file, which need distinct tags.
+    """
+    tag = f"{st.st_ino:x}-{st.st_size:x}-{st.st_mtime_ns:x}"
+    return f'"{tag}-{variant}"' if variant else f'"{tag}"'
+
+def http_date(timestamp: float) -> str:
+    """Format a POSIX timestamp as an RFC 7231 HTTP date."""
+    return formatdate(timestamp, usegmt=True)
+
+def validator_headers(st: os.stat_result, variant: Optional[str] = None) -> Dict[str, str]:
+    """ETag and Last-Modified headers for a file, or for one representation of it."""
+    return {
+        "ETag": etag_for_stat(st, variant),
+        "Last-Modified": http_date(st.st_mtime)
+    }
+
+def _etag_matches(header: str, etag: str) -> bool:
+    if header.strip() == "*":
+        return True
+    # Weak comparison, as required for If-None-Match
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+def etag_not_modified(request: Request, etag: str) -> bool:
+    """Evaluate If-None-Match against an ETag that is not derived from a single file."""
+    if_none_match = request.headers.get("if-none-match")
+    return if_none_match is not None and _etag_matches(if_none_match, etag)
+
+def is_not_modified(request: Request, st: os.stat_result, variant: Optional[str] = None) -> bool:
+    """Evaluate If-None-Match / If-Modified-Since against a file's stat result."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # If-Modified-Since is ignored when If-None-Match is present (RFC 7232 §6)
+        return _etag_matches(if_none_match, etag_for_stat(st, variant))
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError, IndexError):
+            return False
+        return int(st.st_mtime) <= since
+
+    return False
+
+def if_match_fails(request: Request, st: os.stat_result) -> bool:
+    """Evaluate If-Match with strong comparison; True means the precondition failed."""
+    if_match = request.headers.get("if-match")
+    if if_match is None or if_match.strip() == "*":
+        return False
+    etag = etag_for_stat(st)
+    # A tag of any representation of the current file is as good as the file's own
+    variant_prefix = etag[:-1] + "-"
+    for candidate in if_match.split(","):
+        candidate = candidate.strip()
+        if candidate == etag or (candidate.startswith(variant_prefix) and candidate.endswith('"')):
+            return False
+    return True
@@ -0,0 +1,42 @@
+"""
+Image format and pixel dimensions read from file headers, without decoding.
+"""
+import struct
+from typing import Optional, Tuple
+
+# Enough for the PNG IHDR chunk and every WebP frame header variant
+HEADER_SIZE = 30
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+def parse_image_header(header: bytes) -> Optional[Tuple[str, int, int]]:
+    """Return (format, width, height) for PNG and WebP headers, or None if unrecognized."""
+    if header.startswith(PNG_SIGNATURE):
+        if len(header) < 24 or header[12:16] != b"IHDR":
+            return None
+        width, height = struct.unpack(">II", header[16:24])
+        return "png", width, height
+
+    if len(header) < HEADER_SIZE or header[:4] != b"RIFF" or header[8:12] != b"WEBP":
+        return None
+    chunk = header[12:16]
+    data = header[20:]
+    if chunk == b"VP8 " and data[3:6] == b"\x9d\x01\x2a":
+        # Lossy: 14-bit dimensions after the frame start code
+        width, height = struct.unpack("<HH", data[6:10])
+        return "webp", width & 0x3FFF, height & 0x3FFF
+    if chunk == b"VP8L" and data[0] == 0x2F:
+        # Lossless: two 14-bit (size - 1) fields packed after the signature byte
+        bits = struct.unpack("<I", data[1:5])[0]
+        return "webp", (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if chunk == b"VP8X":
+        # Extended: 24-bit (canvas size - 1) fields
+        width = int.from_bytes(data[4:7], "little") + 1
+        height = int.from_bytes(data[7:10], "little") + 1
+        return "webp", width, height
+    return None
+
+def read_image_info(path: str) -> Optional[Tuple[str, int, int]]:
+    """Read just enough of a file to identify it and its dimensions."""
+    with open(path, "rb") as f:
+        return parse_image_header(f.read(HEADER_SIZE))
@@ -0,0 +1,219 @@
+"""
+JSON Pointer (RFC 6901), JSON Patch (RFC 6902) and JSON Merge Patch (RFC 7386).
+
+Patches never modify the document they are given. Only the containers on the
+path to each change are copied, so applying a patch costs time proportional
+to the size of the edit rather than the size of the document, and the
+original (for example a cached parsed document) stays valid.
+"""
+import copy
+from typing import Any, List, Set
+
+class JsonPointerError(ValueError):
+    """Raised for malformed pointers or pointers that do not resolve."""
+
+class JsonPatchError(ValueError):
+    """Raised for malformed patch documents."""
+
+class JsonPatchConflict(ValueError):
+    """Raised when a well-formed patch cannot be applied to the document."""
+
+_MISSING = object()
+
+def parse_pointer(pointer: str) -> List[str]:
+    """Split a JSON Pointer into unescaped reference tokens."""
+    if pointer == "":
+        return []
+    if not pointer.startswith("/"):
+        raise JsonPointerError(f"Invalid JSON pointer '{pointer}': must start with '/'")
+    return [token.replace("~1", "/").replace("~0", "~") for token in pointer[1:].split("/")]
+
+def _array_index(container: list, token: str, allow_end: bool = False) -> int:
+    if token == "-" and allow_end:
+        return len(container)
+    if not token.isdigit() or (len(token) > 1 and token.startswith("0")):
+        raise JsonPointerError(f"Invalid array index '{token}'")
+    index = int(token)
+    limit = len(container) if allow_end else len(container) - 1
+    if index > limit:
+        raise JsonPointerError(f"Array index {index} out of range")
+    return index
+
+def _child(node: Any, token: str) -> Any:
+    if isinstance(node, dict):
+        if token not in node:
+            raise JsonPointerError(f"Member '{token}' not found")
+        return node[token]
+    if isinstance(node, list):
+        return node[_array_index(node, token)]
+    raise JsonPointerError(f"Cannot descend into a scalar at '{token}'")
+
+def resolve_pointer(document: Any, pointer: str) -> Any:
+    """Return the value a JSON Pointer refers to."""
+    node = document
+    for token in parse_pointer(pointer):
+        node = _child(node, token)
+    return node
+
+class _PatchTarget:
+    """Tracks which containers were copied while applying one patch."""
+
+    def __init__(self, document: Any):
+        self.root = self._copy(document)
+        self._copied: Set[int] = {id(self.root)}
+
+    @staticmethod
+    def _copy(node: Any) -> Any:
+        if isinstance(node, dict):
+            return dict(node)
+        if isinstance(node, list):
+            return list(node)
+        return node
+
+    def _writable(self, parent: Any, key: Any) -> Any:
+        node = parent[key]
+        if isinstance(node, (dict, list)) and id(node) not in self._copied:
+            node = self._copy(node)
+            parent[key] = node
+            self._copied.add(id(node))
+        return node
+
+    def parent_of(self, tokens: List[str]) -> Any:
+        """Return a writable copy of the container that holds the last token."""
+        node = self.root
+        for token in tokens[:-1]:
+            if isinstance(node, dict):
+                if token not in node:
+                    raise JsonPatchConflict(f"Path segment '{token}' not found")
+                node = self._writable(node, token)
+            elif isinstance(node, list):
+                try:
+                    node = self._writable(node, _array_index(node, token))
+                except JsonPointerError as e:
+                    raise JsonPatchConflict(str(e))
+            else:
+                raise JsonPatchConflict(f"Cannot descend into a scalar at '{token}'")
+        return node
+
+    def get(self, pointer: str) -> Any:
+        try:
+            return resolve_pointer(self.root, pointer)
+        except JsonPointerError as e:
+            raise JsonPatchConflict(str(e))
+
+    def add(self, pointer: str, value: Any) -> None:
+        tokens = parse_pointer(pointer)
+        if not tokens:
+            self.root = value
+            return
+        parent = self.parent_of(tokens)
+        token = tokens[-1]
+        if isinstance(parent, dict):
+            parent[token] = value
+        elif isinstance(parent, list):
+            try:
+                parent.insert(_array_index(parent, token, allow_end=True), value)
+            except JsonPointerError as e:
+                raise JsonPatchConflict(str(e))
+        else:
+            raise JsonPatchConflict(f"Cannot add a member to a scalar at '{pointer}'")
+
+    def remove(self, pointer: str) -> Any:
+        tokens = parse_pointer(pointer)
+        if not tokens:
+            raise JsonPatchConflict("Cannot remove the document root")
+        parent = self.parent_of(tokens)
+        token = tokens[-1]
+        if isinstance(parent, dict):
+            if token not in parent:
+                raise JsonPatchConflict(f"Member '{token}' not found")
+            return parent.pop(token)
+        if isinstance(parent, list):
+            try:
+                return parent.pop(_array_index(parent, token))
+            except JsonPointerError as e:
+                raise JsonPatchConflict(str(e))
+        raise JsonPatchConflict(f"Cannot remove from a scalar at '{pointer}'")
+
+    def replace(self, pointer: str, value: Any) -> None:
+        tokens = parse_pointer(pointer)
+        if not tokens:
+            self.root = value
+            return
+        self.remove(pointer)
+        self.add(pointer, value)
+
+def _json_equal(a: Any, b: Any) -> bool:
+    """
+    Equality for the test operation. Python's == treats True as 1 and 1.0 as 1,
+    so types are compared first, at every level.
+    """
+    if type(a) is not type(b):
+        return False
+    if isinstance(a, dict):
+        return a.keys() == b.keys() and all(_json_equal(a[key], b[key]) for key in a)
+    if isinstance(a, list):
+        return len(a) == len(b) and all(_json_equal(x, y) for x, y in zip(a, b))
+    return a == b
+
+def _operation_field(operation: dict, name: str) -> Any:
+    value = operation.get(name, _MISSING)
+    if value is _MISSING:
+        raise JsonPatchError(f"Operation '{operation.get('op')}' requires '{name}'")
+    return value
+
+def _pointer_field(operation: dict, name: str) -> str:
+    pointer = _operation_field(operation, name)
+    if not isinstance(pointer, str):
+        raise JsonPatchError(f"'{name}' must be a JSON pointer string")
+    try:
+        parse_pointer(pointer)
+    except JsonPointerError as e:
+        raise JsonPatchError(str(e))
+    return pointer
+
+def apply_json_patch(document: Any, patch: Any) -> Any:
+    """Apply an RFC 6902 patch and return the new document."""
+    if not isinstance(patch, list):
+        raise JsonPatchError("A JSON Patch document must be an array of operations")
+
+    target = _PatchTarget(document)
+    for operation in patch:
+        if not isinstance(operation, dict):
+            raise JsonPatchError("Each JSON Patch operation must be an object")
+        op = operation.get("op")
+        path = _pointer_field(operation, "path")
+
+        if op == "add":
+            target.add(path, _operation_field(operation, "value"))
+        elif op == "remove":
+            target.remove(path)
+        elif op == "replace":
+            target.replace(path, _operation_field(operation, "value"))
+        elif op == "move":
+            from_path = _pointer_field(operation, "from")
+            if path != from_path and path.startswith(from_path + "/"):
+                raise JsonPatchConflict("Cannot move a value into one of its own children")
+            target.add(path, target.remove(from_path))
+        elif op == "copy":
+            from_path = _pointer_field(operation, "from")
+            target.add(path, copy.deepcopy(target.get(from_path)))
+        elif op == "test":
+            if not _json_equal(target.get(path), _operation_field(operation, "value")):
+                raise JsonPatchConflict(f"Test failed at '{path}'")
+        else:
+            raise JsonPatchError(f"Unknown JSON Patch operation '{op}'")
+
+    return target.root
+
+def apply_merge_patch(document: Any, patch: Any) -> Any:
+    """Apply an RFC 7386 merge patch and return the new document."""
+    if not isinstance(patch, dict):
+        return patch
+    result = dict(document) if isinstance(document, dict) else {}
+    for key, value in patch.items():
+        if value is None:
+            result.pop(key, None)
+        else:
+            result[key] = apply_merge_patch(result.get(key), value)
+    return result
@@ -0,0 +1,323 @@
+"""
+Streaming multipart upload handling.
+
+Upload bodies are parsed incrementally from the ASGI receive channel and file
+parts are written chunk by chunk to temporary files next to their final
+destination, so memory use per upload stays constant regardless of file size.
+The first bytes of each file are held in memory until its image header has
+been checked, so files that are not images never reach the disk.
+"""
+import os
+import hashlib
+import tempfile
+from dataclasses import dataclass, field
+from typing import Any, List, Optional, Tuple
+from fastapi import HTTPException, Request, status
+
+from .file import allowed_file, check_image_header, reserved_name_error
+from .imageinfo import HEADER_SIZE
+from ..services.executor import run_io
+from ..services.metrics import record_disk_write
+from .validation import sanitize_filename
+
+try:
+    try:
+        import python_multipart as multipart
+        from python_multipart.exceptions import FormParserError
+        from python_multipart.multipart import parse_options_header
+    except ModuleNotFoundError:
+        import multipart
+        from multipart.exceptions import FormParserError
+        from multipart.multipart import parse_options_header
+except ModuleNotFoundError:
+    multipart = None
+    parse_options_header = None
+
+# Allowance for multipart boundaries and part headers on top of the file size limit
+MULTIPART_OVERHEAD = 16 * 1024
+
+@dataclass
+class SpooledUpload:
+    """A file part that has been streamed to a temporary file."""
+    field_name: str
+    filename: str
+    temp_path: str
+    size: int = 0
+    sha256: Optional[str] = None
+    error: Optional[str] = None
+
+@dataclass
+class _Part:
+    headers: List[Tuple[bytes, bytes]] = field(default_factory=list)
+    upload: Optional[SpooledUpload] = None
+    fd: Optional[int] = None
+    hasher: Optional[Any] = None
+    rejected: bool = False
+    # Leading bytes buffered until the image header can be checked; None once the file is open
+    head: Optional[bytes] = None
+
+def check_content_length(request: Request, limit: int) -> None:
+    """Reject a request whose declared body size exceeds the limit before reading it."""
+    content_length = request.headers.get("content-length")
+    if content_length is None:
+        return
+    try:
+        declared = int(content_length)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid Content-Length header"
+        )
+    if declared > limit + MULTIPART_OVERHEAD:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail="File too large"
+        )
+
+class _MultipartReceiver:
+    """Collects parser callbacks so file I/O can be awaited outside of them."""
+
+    def __init__(self, dest_dir: str, max_size: int, max_files: int, field_names, strict: bool = True):
+        self.dest_dir = dest_dir
+        self.max_size = max_size
+        self.max_files = max_files
+        self.field_names = field_names
+        self.strict = strict
+        self.uploads: List[SpooledUpload] = []
+        self._part = _Part()
+        self._header_name = b""
+        self._header_value = b""
+        self._pending: List[Tuple[_Part, bytes]] = []
+        self._finished: List[_Part] = []
+        self._open: List[_Part] = []
+
+    def on_part_begin(self) -> None:
+        self._part = _Part()
+
+    def on_part_data(self, data: bytes, start: int, end: int) -> None:
+        if self._part.upload is not None and not self._part.rejected:
+            self._pending.append((self._part, data[start:end]))
+
+    def on_part_end(self) -> None:
+        if self._part.upload is not None and not self._part.rejected:
+            self._finished.append(self._part)
+
+    def _reject(self, detail: str, status_code: int, upload: SpooledUpload) -> None:
+        """Fail the request, or in lenient mode record the error and skip the part."""
+        if self.strict:
+            raise HTTPException(status_code=status_code, detail=detail)
+        upload.error = detail
+        self._part.rejected = True
+
+    def on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._header_name += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self._header_value += data[start:end]
+
+    def on_header_end(self) -> None:
+        self._part.headers.append((self._header_name.lower(), self._header_value))
+        self._header_name = b""
+        self._header_value = b""
+
+    def on_headers_finished(self) -> None:
+        disposition = dict(self._part.headers).get(b"content-disposition", b"")
+        _, options = parse_options_header(disposition)
+        field_name = options.get(b"name", b"").decode("utf-8", "replace")
+        if b"filename" not in options or field_name not in self.field_names:
+            # Plain form fields and unexpected file fields are discarded
+            return
+
+        if len(self.uploads) >= self.max_files:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Too many files. Maximum number of files is {self.max_files}"
+            )
+
+        raw_filename = options[b"filename"].decode("utf-8", "replace")
+        filename = sanitize_filename(raw_filename)
+        if not raw_filename or not filename or not allowed_file(filename):
+            rejected = SpooledUpload(field_name=field_name, filename=filename or raw_filename, temp_path="")
+            self.uploads.append(rejected)
+            self._reject(
+                "No file selected" if not raw_filename
+                else "Invalid filename or file type. Only WebP and PNG files are allowed.",
+                status.HTTP_400_BAD_REQUEST,
+                rejected
+            )
+            return
+
+        reserved = reserved_name_error(filename)
+        if reserved is not None:
+            rejected = SpooledUpload(field_name=field_name, filename=filename, temp_path="")
+            self.uploads.append(rejected)
+            self._reject(reserved, status.HTTP_400_BAD_REQUEST, rejected)
+            return
+
+        self._part.head = b""
+        self._part.upload = SpooledUpload(field_name=field_name, filename=filename, temp_path="")
+        self._open.append(self._part)
+        self.uploads.append(self._part.upload)
+
+    def on_end(self) -> None:
+        pass
+
+    async def _drop(self, part: _Part, detail: str, status_code: int) -> None:
+        """Fail the request, or in lenient mode discard this file and keep reading."""
+        if self.strict:
+            raise HTTPException(status_code=status_code, detail=detail)
+        part.upload.error = detail
+        part.rejected = True
+        if part.fd is not None:
+            await run_io(os.close, part.fd)
+            part.fd = None
+            await run_io(os.remove, part.upload.temp_path)
+            part.upload.temp_path = ""
+        self._open.remove(part)
+
+    async def _start_file(self, part: _Part) -> bool:
+        """Check the buffered header and, if it passes, spill it to a new temporary file."""
+        error = check_image_header(part.head, part.upload.filename)
+        if error is not None:
+            await self._drop(part, error, status.HTTP_400_BAD_REQUEST)
+            return False
+        part.fd, part.upload.temp_path = await run_io(
+            tempfile.mkstemp, dir=self.dest_dir, prefix=".upload-", suffix=".tmp"
+        )
+        part.hasher = hashlib.sha256()
+        head, part.head = part.head, None
+        await run_io(_write_chunk, part.fd, part.hasher, head)
+        return True
+
+    async def flush(self) -> None:
+        """Write buffered part data to disk, enforcing the per-file size limit."""
+        for part, data in self._pending:
+            if part.rejected:
+                continue
+            part.upload.size += len(data)
+            if part.upload.size > self.max_size:
+                await self._drop(part, "File too large", status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+                continue
+            if part.head is not None:
+                part.head += data
+                if len(part.head) >= HEADER_SIZE:
+                    await self._start_file(part)
+                continue
+            await run_io(_write_chunk, part.fd, part.hasher, data)
+        self._pending.clear()
+
+        for part in self._finished:
+            if part.rejected:
+                continue
+            # A file shorter than a header is checked, and rejected, once it ends
+            if part.head is not None and not await self._start_file(part):
+                continue
+            await run_io(os.close, part.fd)
+            part.fd = None
+            part.upload.sha256 = part.hasher.hexdigest()
+            self._open.remove(part)
+        self._finished.clear()
+
+    def cleanup(self) -> None:
+        """Close and remove every temporary file created so far."""
+        for part in self._open:
+            if part.fd is not None:
+                os.close(part.fd)
+                part.fd = None
+        self._open.clear()
+        for upload in self.uploads:
+            if upload.temp_path and os.path.exists(upload.temp_path):
+                os.remove(upload.temp_path)
+
+def _write_chunk(fd: int, hasher, data: bytes) -> None:
+    # Hashing here keeps it off the event loop; chunks of a part are written in order
+    hasher.update(data)
+    view = memoryview(data)
+    while view:
+        written = os.write(fd, view)
+        view = view[written:]
+    record_disk_write("image", len(data))
+
+async def receive_uploads(
+    request: Request,
+    dest_dir: str,
+    max_size: int,
+    max_files: int = 1,
+    field_names=("file",),
+    strict: bool = True,
+    max_total: Optional[int] = None
+) -> List[SpooledUpload]:
+    """
+    Stream the multipart file parts of a request into temporary files in dest_dir.
+
+    Each file part is aborted with 413 as soon as its running byte count crosses
+    max_size, and with 400 if its header is not a PNG or WebP matching its
+    extension within MAX_IMAGE_PIXELS. The SHA-256 of every file is computed
+    as it is written. On any error every temporary file is removed before
+    re-raising.
+
+    With strict=False, invalid, oversized or non-image files do not fail the request:
+    they are returned with error set and no temporary file.
+
+    With max_total, the whole request fails with 413 once its body passes that
+    size, which check_content_length cannot enforce for chunked requests.
+    """
+    if multipart is None:
+        raise RuntimeError("The `python-multipart` library must be installed to receive uploads.")
+
+    content_type = request.headers.get("content-type", "")
+    _, params = parse_options_header(content_type)
+    boundary = params.get(b"boundary")
+    if not content_type.startswith("multipart/form-data") or not boundary:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Expected a multipart/form-data request"
+        )
+
+    receiver = _MultipartReceiver(dest_dir, max_size, max_files, field_names, strict)
+    callbacks = {
+        "on_part_begin": receiver.on_part_begin,
+        "on_part_data": receiver.on_part_data,
+        "on_part_end": receiver.on_part_end,
+        "on_header_field": receiver.on_header_field,
+        "on_header_value": receiver.on_header_value,
+        "on_header_end": receiver.on_header_end,
+        "on_headers_finished": receiver.on_headers_finished,
+        "on_end": receiver.on_end,
+    }
+
+    try:
+        parser = multipart.MultipartParser(boundary, callbacks)
+        received = 0
+        async for chunk in request.stream():
+            received += len(chunk)
+            if max_total is not None and received > max_total + MULTIPART_OVERHEAD:
+                raise HTTPException(
+                    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                    detail="Request body too large"
+                )
+            parser.write(chunk)
+            await receiver.flush()
+        parser.finalize()
+        await receiver.flush()
+        if receiver._open:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Incomplete multipart data"
+            )
+    except BaseException as exc:
+        receiver.cleanup()
+        if isinstance(exc, FormParserError):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid multipart data"
+            ) from exc
+        raise
+
+    if not receiver.uploads:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="No file selected"
+        )
+
+    return receiver.uploads
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Benchmark JSON document reads through the ASGI app in each read mode.
+
+Drives the application directly over ASGI (no sockets, no HTTP client) against
+a throwaway store initialized from the templates, and reports wall-clock
+latency and CPU time per request for the largest template documents.
+
+Usage:
+    python benchmarks/bench_json_read.py [iterations]
+"""
+import os
+import sys
+import time
+import asyncio
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+UPLOAD_FOLDER = tempfile.mkdtemp(prefix="bench-uploads-")
+os.environ["UPLOAD_FOLDER"] = UPLOAD_FOLDER
+os.environ["TEMPLATE_FOLDER"] = os.path.join(ROOT, "templates")
+os.environ.setdefault("SECRET_TOKEN", "bench-token")
+
+import logging
+logging.disable(logging.INFO)
+
+from app.main import app  # noqa: E402
+from app.config import Config  # noqa: E402
+
+STORE_ID = "bench-store"
+FILES = ["homelg.json", "homesm.json", "aboutlg.json"]
+MODES = ["model", "envelope", "raw"]
+
+async def request(method: str, path: str, query: str = ""):
+    """Send one request through the ASGI app and return (status, body length)."""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0", "spec_version": "2.3"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query.encode(),
+        "root_path": "",
+        "headers": [
+            (b"host", b"bench"),
+            (b"authorization", f"Bearer {Config.SECRET_TOKEN}".encode())
+        ],
+        "client": ("127.0.0.1", 50000),
+        "server": ("bench", 80),
+    }
+    received = False
+    status_code = 0
+    length = 0
+
+    async def receive():
+        nonlocal received
+        if not received:
+            received = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await asyncio.sleep(3600)
+
+    async def send(message):
+        nonlocal status_code, length
+        if message["type"] == "http.response.start":
+            status_code = message["status"]
+        elif message["type"] == "http.response.body":
+            length += len(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return status_code, length
+
+async def run(iterations: int):
+    status_code, _ = await request("POST", f"/api/v1/stores/{STORE_ID}/initialize")
+    assert status_code == 200, status_code
+
+    print(f"{'file':<14}{'mode':<10}{'bytes':>8}{'wall us/req':>14}{'cpu us/req':>13}")
+    for filename in FILES:
+        path = f"/api/v1/stores/{STORE_ID}/json/{filename}"
+        for mode in MODES:
+            query = f"mode={mode}"
+            # Warm the document cache and the route
+            for _ in range(10):
+                status_code, length = await request("GET", path, query)
+                assert status_code == 200, status_code
+
+            wall_start = time.perf_counter()
+            cpu_start = time.process_time()
+            for _ in range(iterations):
+                await request("GET", path, query)
+            wall = (time.perf_counter() - wall_start) / iterations * 1e6
+            cpu = (time.process_time() - cpu_start) / iterations * 1e6
+            print(f"{filename:<14}{mode:<10}{length:>8}{wall:>14.1f}{cpu:>13.1f}")
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    asyncio.run(run(iterations))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Benchmark per-request overhead of the production middleware chain.
+
+Builds the middleware stack of app_production.py (security headers, request
+logging, rate limiting, trusted hosts, CORS) around a trivial endpoint, once
+with the previous BaseHTTPMiddleware implementations and once with the
+current ASGI ones, and drives both directly over ASGI. Reports wall-clock
+and CPU time per request, for a small JSON response and a streamed one.
+
+Usage:
+    python benchmarks/bench_middleware.py [iterations]
+"""
+import os
+import sys
+import time
+import asyncio
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+os.environ["RATE_LIMIT_FILE"] = os.path.join(tempfile.mkdtemp(prefix="bench-ratelimit-"), "counters")
+
+import logging
+logging.disable(logging.INFO)
+
+from fastapi import FastAPI, Request  # noqa: E402
+from fastapi.middleware.cors import CORSMiddleware  # noqa: E402
+from fastapi.middleware.trustedhost import TrustedHostMiddleware  # noqa: E402
+from starlette.middleware.base import BaseHTTPMiddleware  # noqa: E402
+from starlette.responses import JSONResponse, StreamingResponse  # noqa: E402
+
+from app.middleware.security import (  # noqa: E402
+    SecurityHeadersMiddleware, RequestLoggingMiddleware, RateLimitMiddleware
+)
+from app.services.ratelimit import SharedRateLimiter  # noqa: E402
+
+logger = logging.getLogger("bench")
+
+# High enough that the benchmark itself is never limited
+CALLS = 10 ** 9
+
+class LegacySecurityHeadersMiddleware(BaseHTTPMiddleware):
+    """The BaseHTTPMiddleware implementation replaced by SecurityHeadersMiddleware."""
+
+    async def dispatch(self, request: Request, call_next):
+        response = await call_next(request)
+        response.headers["X-Content-Type-Options"] = "nosniff"
+        response.headers["X-Frame-Options"] = "DENY"
+        response.headers["X-XSS-Protection"] = "1; mode=block"
+        response.headers["Referrer-Policy"] = "strict-origin-when-cross-origin"
+        if request.url.path in ["/docs", "/redoc"] or request.url.path.startswith("/docs") or request.url.path.startswith("/redoc"):
+            response.headers["Content-Security-Policy"] = "default-src 'self'; style-src 'self' 'unsafe-inline'"
+        else:
+            response.headers["Content-Security-Policy"] = "default-src 'self'"
+        return response
+
+class LegacyRequestLoggingMiddleware(BaseHTTPMiddleware):
+    """The BaseHTTPMiddleware implementation replaced by RequestLoggingMiddleware."""
+
+    async def dispatch(self, request: Request, call_next):
+        start_time = time.time()
+        logger.info(f"Request: {request.method} {request.url.path} from {request.client.host}")
+        response = await call_next(request)
+        process_time = time.time() - start_time
+        logger.info(f"Response: {response.status_code} in {process_time:.3f}s")
+        return response
+
+class LegacyRateLimitMiddleware(BaseHTTPMiddleware):
+    """The BaseHTTPMiddleware implementation replaced by RateLimitMiddleware."""
+
+    def __init__(self, app, calls: int, period: int = 60):
+        super().__init__(app)
+        self.calls = calls
+        self.period = period
+        self.limiter = SharedRateLimiter(calls, period, path=os.environ["RATE_LIMIT_FILE"])
+
+    async def dispatch(self, request: Request, call_next):
+        allowed, _, retry_after = self.limiter.hit(f"ip:{request.client.host}")
+        if not allowed:
+            return JSONResponse(status_code=429, content={"error": "Rate limit exceeded"})
+        return await call_next(request)
+
+async def _chunks():
+    for _ in range(16):
+        yield b"x" * 4096
+
+def build_app(security, logging_, rate_limit, **rate_limit_options) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/api/v1/stores/{store_id}/ping")
+    async def ping(store_id: str):
+        return {"success": True, "store_id": store_id}
+
+    @app.get("/api/v1/stores/{store_id}/stream")
+    async def stream(store_id: str):
+        return StreamingResponse(_chunks(), media_type="application/octet-stream")
+
+    # Same order as app_production.py; the last one added runs first
+    if security is not None:
+        app.add_middleware(security)
+        app.add_middleware(logging_)
+        app.add_middleware(rate_limit, **rate_limit_options)
+        app.add_middleware(TrustedHostMiddleware, allowed_hosts=["*"])
+        app.add_middleware(
+            CORSMiddleware,
+            allow_origins=["*"],
+            allow_credentials=True,
+            allow_methods=["GET", "POST", "PUT", "PATCH", "DELETE"],
+            allow_headers=["*"],
+            expose_headers=["*"]
+        )
+    return app
+
+async def request(app, path: str):
+    """Send one GET through the ASGI app and return (status, body length)."""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0", "spec_version": "2.3"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [
+            (b"host", b"bench"),
+            (b"origin", b"http://example.com"),
+            (b"authorization", b"Bearer bench-token")
+        ],
+        "client": ("127.0.0.1", 50000),
+        "server": ("bench", 80),
+    }
+    received = False
+    status_code = 0
+    length = 0
+
+    async def receive():
+        nonlocal received
+        if not received:
+            received = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await asyncio.sleep(3600)
+
+    async def send(message):
+        nonlocal status_code, length
+        if message["type"] == "http.response.start":
+            status_code = message["status"]
+        elif message["type"] == "http.response.body":
+            length += len(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return status_code, length
+
+async def run(iterations: int):
+    stacks = [
+        ("none", build_app(None, None, None)),
+        ("BaseHTTPMiddleware", build_app(
+            LegacySecurityHeadersMiddleware, LegacyRequestLoggingMiddleware, LegacyRateLimitMiddleware, calls=CALLS
+        )),
+        ("ASGI", build_app(
+            SecurityHeadersMiddleware, RequestLoggingMiddleware, RateLimitMiddleware, calls=CALLS
+        )),
+    ]
+
+    print(f"{'stack':<20}{'endpoint':<10}{'wall us/req':>14}{'cpu us/req':>13}")
+    for endpoint in ("ping", "stream"):
+        path = f"/api/v1/stores/bench/{endpoint}"
+        for name, app in stacks:
+            for _ in range(50):
+                status_code, _ = await request(app, path)
+                assert status_code == 200, status_code
+
+            wall_start = time.perf_counter()
+            cpu_start = time.process_time()
+            for _ in range(iterations):
+                await request(app, path)
+            wall = (time.perf_counter() - wall_start) / iterations * 1e6
+            cpu = (time.process_time() - cpu_start) / iterations * 1e6
+            print(f"{name:<20}{endpoint:<10}{wall:>14.1f}{cpu:>13.1f}")
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    asyncio.run(run(iterations))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+"""
+Gunicorn settings used by the Dockerfile and production.py.
+
+Workers keep their Prometheus metrics in mmap'd files that /metrics merges,
+so the directory for them has to be known before the app, and with it
+prometheus_client, is imported. Keep prometheus_client imports in this file
+inside the hooks for the same reason.
+"""
+import os
+import shutil
+import tempfile
+
+os.environ.setdefault(
+    "PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "store-api-metrics")
+)
+# With --preload the app is imported before on_starting runs
+os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+
+def on_starting(server):
+    """Start from empty metric files; those of a previous server are stale."""
+    path = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path, exist_ok=True)
+
+def child_exit(server, worker):
+    """Stop counting the live gauges of a worker that exited."""
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
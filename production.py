@@ -51,6 +51,7 @@ def run_production():
             "--max-requests", "1000",
             "--max-requests-jitter", "100",
             "--preload",
+            "--config", str(Path(__file__).parent / "gunicorn.conf.py"),
             "--log-level", "info",
             "--access-logfile", "-",
             "--error-logfile", "-"
@@ -0,0 +1,48 @@
+"""
+Shared fixtures. Config is read from the environment when app modules are
+imported, so the test environment is set up here before any of them are.
+"""
+import os
+import re
+import shutil
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TOKEN = "test-token"
+
+_data_dir = tempfile.mkdtemp(prefix="store-api-tests-")
+os.environ.update({
+    "SECRET_TOKEN": TOKEN,
+    "UPLOAD_FOLDER": os.path.join(_data_dir, "uploads"),
+    "TEMPLATE_FOLDER": os.path.join(ROOT, "templates"),
+    "RATE_LIMIT_FILE": os.path.join(_data_dir, "ratelimit"),
+    "ACCESS_LOG": "false",
+    "LOOP_MONITOR": "false",
+})
+os.environ.pop("PROMETHEUS_MULTIPROC_DIR", None)
+os.makedirs(os.environ["UPLOAD_FOLDER"])
+
+AUTH = {"Authorization": f"Bearer {TOKEN}"}
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+    from app.main import app
+    with TestClient(app) as c:
+        yield c
+
+@pytest.fixture
+def store(client, request):
+    """A fresh store directory named after the test; removed afterwards."""
+    store_id = re.sub(r"[^a-zA-Z0-9]+", "-", request.node.name)[:50].strip("-")
+    path = os.path.join(os.environ["UPLOAD_FOLDER"], store_id)
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(os.path.join(path, "json"))
+    os.makedirs(os.path.join(path, "image"))
+    yield store_id
+    shutil.rmtree(path, ignore_errors=True)
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(_data_dir, ignore_errors=True)
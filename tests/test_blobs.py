@@ -0,0 +1,65 @@
+import os
+import shutil
+import hashlib
+
+import pytest
+
+from conftest import AUTH
+from test_uploads import noise_png, upload
+from app.services.storage import blob_path
+
+def image_path(store, name):
+    return os.path.join(os.environ["UPLOAD_FOLDER"], store, "image", name)
+
+@pytest.fixture
+def other_store(store):
+    other = f"{store[:44]}-other"
+    path = os.path.join(os.environ["UPLOAD_FOLDER"], other)
+    os.makedirs(os.path.join(path, "image"))
+    yield other
+    shutil.rmtree(path, ignore_errors=True)
+
+def test_identical_images_share_one_blob(client, store, other_store):
+    data = noise_png((50, 50))
+    blob = blob_path(hashlib.sha256(data).hexdigest())
+    assert upload(client, store, "a.png", data).status_code in (200, 201)
+    assert upload(client, other_store, "b.png", data).status_code in (200, 201)
+
+    st = os.stat(blob)
+    assert os.stat(image_path(store, "a.png")).st_ino == st.st_ino
+    assert os.stat(image_path(other_store, "b.png")).st_ino == st.st_ino
+    assert st.st_nlink == 3
+
+    # The blob outlives the first deletion and goes with the last
+    assert client.delete(f"/api/v1/stores/{store}/images/a.png", headers=AUTH).status_code == 200
+    assert os.stat(blob).st_nlink == 2
+    assert client.delete(f"/api/v1/stores/{other_store}/images/b.png", headers=AUTH).status_code == 200
+    assert not os.path.exists(blob)
+
+def test_overwrite_releases_the_previous_blob(client, store, other_store):
+    first, second = noise_png((50, 50)), noise_png((50, 50))
+    first_blob = blob_path(hashlib.sha256(first).hexdigest())
+    upload(client, store, "a.png", first)
+    upload(client, other_store, "a.png", first)
+
+    upload(client, store, "a.png", second)
+    # Still linked from the other store
+    assert os.stat(first_blob).st_nlink == 2
+    upload(client, other_store, "a.png", second)
+    assert not os.path.exists(first_blob)
+    assert os.stat(blob_path(hashlib.sha256(second).hexdigest())).st_nlink == 3
+
+def test_blob_stats_and_collection(client, store, other_store):
+    data = noise_png((50, 50))
+    upload(client, store, "a.png", data)
+    upload(client, other_store, "a.png", data)
+    before = client.get("/api/v1/admin/blobs", headers=AUTH).json()
+    assert before["bytes_saved"] >= len(data)
+
+    # A store removed by hand leaves a blob nothing links to
+    shutil.rmtree(os.path.join(os.environ["UPLOAD_FOLDER"], store))
+    os.remove(image_path(other_store, "a.png"))
+    response = client.post("/api/v1/admin/blobs/collect", headers=AUTH)
+    assert response.status_code == 200
+    assert response.json()["removed"] >= 1
+    assert not os.path.exists(blob_path(hashlib.sha256(data).hexdigest()))
@@ -0,0 +1,78 @@
+import os
+
+import pytest
+
+from conftest import AUTH
+from test_uploads import png_bytes
+
+# Pairs share a size and an mtime, so pages break inside runs of equal keys
+IMAGES = {
+    "a.png": ((10, 10), 1000),
+    "b.png": ((30, 30), 3000),
+    "c.png": ((10, 10), 2000),
+    "d.png": ((30, 30), 1000),
+    "e.png": ((20, 20), 2000),
+    "f.png": ((20, 20), 3000),
+    "g.png": ((10, 10), 2000),
+}
+
+@pytest.fixture
+def images(client, store):
+    image_dir = os.path.join(os.environ["UPLOAD_FOLDER"], store, "image")
+    for name, (size, mtime) in IMAGES.items():
+        path = os.path.join(image_dir, name)
+        with open(path, "wb") as f:
+            f.write(png_bytes(size))
+        os.utime(path, (mtime, mtime))
+    # Neither is listed
+    with open(os.path.join(image_dir, "a.thumb.png"), "wb") as f:
+        f.write(png_bytes())
+    with open(os.path.join(image_dir, "notes.txt"), "wb") as f:
+        f.write(b"text")
+    assert client.post(f"/api/v1/stores/{store}/images/reindex", headers=AUTH).status_code == 200
+    return image_dir
+
+def list_all(client, store, **params):
+    names, cursor = [], None
+    while True:
+        query = dict(params, limit=2, **({"cursor": cursor} if cursor else {}))
+        body = client.get(f"/api/v1/stores/{store}/images", params=query, headers=AUTH).json()
+        assert len(body["images"]) <= 2
+        names += body["images"]
+        cursor = body["next_cursor"]
+        if cursor is None:
+            return names
+
+@pytest.mark.parametrize("sort", ["name", "size", "mtime"])
+@pytest.mark.parametrize("order", ["asc", "desc"])
+def test_pages_cover_every_image_once_in_order(client, store, images, sort, order):
+    def key(name):
+        st = os.stat(os.path.join(images, name))
+        return ({"name": name, "size": st.st_size, "mtime": st.st_mtime_ns}[sort], name)
+
+    expected = sorted(IMAGES, key=key, reverse=order == "desc")
+    assert list_all(client, store, sort=sort, order=order) == expected
+
+def test_prefix_and_items(client, store, images):
+    body = client.get(f"/api/v1/stores/{store}/images", params={"prefix": "b"}, headers=AUTH).json()
+    assert body["images"] == ["b.png"]
+    item = body["items"][0]
+    assert (item["width"], item["height"]) == (30, 30)
+    assert item["size"] == os.path.getsize(os.path.join(images, "b.png"))
+
+def test_cursor_is_stable_across_inserts(client, store, images):
+    body = client.get(f"/api/v1/stores/{store}/images", params={"limit": 3}, headers=AUTH).json()
+    assert body["images"] == ["a.png", "b.png", "c.png"]
+
+    # An image sorting before the cursor does not shift the next page
+    with open(os.path.join(images, "aa.png"), "wb") as f:
+        f.write(png_bytes())
+    client.post(f"/api/v1/stores/{store}/images/reindex", headers=AUTH)
+    params = {"limit": 3, "cursor": body["next_cursor"]}
+    body = client.get(f"/api/v1/stores/{store}/images", params=params, headers=AUTH).json()
+    assert body["images"] == ["d.png", "e.png", "f.png"]
+
+@pytest.mark.parametrize("cursor", ["not-base64!", "bm90IGpzb24=", "WzFd"])
+def test_invalid_cursor_is_rejected(client, store, images, cursor):
+    response = client.get(f"/api/v1/stores/{store}/images", params={"cursor": cursor}, headers=AUTH)
+    assert response.status_code == 400
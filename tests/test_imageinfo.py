@@ -0,0 +1,39 @@
+import io
+import struct
+
+import pytest
+from PIL import Image
+
+from app.utils.imageinfo import HEADER_SIZE, PNG_SIGNATURE, parse_image_header
+
+def encoded(fmt, size=(37, 21), **params):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, (10, 20, 30)).save(buffer, format=fmt, **params)
+    return buffer.getvalue()
+
+@pytest.mark.parametrize("fmt, params, expected", [
+    ("PNG", {}, "png"),
+    ("WEBP", {"quality": 80}, "webp"),
+    ("WEBP", {"lossless": True}, "webp"),
+])
+def test_reads_format_and_size(fmt, params, expected):
+    data = encoded(fmt, **params)
+    assert parse_image_header(data[:HEADER_SIZE]) == (expected, 37, 21)
+
+@pytest.mark.parametrize("length", range(0, 24))
+def test_truncated_png_is_unrecognized(length):
+    header = encoded("PNG")[:length]
+    assert parse_image_header(header) is None
+
+@pytest.mark.parametrize("header", [
+    b"",
+    b"garbage",
+    PNG_SIGNATURE,
+    PNG_SIGNATURE + b"\x00\x00\x00\x0dIHDR\x00\x00",
+    PNG_SIGNATURE + b"\x00\x00\x00\x0dIDAT" + struct.pack(">II", 1, 1),
+    b"RIFF\x00\x00\x00\x00WEBP",
+    b"RIFF\x00\x00\x00\x00WEBPVP8 " + b"\x00" * 14,
+    b"\xff" * HEADER_SIZE,
+])
+def test_garbage_is_unrecognized(header):
+    assert parse_image_header(header) is None
@@ -0,0 +1,29 @@
+from conftest import AUTH
+from test_uploads import png_bytes, upload
+
+def test_image_requires_token(client, store):
+    data = png_bytes()
+    assert upload(client, store, "logo.png", data).status_code in (200, 201)
+    url = f"/api/v1/stores/{store}/images/logo.png"
+
+    assert client.get(url).status_code in (401, 403)
+    assert client.get(url, headers={"Authorization": "Bearer wrong"}).status_code == 401
+
+    response = client.get(url, headers=AUTH)
+    assert response.status_code == 200
+    assert response.content == data
+    assert response.headers["Cache-Control"].startswith("private")
+
+def test_image_range_and_not_modified(client, store):
+    data = png_bytes()
+    upload(client, store, "logo.png", data)
+    url = f"/api/v1/stores/{store}/images/logo.png"
+
+    response = client.get(url, headers={**AUTH, "Range": "bytes=0-7"})
+    assert response.status_code == 206
+    assert response.content == data[:8]
+
+    etag = client.get(url, headers=AUTH).headers["ETag"]
+    response = client.get(url, headers={**AUTH, "If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
@@ -0,0 +1,120 @@
+import os
+import json
+from email.utils import formatdate
+
+from conftest import AUTH
+
+def write_page(store, name, raw):
+    path = os.path.join(os.environ["UPLOAD_FOLDER"], store, "json", name)
+    with open(path, "wb") as f:
+        f.write(raw)
+    return path
+
+def test_get_sends_validators(client, store):
+    write_page(store, "homelg.json", b'{"title": "Home"}')
+    response = client.get(f"/api/v1/stores/{store}/json/homelg.json", headers=AUTH)
+    assert response.status_code == 200
+    assert response.headers["ETag"].startswith('"')
+    assert "Last-Modified" in response.headers
+    assert response.headers["Cache-Control"] == "private, no-cache"
+
+def test_if_none_match_returns_304_until_the_file_changes(client, store):
+    write_page(store, "homelg.json", b'{"title": "Home"}')
+    url = f"/api/v1/stores/{store}/json/homelg.json"
+    etag = client.get(url, headers=AUTH).headers["ETag"]
+
+    for header in (etag, f"W/{etag}", f'"other", {etag}', "*"):
+        response = client.get(url, headers={**AUTH, "If-None-Match": header})
+        assert response.status_code == 304
+        assert response.content == b""
+        assert response.headers["ETag"] == etag
+
+    assert client.put(url, headers=AUTH, json={"title": "Changed"}).status_code == 200
+
+    response = client.get(url, headers={**AUTH, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["data"] == {"title": "Changed"}
+
+def test_if_modified_since(client, store):
+    path = write_page(store, "homelg.json", b'{"title": "Home"}')
+    url = f"/api/v1/stores/{store}/json/homelg.json"
+    mtime = os.stat(path).st_mtime
+
+    response = client.get(url, headers={**AUTH, "If-Modified-Since": formatdate(mtime + 60, usegmt=True)})
+    assert response.status_code == 304
+    response = client.get(url, headers={**AUTH, "If-Modified-Since": formatdate(mtime - 60, usegmt=True)})
+    assert response.status_code == 200
+    # If-None-Match takes precedence over If-Modified-Since
+    response = client.get(url, headers={
+        **AUTH, "If-None-Match": '"stale"', "If-Modified-Since": formatdate(mtime + 60, usegmt=True)
+    })
+    assert response.status_code == 200
+
+def test_bundle_returns_304_until_a_member_changes(client, store):
+    write_page(store, "homelg.json", b'{"title": "Home"}')
+    write_page(store, "homesm.json", b'{"title": "Home"}')
+    url = f"/api/v1/stores/{store}/bundle"
+    response = client.get(url, headers=AUTH)
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+
+    assert client.get(url, headers={**AUTH, "If-None-Match": etag}).status_code == 304
+    write_page(store, "aboutlg.json", b'{"title": "About"}')
+    assert client.get(url, headers={**AUTH, "If-None-Match": etag}).status_code == 200
+
+# Deliberately not in json.dumps formatting, so re-serialization would show
+RAW = b'{ "title":"Home",\n  "items": [1, 2.50, true] }'
+
+def test_raw_and_envelope_send_the_stored_bytes(client, store):
+    write_page(store, "homelg.json", RAW)
+    url = f"/api/v1/stores/{store}/json/homelg.json"
+
+    response = client.get(url, params={"mode": "raw"}, headers=AUTH)
+    assert response.status_code == 200
+    assert response.content == RAW
+
+    response = client.get(url, params={"mode": "envelope"}, headers=AUTH)
+    assert response.content.endswith(RAW + b"}")
+    assert response.json()["data"] == json.loads(RAW)
+
+    response = client.get(url, headers={**AUTH, "Accept": "application/vnd.store.raw+json"})
+    assert response.content == RAW
+
+def test_each_read_mode_has_its_own_etag(client, store):
+    write_page(store, "homelg.json", RAW)
+    url = f"/api/v1/stores/{store}/json/homelg.json"
+    model = client.get(url, headers=AUTH)
+    raw = client.get(url, headers={**AUTH, "Accept": "application/vnd.store.raw+json"})
+    envelope = client.get(url, params={"mode": "envelope"}, headers=AUTH)
+
+    etags = {r.headers["ETag"] for r in (model, raw, envelope)}
+    assert len(etags) == 3
+    assert all(r.headers["Vary"] == "Accept" for r in (model, raw, envelope))
+
+    # A cached model body must not satisfy a raw request, and the other way round
+    response = client.get(url, params={"mode": "raw"}, headers={**AUTH, "If-None-Match": model.headers["ETag"]})
+    assert response.status_code == 200
+    response = client.get(url, headers={**AUTH, "If-None-Match": raw.headers["ETag"]})
+    assert response.status_code == 200
+    response = client.get(url, params={"mode": "raw"}, headers={**AUTH, "If-None-Match": raw.headers["ETag"]})
+    assert response.status_code == 304
+
+def test_pointers_in_raw_mode(client, store):
+    write_page(store, "homelg.json", RAW)
+    url = f"/api/v1/stores/{store}/json/homelg.json"
+    response = client.get(url, params={"mode": "raw", "pointer": ["/items/1", "/title"]}, headers=AUTH)
+    assert response.json() == {"/items/1": 2.5, "/title": "Home"}
+
+    response = client.get(url, params={"mode": "raw", "pointer": "/missing"}, headers=AUTH)
+    assert response.status_code == 404
+
+def test_if_match_accepts_the_tag_of_any_read_mode(client, store):
+    write_page(store, "homelg.json", RAW)
+    url = f"/api/v1/stores/{store}/json/homelg.json"
+    etag = client.get(url, params={"mode": "raw"}, headers=AUTH).headers["ETag"]
+    response = client.patch(
+        url,
+        headers={**AUTH, "Content-Type": "application/merge-patch+json", "If-Match": etag},
+        content=b'{"title": "New"}'
+    )
+    assert response.status_code == 200
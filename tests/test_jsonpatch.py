@@ -0,0 +1,112 @@
+import copy
+import json
+import os
+
+import pytest
+
+from conftest import AUTH
+from app.utils.jsonpatch import (
+    JsonPatchConflict, JsonPatchError, JsonPointerError,
+    apply_json_patch, apply_merge_patch, resolve_pointer
+)
+
+DOCUMENT = {"a/b": 1, "m~n": 2, "list": [1, {"x": True}], "nested": {"flag": False, "n": 1}}
+
+@pytest.mark.parametrize("pointer, expected", [
+    ("", DOCUMENT),
+    ("/a~1b", 1),
+    ("/m~0n", 2),
+    ("/list/1/x", True),
+    ("/nested/n", 1),
+])
+def test_resolve_pointer(pointer, expected):
+    assert resolve_pointer(DOCUMENT, pointer) == expected
+
+@pytest.mark.parametrize("pointer", ["nested", "/missing", "/list/2", "/list/01", "/list/-", "/nested/n/deeper"])
+def test_resolve_pointer_errors(pointer):
+    with pytest.raises(JsonPointerError):
+        resolve_pointer(DOCUMENT, pointer)
+
+def test_patch_operations_leave_the_original_alone():
+    original = copy.deepcopy(DOCUMENT)
+    result = apply_json_patch(DOCUMENT, [
+        {"op": "add", "path": "/list/-", "value": 3},
+        {"op": "replace", "path": "/nested/n", "value": 5},
+        {"op": "remove", "path": "/m~0n"},
+        {"op": "move", "from": "/a~1b", "path": "/moved"},
+        {"op": "copy", "from": "/list/1", "path": "/copied"},
+        {"op": "test", "path": "/copied", "value": {"x": True}},
+    ])
+    assert result == {
+        "list": [1, {"x": True}, 3],
+        "nested": {"flag": False, "n": 5},
+        "moved": 1,
+        "copied": {"x": True},
+    }
+    assert result["copied"] is not result["list"][1]
+    assert DOCUMENT == original
+
+@pytest.mark.parametrize("path, value", [
+    ("/nested/n", True),
+    ("/nested/n", 1.0),
+    ("/nested/flag", 0),
+    ("/list/1", {"x": 1}),
+    ("/list", [1.0, {"x": True}]),
+])
+def test_test_operation_compares_types(path, value):
+    with pytest.raises(JsonPatchConflict):
+        apply_json_patch(DOCUMENT, [{"op": "test", "path": path, "value": value}])
+
+@pytest.mark.parametrize("patch, error", [
+    ({"op": "add"}, JsonPatchError),
+    ([{"op": "frobnicate", "path": "/a"}], JsonPatchError),
+    ([{"op": "add", "path": "/a"}], JsonPatchError),
+    ([{"op": "add", "path": "a", "value": 1}], JsonPatchError),
+    ([{"op": "remove", "path": "/missing"}], JsonPatchConflict),
+    ([{"op": "add", "path": "/missing/child", "value": 1}], JsonPatchConflict),
+    ([{"op": "move", "from": "/nested", "path": "/nested/inner"}], JsonPatchConflict),
+])
+def test_patch_errors(patch, error):
+    with pytest.raises(error):
+        apply_json_patch(DOCUMENT, patch)
+
+def test_merge_patch():
+    original = copy.deepcopy(DOCUMENT)
+    result = apply_merge_patch(DOCUMENT, {"nested": {"flag": None, "added": [1]}, "a/b": None, "new": "v"})
+    assert result == {"m~n": 2, "list": [1, {"x": True}], "nested": {"n": 1, "added": [1]}, "new": "v"}
+    assert DOCUMENT == original
+    assert apply_merge_patch(DOCUMENT, ["replaces"]) == ["replaces"]
+
+def _write_page(store, data):
+    with open(os.path.join(os.environ["UPLOAD_FOLDER"], store, "json", "homelg.json"), "w") as f:
+        json.dump(data, f)
+
+def test_patch_endpoint_honours_if_match(client, store):
+    _write_page(store, {"title": "Old", "count": 1})
+    url = f"/api/v1/stores/{store}/json/homelg.json"
+    etag = client.get(url, headers=AUTH).headers["ETag"]
+    patch = json.dumps([{"op": "replace", "path": "/title", "value": "New"}])
+    headers = {**AUTH, "Content-Type": "application/json-patch+json"}
+
+    response = client.patch(url, headers={**headers, "If-Match": etag}, content=patch)
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+    # The first patch changed the file, so the old tag no longer matches
+    response = client.patch(url, headers={**headers, "If-Match": etag}, content=patch)
+    assert response.status_code == 412
+
+    merge_headers = {**AUTH, "Content-Type": "application/merge-patch+json"}
+    response = client.patch(url, headers=merge_headers, content=json.dumps({"count": None}))
+    assert response.status_code == 200
+    assert client.get(url, headers=AUTH).json()["data"] == {"title": "New"}
+
+def test_patch_endpoint_reports_failed_test_as_conflict(client, store):
+    _write_page(store, {"published": True})
+    url = f"/api/v1/stores/{store}/json/homelg.json"
+    headers = {**AUTH, "Content-Type": "application/json-patch+json"}
+    patch = [{"op": "test", "path": "/published", "value": 1}, {"op": "remove", "path": "/published"}]
+
+    response = client.patch(url, headers=headers, content=json.dumps(patch))
+    assert response.status_code == 409
+    assert client.get(url, headers=AUTH).json()["data"] == {"published": True}
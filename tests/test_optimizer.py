@@ -0,0 +1,24 @@
+import os
+import time
+
+from conftest import AUTH
+from test_uploads import png_bytes
+
+def test_batch_skips_fingerprinted_names_and_derivatives(client, store):
+    image_dir = os.path.join(os.environ["UPLOAD_FOLDER"], store, "image")
+    names = ["logo.png", "logo.3f2a9c01de.png", "logo.thumb.png", "logo.lqip.png", "hero.webp"]
+    for name in names:
+        with open(os.path.join(image_dir, name), "wb") as f:
+            f.write(png_bytes())
+    before = {name: os.stat(os.path.join(image_dir, name)).st_mtime_ns for name in names}
+
+    response = client.post(f"/api/v1/stores/{store}/images/optimize", headers=AUTH)
+    assert response.status_code == 202
+    assert response.json()["job"]["total"] == 1
+
+    deadline = time.monotonic() + 30
+    while client.get(f"/api/v1/stores/{store}/images/optimize", headers=AUTH).json()["job"]["running"]:
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
+    for name in names[1:]:
+        assert os.stat(os.path.join(image_dir, name)).st_mtime_ns == before[name]
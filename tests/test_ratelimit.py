@@ -0,0 +1,76 @@
+import pytest
+
+from app.services.ratelimit import BUCKET_SLOTS, SharedRateLimiter
+
+# Start of a window, so elapsed fractions below are exact
+T0 = 1_000_020.0
+
+@pytest.fixture
+def limiter(tmp_path):
+    limiter = SharedRateLimiter(5, 60, path=str(tmp_path / "ratelimit"))
+    yield limiter
+    limiter.close()
+
+def hits(limiter, key, count, now):
+    return [limiter.hit(key, now)[0] for _ in range(count)]
+
+def test_limit_within_one_window(limiter):
+    assert hits(limiter, "k", 5, T0) == [True] * 5
+    allowed, remaining, retry_after = limiter.hit("k", T0 + 1)
+    assert (allowed, remaining) == (False, 0)
+    assert retry_after >= 1
+    # Other keys have their own count
+    assert limiter.hit("other", T0 + 1)[0]
+
+def test_previous_window_slides_out(limiter):
+    assert hits(limiter, "k", 5, T0) == [True] * 5
+    # At the start of the next window the previous one still counts in full
+    assert not limiter.hit("k", T0 + 60)[0]
+    # 60% through it counts 5 * 0.4 = 2, leaving room for 3
+    assert hits(limiter, "k", 4, T0 + 96) == [True, True, True, False]
+    # Two windows on, nothing is left
+    assert hits(limiter, "k", 5, T0 + 180) == [True] * 5
+
+def test_refused_requests_are_not_counted(limiter):
+    hits(limiter, "k", 5, T0)
+    hits(limiter, "k", 50, T0 + 30)
+    assert hits(limiter, "k", 3, T0 + 96) == [True, True, True]
+
+@pytest.mark.parametrize("refused_at", [T0 + 20, T0 + 90])
+def test_retry_after_is_enough(limiter, refused_at):
+    hits(limiter, "k", 5, T0)
+    while limiter.hit("k", refused_at)[0]:
+        pass
+    _, _, retry_after = limiter.hit("k", refused_at)
+    assert not limiter.hit("k", refused_at + retry_after - 1)[0]
+    assert limiter.hit("k", refused_at + retry_after)[0]
+
+def test_processes_share_counters(limiter):
+    other = SharedRateLimiter(5, 60, path=limiter.path)
+    try:
+        assert hits(limiter, "k", 3, T0) == [True] * 3
+        assert hits(other, "k", 3, T0) == [True, True, False]
+    finally:
+        other.close()
+
+def test_new_settings_start_from_empty_counters(limiter):
+    hits(limiter, "k", 5, T0)
+    other = SharedRateLimiter(5, 30, path=limiter.path)
+    try:
+        assert other.hit("k", T0)[0]
+    finally:
+        other.close()
+
+def test_full_bucket_evicts_the_least_recent_key(tmp_path):
+    limiter = SharedRateLimiter(1, 60, slots=BUCKET_SLOTS, path=str(tmp_path / "ratelimit"))
+    try:
+        for i in range(BUCKET_SLOTS):
+            assert limiter.hit(f"k{i}", T0 + i)[0]
+        assert limiter.evictions == 0
+        assert limiter.hit("new", T0 + 10)[0]
+        assert limiter.evictions == 1
+        # k0 was evicted and starts over; the others are still limited
+        assert limiter.hit("k0", T0 + 11)[0]
+        assert not limiter.hit(f"k{BUCKET_SLOTS - 1}", T0 + 12)[0]
+    finally:
+        limiter.close()
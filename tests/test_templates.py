@@ -0,0 +1,42 @@
+import os
+import json
+import pytest
+
+from conftest import AUTH
+from app.services import templates
+
+@pytest.fixture
+def template_folder(tmp_path, monkeypatch):
+    monkeypatch.setattr(templates.config, "TEMPLATE_FOLDER", str(tmp_path))
+    yield tmp_path
+    # Load the real templates again on next use
+    templates._registry = None
+
+def _names(client):
+    response = client.get("/api/v1/admin/templates", headers=AUTH)
+    assert response.status_code == 200
+    return {t["name"] for t in response.json()["templates"]}
+
+def test_reload_elsewhere_reaches_this_worker(client, template_folder):
+    tmp_path = template_folder
+    (tmp_path / "homelg.json").write_text(json.dumps({"page": "home"}))
+    assert client.post("/api/v1/admin/templates/reload", headers=AUTH).status_code == 200
+    assert _names(client) == {"homelg.json"}
+
+    # Without a new generation the registry stays as loaded
+    (tmp_path / "aboutlg.json").write_text(json.dumps({"page": "about"}))
+    assert _names(client) == {"homelg.json"}
+
+    # Another worker serving the reload endpoint only bumps the shared generation
+    templates._bump_generation()
+    assert _names(client) == {"aboutlg.json", "homelg.json"}
+
+def test_initialize_uses_reloaded_templates(client, template_folder):
+    tmp_path = template_folder
+    (tmp_path / "contactlg.json").write_text(json.dumps({"page": "contact"}))
+    templates._bump_generation()
+
+    response = client.post("/api/v1/stores/reloaded-templates/initialize", headers=AUTH)
+    assert response.status_code in (200, 201)
+    json_dir = os.path.join(os.environ["UPLOAD_FOLDER"], "reloaded-templates", "json")
+    assert os.listdir(json_dir) == ["contactlg.json"]
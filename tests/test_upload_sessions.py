@@ -0,0 +1,53 @@
+import asyncio
+import os
+
+import pytest
+
+from app.services import upload_sessions
+from app.services.upload_sessions import SessionNotFound
+
+def run(coro):
+    return asyncio.run(coro)
+
+async def body(*chunks, between=None):
+    for i, chunk in enumerate(chunks):
+        if i and between is not None:
+            await between()
+        yield chunk
+
+def test_chunks_complete_a_session(tmp_path):
+    async def scenario():
+        session = await upload_sessions.create_session("s", "a.png", 6)
+        session = await upload_sessions.write_chunk(session, 3, body(b"def"))
+        assert session.received == [[3, 6]] and not session.complete
+        session = await upload_sessions.write_chunk(session, 0, body(b"abc"))
+        assert session.complete
+        dest = str(tmp_path / "a.png")
+        await upload_sessions.claim_upload(session.upload_id, dest)
+        return dest
+    with open(run(scenario()), "rb") as f:
+        assert f.read() == b"abcdef"
+
+def test_chunk_in_flight_cannot_write_into_a_claimed_upload(tmp_path):
+    dest = str(tmp_path / "a.png")
+    claimed = []
+
+    async def scenario():
+        session = await upload_sessions.create_session("s", "a.png", 4)
+        session = await upload_sessions.write_chunk(session, 0, body(b"good"))
+
+        async def complete():
+            await upload_sessions.claim_upload(session.upload_id, dest)
+            with open(dest, "rb") as f:
+                claimed.append(f.read())
+
+        # A retried PUT is still sending when the client completes the upload
+        with pytest.raises(SessionNotFound):
+            await upload_sessions.write_chunk(session, 0, body(b"ba", b"dd", between=complete))
+
+    run(scenario())
+    # The bytes written before the claim are part of the upload; none arrive after it
+    assert claimed == [b"baod"]
+    with open(dest, "rb") as f:
+        assert f.read() == b"baod"
+    assert os.listdir(upload_sessions._sessions_root()) == []
@@ -0,0 +1,106 @@
+import io
+import os
+
+import pytest
+from PIL import Image
+
+from conftest import AUTH
+
+def png_bytes(size=(40, 30)):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, (200, 10, 10)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+def upload(client, store, filename, data, batch=False):
+    if batch:
+        return client.post(f"/api/v1/stores/{store}/images/batch", headers=AUTH, files=[("files", (filename, data, "image/png"))])
+    return client.post(f"/api/v1/stores/{store}/images", headers=AUTH, files={"file": (filename, data, "image/png")})
+
+def test_truncated_png_is_rejected(client, store):
+    response = upload(client, store, "short.png", png_bytes()[:18])
+    assert response.status_code == 400
+
+def test_truncated_png_fails_only_its_batch_item(client, store):
+    response = upload(client, store, "short.png", png_bytes()[:18], batch=True)
+    assert response.status_code == 200
+    assert response.json()["results"][0]["success"] is False
+
+@pytest.mark.parametrize("filename", ["logo.thumb.png", "logo.lqip.png", "logo.3f2a9c01de.png"])
+def test_reserved_names_are_rejected_before_writing(client, store, filename):
+    response = upload(client, store, filename, png_bytes())
+    assert response.status_code == 400
+    assert "reserved" in response.json()["error"]
+    assert os.listdir(os.path.join(os.environ["UPLOAD_FOLDER"], store, "image")) == []
+
+def test_reserved_name_fails_only_its_batch_item(client, store):
+    response = client.post(
+        f"/api/v1/stores/{store}/images/batch",
+        headers=AUTH,
+        files=[("files", ("a.thumb.png", png_bytes(), "image/png")), ("files", ("a.png", png_bytes(), "image/png"))]
+    )
+    results = {item["filename"]: item for item in response.json()["results"]}
+    assert results["a.thumb.png"]["success"] is False
+    assert results["a.png"]["success"] is True
+
+def test_reserved_name_cannot_start_a_resumable_upload(client, store):
+    response = client.post(f"/api/v1/stores/{store}/uploads", headers=AUTH, json={"filename": "a.lqip.png", "size": 100})
+    assert response.status_code == 422
+
+def noise_png(size=(200, 200)):
+    buffer = io.BytesIO()
+    Image.frombytes("RGB", size, os.urandom(size[0] * size[1] * 3)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+def multipart_body(filename, data, boundary="test-boundary"):
+    return (
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+        "Content-Type: image/png\r\n\r\n"
+    ).encode() + data + f"\r\n--{boundary}--\r\n".encode()
+
+@pytest.fixture
+def small_limit(monkeypatch):
+    from app.api.v1 import images
+    monkeypatch.setattr(images.config, "MAX_CONTENT_LENGTH", 64 * 1024)
+    return 64 * 1024
+
+def test_oversized_chunked_upload_is_cut_off(client, store, small_limit):
+    data = noise_png()
+    assert len(data) > small_limit
+    body = multipart_body("big.png", data)
+
+    def chunks():
+        for start in range(0, len(body), 8192):
+            yield body[start:start + 8192]
+
+    response = client.post(
+        f"/api/v1/stores/{store}/images",
+        headers={**AUTH, "Content-Type": "multipart/form-data; boundary=test-boundary"},
+        content=chunks()
+    )
+    assert response.status_code == 413
+    # No temporary file is left behind
+    assert os.listdir(os.path.join(os.environ["UPLOAD_FOLDER"], store, "image")) == []
+
+def test_declared_oversized_upload_is_rejected_before_reading(client, store, small_limit):
+    response = upload(client, store, "big.png", b"\0" * (small_limit + 32 * 1024))
+    assert response.status_code == 413
+    assert os.listdir(os.path.join(os.environ["UPLOAD_FOLDER"], store, "image")) == []
+
+def test_upload_within_limit_is_stored_intact(client, store, small_limit):
+    data = noise_png((60, 60))
+    assert len(data) < small_limit
+    assert upload(client, store, "fits.png", data).status_code in (200, 201)
+    with open(os.path.join(os.environ["UPLOAD_FOLDER"], store, "image", "fits.png"), "rb") as f:
+        assert f.read() == data
+
+def test_oversized_file_fails_only_its_batch_item(client, store, small_limit):
+    response = client.post(
+        f"/api/v1/stores/{store}/images/batch",
+        headers=AUTH,
+        files=[("files", ("big.png", noise_png(), "image/png")), ("files", ("small.png", png_bytes(), "image/png"))]
+    )
+    results = {item["filename"]: item for item in response.json()["results"]}
+    assert results["big.png"]["success"] is False
+    assert results["small.png"]["success"] is True
+    assert os.listdir(os.path.join(os.environ["UPLOAD_FOLDER"], store, "image")) == ["small.png"]